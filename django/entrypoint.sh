@@ -52,9 +52,18 @@ if [ "$REPORTS_MIGRATIONS" = "true" ]; then
     cd /app/project && python manage.py makemigrations reports
 fi
 
-# Apply all migrations
-echo "Applying database migrations..."
-cd /app/project && python manage.py migrate
+# Apply all migrations, unless another container (the backend) does it
+if [ "$RUN_MIGRATIONS" = "false" ]; then
+    echo "Waiting for database migrations..."
+    cd /app/project && until python manage.py migrate --check > /dev/null 2>&1; do
+        sleep 2
+    done
+else
+    echo "Applying database migrations..."
+    cd /app/project && python manage.py migrate
+    echo "Backfilling the inbox projection..."
+    cd /app/project && python manage.py rebuild_inbox --if-empty
+fi
 
 # Create superuser if needed
 if [ "$CREATE_SUPERUSER" = "true" ]; then
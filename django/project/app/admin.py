@@ -1,6 +1,9 @@
 # admin.py
 from django.contrib import admin
+from django.utils.timezone import now
 from .models import *
+from .inbox import refresh_inbox
+from .notifications import schedule_digests
 
 from unfold.admin import ModelAdmin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
@@ -26,12 +29,82 @@ class UserAdmin(BaseUserAdmin, ModelAdmin):
 class GroupAdmin(BaseGroupAdmin, ModelAdmin):
     pass
 
+@admin.register(WorkflowDefinition)
+class WorkflowDefinitionAdmin(ModelAdmin):
+    list_display = ('workflow_id', 'version', 'name', 'checksum', 'created_at')
+    search_fields = ('workflow_id', 'name', 'checksum')
+    readonly_fields = ('workflow_id', 'version', 'checksum', 'created_at')
+
+
+@admin.register(IdempotencyRecord)
+class IdempotencyRecordAdmin(ModelAdmin):
+    list_display = ('key', 'scope', 'status', 'response_status', 'created_at', 'expires_at')
+    search_fields = ('key', 'scope')
+    list_filter = ('status', 'created_at')
+    readonly_fields = ('scope', 'key', 'fingerprint', 'response_status', 'response_content_type', 'created_at')
+    exclude = ('response_body',)
+
+
+@admin.register(Job)
+class JobAdmin(ModelAdmin):
+    list_display = ('job_id', 'name', 'status', 'attempts', 'max_attempts', 'run_at', 'locked_by', 'updated_at')
+    search_fields = ('name', 'locked_by')
+    list_filter = ('status', 'name')
+    readonly_fields = ('job_id', 'locked_by', 'locked_at', 'last_error', 'created_at', 'updated_at')
+    actions = ['requeue']
+
+    @admin.action(description="Requeue selected jobs")
+    def requeue(self, request, queryset):
+        updated = queryset.exclude(status='running').update(status='queued', attempts=0, run_at=now(), last_error='')
+        self.message_user(request, f"Requeued {updated} jobs")
+
+
+@admin.register(PendingNotification)
+class PendingNotificationAdmin(ModelAdmin):
+    list_display = ('notification_id', 'recipient', 'kind', 'status', 'attempts', 'created_at', 'sent_at')
+    search_fields = ('recipient',)
+    list_filter = ('status', 'kind')
+    readonly_fields = ('notification_id', 'last_error', 'created_at', 'sent_at')
+    actions = ['retry']
+
+    @admin.action(description="Retry selected notifications")
+    def retry(self, request, queryset):
+        # Notifications being sent right now are left to their digest run
+        updated = queryset.exclude(status__in=['sent', 'sending']).update(status='pending', attempts=0, last_error='')
+        if updated:
+            schedule_digests(delay=0)
+        self.message_user(request, f"Retrying {updated} notifications")
+
+
+@admin.register(StepDurationStats)
+class StepDurationStatsAdmin(ModelAdmin):
+    list_display = ('workflow_id', 'step_id', 'count', 'total_seconds', 'min_seconds', 'max_seconds', 'updated_at')
+    search_fields = ('workflow_id', 'step_id')
+    readonly_fields = ('count', 'total_seconds', 'min_seconds', 'max_seconds', 'buckets', 'updated_at')
+
+
+@admin.register(InboxItem)
+class InboxItemAdmin(ModelAdmin):
+    list_display = ('instance', 'assigned_to_email', 'workflow_name', 'step_name', 'status', 'step_created_at')
+    search_fields = ('assigned_to_email', 'workflow_id', 'step_id')
+    list_filter = ('workflow_id', 'status')
+    raw_id_fields = ('instance', 'execution')
+
+
 @admin.register(WorkflowInstance)
 class WorkflowInstanceAdmin(ModelAdmin):
-    list_display = ('instance_id', 'workflow_name', 'status', 'initiated_by_email', 'current_step_id', 'created_at', 'updated_at')
+    list_display = ('instance_id', 'workflow_name', 'workflow_version', 'status', 'initiated_by_email', 'current_step_id', 'created_at', 'updated_at')
     search_fields = ('workflow_id', 'workflow_name', 'initiated_by_email', 'initiated_by_clerk_id')
     list_filter = ('status', 'created_at', 'updated_at')
-    readonly_fields = ('instance_id', 'created_at', 'updated_at')
+    readonly_fields = ('instance_id', 'version', 'created_at', 'updated_at')
+
+    def save_model(self, request, obj, form, change):
+        # Admin edits must invalidate versions read by in-flight submissions
+        if change:
+            obj.version += 1
+        super().save_model(request, obj, form, change)
+        # Edits bypass the service, which otherwise keeps the inbox projection up to date
+        refresh_inbox([obj.pk])
 
 
 @admin.register(StepExecution)
@@ -39,9 +112,15 @@ class StepExecutionAdmin(ModelAdmin):
     list_display = ('execution_id', 'workflow_instance', 'step_name', 'status', 'assigned_to_email', 'executed_by_email', 'created_at')
     search_fields = ('step_id', 'step_name', 'assigned_to_email', 'executed_by_email')
     list_filter = ('status', 'created_at', 'completed_at')
-    readonly_fields = ('execution_id', 'created_at', 'updated_at')
+    readonly_fields = ('execution_id', 'version', 'created_at', 'updated_at')
     raw_id_fields = ('workflow_instance',)
 
+    def save_model(self, request, obj, form, change):
+        if change:
+            obj.version += 1
+        super().save_model(request, obj, form, change)
+        refresh_inbox([obj.workflow_instance_id])
+
 # Register your models here.
 
 # admin.py
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app'
+
+    def ready(self):
+        from . import checks  # noqa: F401 - registers the workflow.json system check
+        from . import workflow_jobs  # noqa: F401 - registers the background job handlers
@@ -0,0 +1,12 @@
+from django.urls import path
+from . import async_views
+
+# Async (ASGI) variants of the workflow endpoints, mounted at app/async/
+urlpatterns = [
+    path('workflows/pending/', async_views.get_pending_workflows_for_user, name='async_get_pending_workflows_for_user'),
+    path('workflows/pending/events/', async_views.pending_workflow_events, name='async_pending_workflow_events'),
+    path('workflows/instances/start/', async_views.start_workflow, name='async_start_workflow'),
+    path('workflows/instances/<str:instance_id>/', async_views.get_workflow_instance, name='async_get_workflow_instance'),
+    path('workflows/instances/<str:instance_id>/steps/<str:step_id>/validate/', async_views.validate_step_access, name='async_validate_step_access'),
+    path('workflows/instances/<str:instance_id>/steps/<str:step_id>/submit/', async_views.submit_step_data, name='async_submit_step_data'),
+]
@@ -0,0 +1,287 @@
+"""
+Async (ASGI) variants of the workflow endpoints, mounted under /app/async/.
+
+Reads use the async ORM (aget, async iteration) so a slow query only parks a
+coroutine instead of holding a worker thread. Writes run the same transactional
+service methods as the sync views through sync_to_async, because
+transaction.atomic() has no async counterpart. Responses match the sync views.
+"""
+import json
+import logging
+from urllib.parse import unquote
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from .events import inbox_event_stream, parse_event_id
+from .idempotency import idempotent
+from .inbox import ainbox_page
+from .pagination import InvalidCursor
+from .renderers import FastJsonResponse
+from .tracing import timed
+from .workflow_service import workflow_service, WorkflowConflictError
+from .workflow_templates import overlay_field_values
+
+
+logger = logging.getLogger(__name__)
+
+
+@require_POST
+@csrf_exempt
+@idempotent
+async def start_workflow(request):
+    """Async start_workflow (same payload and response)"""
+    try:
+        data = json.loads(request.body) if request.body else {}
+
+        # Validate required fields
+        required_fields = ['workflow_id', 'user_email', 'user_clerk_id']
+        missing_fields = [field for field in required_fields if not data.get(field)]
+
+        if missing_fields:
+            return FastJsonResponse({
+                "error": f"Missing required fields: {', '.join(missing_fields)}"
+            }, status=400)
+
+        instance = await sync_to_async(workflow_service.start_workflow_instance)(
+            workflow_id=data['workflow_id'],
+            user_email=data['user_email'],
+            user_clerk_id=data['user_clerk_id']
+        )
+
+        return FastJsonResponse({
+            "success": True,
+            "message": "Workflow instance started successfully",
+            "data": {
+                "instance_id": str(instance.instance_id),
+                "workflow_id": instance.workflow_id,
+                "workflow_version": instance.workflow_version,
+                "workflow_name": instance.workflow_name,
+                "current_step_id": instance.current_step_id,
+                "status": instance.status,
+                "created_at": instance.created_at
+            }
+        }, status=201)
+
+    except ValidationError as e:
+        return FastJsonResponse({
+            "error": str(e)
+        }, status=400)
+    except json.JSONDecodeError:
+        return FastJsonResponse({
+            "error": "Invalid JSON payload"
+        }, status=400)
+    except Exception as e:
+        return FastJsonResponse({
+            "error": f"An error occurred: {str(e)}"
+        }, status=500)
+
+
+@require_GET
+async def get_workflow_instance(request, instance_id):
+    """Async get_workflow_instance"""
+    try:
+        instance = await workflow_service.aget_workflow_instance(instance_id)
+        if not instance:
+            return FastJsonResponse({
+                "error": "Workflow instance not found"
+            }, status=404)
+
+        return FastJsonResponse({
+            "success": True,
+            "data": {
+                "instance_id": str(instance.instance_id),
+                "workflow_id": instance.workflow_id,
+                "workflow_version": instance.workflow_version,
+                "workflow_name": instance.workflow_name,
+                "current_step_id": instance.current_step_id,
+                "status": instance.status,
+                "initiated_by_email": instance.initiated_by_email,
+                "created_at": instance.created_at,
+                "updated_at": instance.updated_at,
+                "version": instance.version
+            }
+        }, status=200)
+
+    except Exception as e:
+        return FastJsonResponse({
+            "error": f"An error occurred: {str(e)}"
+        }, status=500)
+
+
+@require_GET
+async def validate_step_access(request, instance_id, step_id):
+    """Async validate_step_access (user_email query parameter required)"""
+    try:
+        user_email = request.GET.get('user_email')
+        if not user_email:
+            return FastJsonResponse({
+                "error": "user_email query parameter required"
+            }, status=400)
+
+        instance = await workflow_service.aget_workflow_instance(instance_id)
+        if not instance:
+            return FastJsonResponse({
+                "error": "Workflow instance not found"
+            }, status=404)
+
+        # Definition and referenced step data are loaded once; the checks below are in memory
+        workflow_definition = await workflow_service.aget_instance_workflow(instance)
+        referenced_step_data = await workflow_service.aget_referenced_step_data(instance, step_id)
+
+        if not workflow_service.is_assignee(workflow_definition, step_id, user_email, instance, referenced_step_data):
+            return FastJsonResponse({
+                "error": "Not authorized to access this step",
+                "authorized": False
+            }, status=403)
+
+        step = workflow_definition.get_step(step_id) if workflow_definition else None
+        if not step:
+            return FastJsonResponse({
+                "error": "Step not found"
+            }, status=404)
+
+        templates = workflow_definition.get_templates(step_id)
+        with timed('resolution'):
+            resolved_values = templates.resolve_fields(instance, referenced_step_data)
+        step = overlay_field_values(step, resolved_values)
+
+        return FastJsonResponse({
+            "success": True,
+            "authorized": True,
+            "data": {
+                "step": step,
+                "instance": {
+                    "instance_id": str(instance.instance_id),
+                    "current_step_id": instance.current_step_id,
+                    "status": instance.status,
+                    "version": instance.version
+                }
+            }
+        }, status=200)
+
+    except Exception as e:
+        return FastJsonResponse({
+            "error": f"An error occurred: {str(e)}"
+        }, status=500)
+
+
+@require_POST
+@csrf_exempt
+@idempotent
+async def submit_step_data(request, instance_id, step_id):
+    """Async submit_step_data (same payload and response, 409 on a version conflict)"""
+    try:
+        data = json.loads(request.body) if request.body else {}
+
+        # Validate required fields
+        if not data.get('user_email'):
+            return FastJsonResponse({
+                "error": "user_email is required"
+            }, status=400)
+
+        if 'step_data' not in data:
+            return FastJsonResponse({
+                "error": "step_data is required"
+            }, status=400)
+
+        step_execution = await sync_to_async(workflow_service.submit_step_data)(
+            instance_id=instance_id,
+            step_id=step_id,
+            step_data=data['step_data'],
+            user_email=data['user_email'],
+            expected_version=data.get('version')
+        )
+        instance = step_execution.workflow_instance
+
+        return FastJsonResponse({
+            "success": True,
+            "message": "Step data submitted successfully",
+            "data": {
+                "step_execution_id": step_execution.execution_id,
+                "instance": {
+                    "instance_id": str(instance.instance_id),
+                    "current_step_id": instance.current_step_id,
+                    "status": instance.status,
+                    "updated_at": instance.updated_at,
+                    "version": instance.version
+                }
+            }
+        }, status=200)
+
+    except WorkflowConflictError as e:
+        return FastJsonResponse({
+            "error": str(e),
+            "conflict": True
+        }, status=409)
+    except ValidationError as e:
+        return FastJsonResponse({
+            "error": str(e)
+        }, status=400)
+    except json.JSONDecodeError:
+        return FastJsonResponse({
+            "error": "Invalid JSON payload"
+        }, status=400)
+    except Exception as e:
+        return FastJsonResponse({
+            "error": f"An error occurred: {str(e)}"
+        }, status=500)
+
+
+@require_GET
+async def get_pending_workflows_for_user(request):
+    """Async get_pending_workflows_for_user (the inbox clients poll)"""
+    try:
+        user_email = request.GET.get('user_email')
+        if not user_email:
+            return FastJsonResponse({
+                "error": "user_email parameter is required"
+            }, status=400)
+
+        # URL decode the email parameter (handle %40 -> @)
+        user_email = unquote(user_email)
+
+        try:
+            limit = min(int(request.GET['limit']), 500) if 'limit' in request.GET else None
+            inbox = await ainbox_page(user_email, request.GET.get('cursor'), limit)
+        except (InvalidCursor, ValueError) as e:
+            return FastJsonResponse({"error": str(e)}, status=400)
+
+        return FastJsonResponse(inbox, status=200)
+
+    except Exception as e:
+        logger.exception("Error in async get_pending_workflows_for_user")
+        return FastJsonResponse({
+            "error": f"An error occurred: {str(e)}"
+        }, status=500)
+
+
+@require_GET
+async def pending_workflow_events(request):
+    """
+    Server-Sent Events stream of the user's inbox changes (user_email query
+    parameter required). Reconnects resume after the Last-Event-ID header, or
+    the last_event_id query parameter for clients that cannot set headers.
+    """
+    user_email = request.GET.get('user_email')
+    if not user_email:
+        return FastJsonResponse({
+            "error": "user_email parameter is required"
+        }, status=400)
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        since = parse_event_id(last_event_id) if last_event_id else None
+    except (ValueError, OverflowError):
+        return FastJsonResponse({
+            "error": "Invalid Last-Event-ID"
+        }, status=400)
+
+    response = StreamingHttpResponse(inbox_event_stream(unquote(user_email), since), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Keep nginx and similar proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
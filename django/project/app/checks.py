@@ -0,0 +1,21 @@
+from django.core.checks import Error, Warning, register
+from django.core.exceptions import ValidationError
+
+
+@register()
+def check_workflow_definitions(app_configs, **kwargs):
+    """Validate workflow.json at startup so broken definitions never reach request handling"""
+    from .workflow_service import workflow_service
+
+    try:
+        registry = workflow_service.get_registry()
+    except FileNotFoundError as e:
+        return [Error(str(e), id='app.E001')]
+    except ValidationError as e:
+        return [Error(message, obj='workflow.json', id='app.E002') for message in e.messages]
+
+    messages = []
+    for workflow in registry.workflows.values():
+        for warning in workflow.analysis.warnings:
+            messages.append(Warning(f"Workflow '{workflow.id}': {warning}", obj='workflow.json', id='app.W001'))
+    return messages
@@ -0,0 +1,152 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from .models import WorkflowDefinition
+from .workflow_registry import CompiledWorkflow
+
+
+class WorkflowDefinitionStore:
+    """
+    Versioned workflow definitions backed by the WorkflowDefinition table.
+
+    Every distinct definition content gets its own version number. Instances are
+    pinned to the version they started on, and compiled versions are kept in an
+    in-process LRU cache keyed by (workflow_id, version), so lookups stop hitting
+    the database once warm.
+    """
+
+    def __init__(self, maxsize: Optional[int] = None):
+        self.maxsize = maxsize or getattr(settings, 'WORKFLOW_DEFINITION_CACHE_SIZE', 256)
+        self._cache: 'OrderedDict[Tuple[str, int], CompiledWorkflow]' = OrderedDict()
+        self._published: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def publish(self, compiled: CompiledWorkflow) -> int:
+        """Return the version for this definition content, storing a new version if needed"""
+        key = (compiled.id, compiled.checksum)
+        version = self._published.get(key)
+        if version is not None:
+            return version
+
+        existing = WorkflowDefinition.objects.filter(
+            workflow_id=compiled.id,
+            checksum=compiled.checksum
+        ).order_by('-version').values_list('version', flat=True).first()
+
+        if existing is not None:
+            version = existing
+        else:
+            version = self._create_version(compiled)
+
+        pinned = CompiledWorkflow(compiled.definition, version=version, checksum=compiled.checksum)
+        with self._lock:
+            self._published[key] = version
+            self._put((compiled.id, version), pinned)
+        return version
+
+    def get(self, workflow_id: str, version: int) -> Optional[CompiledWorkflow]:
+        """Get a pinned definition version, compiling it from the database on a cache miss"""
+        key = (workflow_id, version)
+        with self._lock:
+            compiled = self._cache.get(key)
+            if compiled is not None:
+                self._cache.move_to_end(key)
+                return compiled
+
+        try:
+            stored = WorkflowDefinition.objects.only('definition', 'checksum').get(
+                workflow_id=workflow_id,
+                version=version
+            )
+        except WorkflowDefinition.DoesNotExist:
+            return None
+
+        compiled = CompiledWorkflow(stored.definition, version=version, checksum=stored.checksum)
+        with self._lock:
+            self._put(key, compiled)
+        return compiled
+
+    def get_many(self, keys) -> Dict[Tuple[str, int], CompiledWorkflow]:
+        """get() for several (workflow_id, version) keys, loading all cache misses with one query"""
+        found: Dict[Tuple[str, int], CompiledWorkflow] = {}
+        missing = set()
+        with self._lock:
+            for key in set(keys):
+                compiled = self._cache.get(key)
+                if compiled is not None:
+                    self._cache.move_to_end(key)
+                    found[key] = compiled
+                else:
+                    missing.add(key)
+        if not missing:
+            return found
+
+        stored_rows = WorkflowDefinition.objects.filter(
+            workflow_id__in={workflow_id for workflow_id, _ in missing},
+            version__in={version for _, version in missing}
+        ).only('workflow_id', 'version', 'definition', 'checksum')
+        with self._lock:
+            for stored in stored_rows:
+                key = (stored.workflow_id, stored.version)
+                if key in missing:
+                    found[key] = CompiledWorkflow(stored.definition, version=stored.version, checksum=stored.checksum)
+                    self._put(key, found[key])
+        return found
+
+    async def aget(self, workflow_id: str, version: int) -> Optional[CompiledWorkflow]:
+        """Async get(); cache hits never leave the event loop"""
+        key = (workflow_id, version)
+        with self._lock:
+            compiled = self._cache.get(key)
+            if compiled is not None:
+                self._cache.move_to_end(key)
+                return compiled
+
+        try:
+            stored = await WorkflowDefinition.objects.only('definition', 'checksum').aget(
+                workflow_id=workflow_id,
+                version=version
+            )
+        except WorkflowDefinition.DoesNotExist:
+            return None
+
+        compiled = CompiledWorkflow(stored.definition, version=version, checksum=stored.checksum)
+        with self._lock:
+            self._put(key, compiled)
+        return compiled
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._published.clear()
+
+    def _create_version(self, compiled: CompiledWorkflow) -> int:
+        while True:
+            latest = WorkflowDefinition.objects.filter(
+                workflow_id=compiled.id
+            ).order_by('-version').values_list('version', flat=True).first()
+            try:
+                with transaction.atomic():
+                    return WorkflowDefinition.objects.create(
+                        workflow_id=compiled.id,
+                        version=(latest or 0) + 1,
+                        name=compiled.name,
+                        definition=compiled.definition,
+                        checksum=compiled.checksum
+                    ).version
+            except IntegrityError:
+                # Another worker published concurrently; reuse its row if it has our content
+                existing = WorkflowDefinition.objects.filter(
+                    workflow_id=compiled.id,
+                    checksum=compiled.checksum
+                ).values_list('version', flat=True).first()
+                if existing is not None:
+                    return existing
+
+    def _put(self, key: Tuple[str, int], compiled: CompiledWorkflow):
+        self._cache[key] = compiled
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
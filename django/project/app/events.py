@@ -0,0 +1,245 @@
+"""
+Live inbox updates pushed over Server-Sent Events (app/async/workflows/pending/events/).
+
+Writes publish an event per affected user once their transaction commits:
+"assigned" to the assignee of a new pending step execution, "completed" to
+the assignee and the executor of a completed one. The broker fans events out
+in memory to the SSE streams open in this process, so an idle stream costs
+no queries at all. A reconnecting client sends Last-Event-ID and is caught
+up with one query for the executions that changed since that event.
+
+The broker only reaches streams in the process that made the change. With
+several ASGI workers, each open stream also re-runs the catch-up query every
+SSE_RESYNC_INTERVAL seconds (0 disables it) to pick up the others' changes.
+Events may therefore arrive more than once; clients should treat them as
+idempotent (keyed by execution_id and status).
+"""
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils.timezone import now
+
+from .models import StepExecution
+from .queries import step_execution_changes
+from .renderers import dumps
+
+
+ASSIGNED = 'assigned'
+COMPLETED = 'completed'
+# Tells the client to refetch its inbox: the stream could not say exactly what changed
+RESYNC = 'resync'
+READY = 'ready'
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def event_id(timestamp: datetime) -> str:
+    """SSE event id for a change at `timestamp` (microseconds since the epoch)"""
+    return str((timestamp - _EPOCH) // timedelta(microseconds=1))
+
+
+def parse_event_id(value: str) -> datetime:
+    """Inverse of event_id; raises ValueError for ids this server did not issue"""
+    return _EPOCH + timedelta(microseconds=int(value))
+
+
+def execution_event(execution: StepExecution) -> Dict[str, Any]:
+    """The event describing the current state of a step execution"""
+    instance = execution.workflow_instance
+    return {
+        "event": COMPLETED if execution.status == 'completed' else ASSIGNED,
+        "id": event_id(execution.updated_at),
+        "data": {
+            "execution_id": execution.execution_id,
+            "instance_id": str(instance.instance_id),
+            "workflow_id": instance.workflow_id,
+            "workflow_name": instance.workflow_name,
+            "step_id": execution.step_id,
+            "step_name": execution.step_name,
+            "status": execution.status,
+            "assigned_to_email": execution.assigned_to_email,
+            "executed_by_email": execution.executed_by_email,
+            "initiated_by_email": instance.initiated_by_email,
+            "updated_at": execution.updated_at
+        }
+    }
+
+
+def event_recipients(execution: StepExecution) -> Set[str]:
+    if execution.status == 'completed':
+        emails = {execution.assigned_to_email, execution.executed_by_email}
+    else:
+        emails = {execution.assigned_to_email}
+    return {email.lower() for email in emails if email}
+
+
+def format_event(event: Dict[str, Any]) -> str:
+    data = dumps(event.get("data", {})).decode('utf-8')
+    lines = [f"event: {event['event']}"]
+    if event.get("id"):
+        lines.append(f"id: {event['id']}")
+    lines.append(f"data: {data}")
+    return "\n".join(lines) + "\n\n"
+
+
+class Subscription:
+    """One open stream: a bounded queue on the stream's event loop"""
+
+    def __init__(self, user_email: str, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.user_email = user_email
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def put(self, event: Dict[str, Any]):
+        # Runs on self.loop; a client too slow to keep up gets a resync instead
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class InboxBroker:
+    """In-process pub/sub from committed writes to the SSE streams of this process"""
+
+    def __init__(self):
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_email: str) -> Subscription:
+        subscription = Subscription(user_email.lower(), asyncio.get_running_loop(), settings.SSE_QUEUE_SIZE)
+        with self._lock:
+            self._subscriptions.setdefault(subscription.user_email, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_email)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_email]
+
+    def has_subscribers(self, user_email: str) -> bool:
+        return user_email.lower() in self._subscriptions
+
+    def publish(self, user_email: str, event: Dict[str, Any]):
+        """Deliver an event to the user's open streams; safe to call from any thread"""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_email.lower(), ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                # The stream's loop is gone; its finally block unsubscribes it
+                pass
+
+
+broker = InboxBroker()
+
+
+def publish_on_commit(executions: Iterable[Optional[StepExecution]]):
+    """
+    Publish the events for executions written in the current transaction once
+    it commits. Events are built now, from the in-memory objects, so
+    publishing costs no queries; users without an open stream are skipped.
+    """
+    events = []
+    for execution in executions:
+        if execution is None:
+            continue
+        recipients = [email for email in event_recipients(execution) if broker.has_subscribers(email)]
+        if recipients:
+            events.append((recipients, execution_event(execution)))
+    if events:
+        transaction.on_commit(lambda: _publish(events))
+
+
+def _publish(events):
+    for recipients, event in events:
+        for email in recipients:
+            broker.publish(email, event)
+
+
+def catch_up(user_email: str, since: datetime) -> List[Dict[str, Any]]:
+    """
+    Events for the user's executions changed at or after `since`, oldest
+    first. At most SSE_CATCH_UP_LIMIT are returned; if more changed, a single
+    resync event replaces them.
+    """
+    limit = settings.SSE_CATCH_UP_LIMIT
+    executions = list(
+        step_execution_changes(user_email, since)[:limit + 1]
+    )
+    if len(executions) > limit:
+        return [{"event": RESYNC, "id": event_id(executions[-1].updated_at), "data": {"reason": "too_many_changes"}}]
+    return [execution_event(execution) for execution in executions]
+
+
+def _event_key(event: Dict[str, Any]):
+    return event["event"], event.get("id"), event["data"].get("execution_id")
+
+
+async def inbox_event_stream(user_email: str, since: Optional[datetime]):
+    """
+    The SSE body for one client. Without a Last-Event-ID the stream opens with
+    a "ready" event: the client loads its inbox once, and a later reconnect
+    resumes from there. Comment lines keep idle connections (and proxies) open.
+    """
+    subscription = broker.subscribe(user_email)
+    keepalive = settings.SSE_KEEPALIVE_INTERVAL
+    resync_interval = settings.SSE_RESYNC_INTERVAL
+    try:
+        yield f"retry: {int(settings.SSE_RETRY_MS)}\n\n"
+        synced_at = now()
+        if since is None:
+            yield format_event({"event": READY, "id": event_id(synced_at), "data": {}})
+        else:
+            for event in await sync_to_async(catch_up)(user_email, since):
+                yield format_event(event)
+        next_resync = time.monotonic() + resync_interval if resync_interval else None
+        # Events already pushed since the previous resync, so it does not repeat them
+        delivered = set()
+
+        while True:
+            timeout = keepalive
+            if next_resync is not None:
+                timeout = max(0.0, min(timeout, next_resync - time.monotonic()))
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                event = None
+
+            if subscription.overflowed:
+                while not subscription.queue.empty():
+                    subscription.queue.get_nowait()
+                subscription.overflowed = False
+                synced_at = now()
+                yield format_event({"event": RESYNC, "id": event_id(synced_at), "data": {"reason": "overflow"}})
+                continue
+            if event is not None:
+                delivered.add(_event_key(event))
+                yield format_event(event)
+                continue
+
+            if next_resync is not None and time.monotonic() >= next_resync:
+                # Look back a little: a write can commit after our previous query with an earlier timestamp
+                started = now()
+                window_start = synced_at - timedelta(seconds=settings.SSE_RESYNC_OVERLAP)
+                missed = await sync_to_async(catch_up)(user_email, window_start)
+                for event in missed:
+                    if _event_key(event) not in delivered:
+                        yield format_event(event)
+                delivered = {_event_key(event) for event in missed}
+                synced_at = started
+                next_resync = time.monotonic() + resync_interval
+            else:
+                yield ": keepalive\n\n"
+    finally:
+        broker.unsubscribe(subscription)
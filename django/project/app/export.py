@@ -0,0 +1,128 @@
+"""
+Streaming exports of workflow instances with their step executions and step_data.
+
+Instances are read with QuerySet.iterator(chunk_size), which fetches them
+from the database a chunk at a time and prefetches the step executions of
+each chunk with one more query, and every record is encoded as soon as it is
+read. Only one chunk is held in memory at a time, however many rows the
+export has, so the view can hand the generator to a StreamingHttpResponse.
+
+NDJSON writes one line per instance with its executions under "steps". CSV
+writes one row per step execution, repeating the instance columns (instances
+without executions get a single row with empty step columns), and step_data
+as a JSON string.
+"""
+import csv
+import datetime
+import uuid
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from django.conf import settings
+from django.db.models import Prefetch, QuerySet
+
+from .models import StepExecution, WorkflowInstance
+from .queries import filter_workflow_instances
+from .renderers import dumps
+
+
+NDJSON = 'ndjson'
+CSV = 'csv'
+CONTENT_TYPES = {
+    NDJSON: 'application/x-ndjson',
+    CSV: 'text/csv; charset=utf-8',
+}
+
+# Oldest first, on the (created_at, instance_id) index
+EXPORT_ORDERING = ('created_at', 'instance_id')
+
+INSTANCE_FIELDS = [
+    'instance_id', 'workflow_id', 'workflow_name', 'workflow_version', 'current_step_id', 'status',
+    'initiated_by_email', 'initiated_by_clerk_id', 'created_at', 'updated_at', 'completed_at'
+]
+STEP_FIELDS = [
+    'execution_id', 'step_id', 'step_name', 'status', 'assigned_to_email', 'executed_by_email',
+    'step_data', 'started_at', 'completed_at', 'created_at', 'updated_at'
+]
+# CSV header of the step columns, prefixed where they clash with instance columns
+CSV_STEP_COLUMNS = [
+    'execution_id', 'step_id', 'step_name', 'step_status', 'assigned_to_email', 'executed_by_email',
+    'step_data', 'step_started_at', 'step_completed_at', 'step_created_at', 'step_updated_at'
+]
+
+# Encoded output is handed to the server in pieces of about this many bytes
+WRITE_BUFFER_SIZE = 64 * 1024
+
+
+def export_queryset(**filters) -> QuerySet:
+    """Instances matching the listing filters (see filter_workflow_instances), in export order"""
+    return filter_workflow_instances(WorkflowInstance.objects.all(), **filters).only(*INSTANCE_FIELDS).prefetch_related(
+        Prefetch('step_executions', queryset=StepExecution.objects.order_by('created_at', 'execution_id'))
+    ).order_by(*EXPORT_ORDERING)
+
+
+def export_records(queryset: QuerySet, chunk_size: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Each instance as a dict with its executions under "steps", read chunk_size instances at a time"""
+    for instance in queryset.iterator(chunk_size=chunk_size or settings.EXPORT_CHUNK_SIZE):
+        record = {field: getattr(instance, field) for field in INSTANCE_FIELDS}
+        record["steps"] = [
+            {field: getattr(execution, field) for field in STEP_FIELDS}
+            for execution in instance.step_executions.all()
+        ]
+        yield record
+
+
+def _ndjson_lines(records: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    for record in records:
+        yield dumps(record) + b'\n'
+
+
+class _Echo:
+    """File-like object whose write() returns the line, so csv.writer can encode one row at a time"""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ''
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (dict, list)):
+        return dumps(value).decode('utf-8')
+    return value
+
+
+def _csv_lines(records: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    writer = csv.writer(_Echo())
+    yield writer.writerow(INSTANCE_FIELDS + CSV_STEP_COLUMNS).encode('utf-8')
+    for record in records:
+        instance_values = [_csv_value(record[field]) for field in INSTANCE_FIELDS]
+        steps = record["steps"] or [None]
+        for step in steps:
+            step_values = [_csv_value(step[field]) for field in STEP_FIELDS] if step else [''] * len(STEP_FIELDS)
+            yield writer.writerow(instance_values + step_values).encode('utf-8')
+
+
+def _buffered(lines: Iterable[bytes], size: int = WRITE_BUFFER_SIZE) -> Iterator[bytes]:
+    buffer: List[bytes] = []
+    buffered = 0
+    for line in lines:
+        buffer.append(line)
+        buffered += len(line)
+        if buffered >= size:
+            yield b''.join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def stream_export(queryset: QuerySet, export_format: str = NDJSON, chunk_size: Optional[int] = None) -> Iterator[bytes]:
+    """The encoded export of the queryset's instances, as a generator of byte strings"""
+    if export_format not in CONTENT_TYPES:
+        raise ValueError(f"Unsupported export format: {export_format}. Use one of: {', '.join(CONTENT_TYPES)}")
+    encode = _csv_lines if export_format == CSV else _ndjson_lines
+    return _buffered(encode(export_records(queryset, chunk_size)))
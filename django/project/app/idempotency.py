@@ -0,0 +1,215 @@
+import hashlib
+import logging
+import threading
+import time
+import zlib
+from datetime import timedelta
+from functools import wraps
+from typing import Dict, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils.timezone import now
+
+from .models import IdempotencyRecord
+from .renderers import FastJsonResponse
+
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+# Expired records are purged at most this often (seconds) per process
+PURGE_INTERVAL = 300
+
+# Responses with these statuses are not stored, so a retry with the same key runs again
+# (409: lost an optimistic concurrency race and should be retried)
+RETRYABLE_STATUSES = frozenset({409})
+
+
+class _InFlight:
+    """Requests currently executing in this process, so local duplicates wait on an event instead of polling"""
+
+    def __init__(self):
+        self._events: Dict[Tuple[str, str], threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def start(self, scope: str, key: str) -> threading.Event:
+        with self._lock:
+            return self._events.setdefault((scope, key), threading.Event())
+
+    def get(self, scope: str, key: str) -> Optional[threading.Event]:
+        with self._lock:
+            return self._events.get((scope, key))
+
+    def finish(self, scope: str, key: str):
+        with self._lock:
+            event = self._events.pop((scope, key), None)
+        if event is not None:
+            event.set()
+
+
+_in_flight = _InFlight()
+_last_purge = 0.0
+
+
+def _purge_expired():
+    global _last_purge
+    if time.monotonic() - _last_purge < PURGE_INTERVAL:
+        return
+    _last_purge = time.monotonic()
+    deleted, _ = IdempotencyRecord.objects.filter(expires_at__lt=now()).delete()
+    if deleted:
+        logger.debug("Purged %d expired idempotency records", deleted)
+
+
+def _claim(scope: str, key: str, fingerprint: str) -> Tuple[IdempotencyRecord, bool]:
+    """Insert an in-progress record for the key; returns (record, created)"""
+    expires_at = now() + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    try:
+        with transaction.atomic():
+            return IdempotencyRecord.objects.create(scope=scope, key=key, fingerprint=fingerprint, expires_at=expires_at), True
+    except IntegrityError:
+        pass
+
+    record = IdempotencyRecord.objects.filter(scope=scope, key=key).first()
+    if record is not None and record.expires_at <= now():
+        # Expired: take the key over, unless another request just did
+        if IdempotencyRecord.objects.filter(pk=record.pk, expires_at=record.expires_at).delete()[0]:
+            return _claim(scope, key, fingerprint)
+        record = IdempotencyRecord.objects.filter(scope=scope, key=key).first()
+    if record is None:
+        return _claim(scope, key, fingerprint)
+    return record, False
+
+
+def _wait_for_completion(record: IdempotencyRecord) -> Optional[IdempotencyRecord]:
+    """Wait for the original request holding the key to finish; None on timeout or if it failed"""
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+    delay = 0.05
+    while record is not None and record.status == 'in_progress':
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        event = _in_flight.get(record.scope, record.key)
+        if event is not None:
+            event.wait(min(remaining, 1.0))
+        else:
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.5)
+        record = IdempotencyRecord.objects.filter(pk=record.pk).first()
+    return record
+
+
+def _replay(record: IdempotencyRecord) -> HttpResponse:
+    content = zlib.decompress(bytes(record.response_body)) if record.response_body else b''
+    response = HttpResponse(content, status=record.response_status, content_type=record.response_content_type or None)
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def _begin(request) -> Tuple[Optional[HttpResponse], Optional[IdempotencyRecord]]:
+    """
+    Resolve the Idempotency-Key of a request before the view runs. Returns
+    (response, None) when the view must not run (replay or rejection),
+    (None, record) when this request claimed the key, or (None, None) when
+    the request has no key.
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if not key:
+        return None, None
+    if len(key) > MAX_KEY_LENGTH:
+        return FastJsonResponse({
+            "error": f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters"
+        }, status=400), None
+
+    _purge_expired()
+    scope = f"{request.method} {request.path}"
+    fingerprint = hashlib.sha256(request.body).hexdigest()
+    record, created = _claim(scope, key, fingerprint)
+
+    if created:
+        _in_flight.start(scope, key)
+        return None, record
+
+    if record.fingerprint != fingerprint:
+        return FastJsonResponse({
+            "error": f"{IDEMPOTENCY_HEADER} was already used with a different request body"
+        }, status=422), None
+    completed = _wait_for_completion(record)
+    if completed is None:
+        return FastJsonResponse({
+            "error": f"The request with this {IDEMPOTENCY_HEADER} is still in progress or did not complete; retry later"
+        }, status=409), None
+    return _replay(completed), None
+
+
+def _finish(record: IdempotencyRecord, response: Optional[HttpResponse]):
+    """Store the response for the claimed key (or release the key if it must not be replayed)"""
+    try:
+        if response is None or response.status_code >= 500 or response.status_code in RETRYABLE_STATUSES or response.streaming:
+            IdempotencyRecord.objects.filter(pk=record.pk).delete()
+            return
+
+        if hasattr(response, 'render') and not response.is_rendered:
+            response.render()
+        IdempotencyRecord.objects.filter(pk=record.pk).update(
+            status='completed',
+            response_status=response.status_code,
+            response_content_type=response.get('Content-Type', ''),
+            response_body=zlib.compress(response.content)
+        )
+    finally:
+        # Wake local duplicates only once the outcome is stored
+        _in_flight.finish(record.scope, record.key)
+
+
+def idempotent(view):
+    """
+    Honour an Idempotency-Key header on a write endpoint (sync or async view).
+
+    The first request with a key runs the view and stores its response
+    (compressed, expiring after IDEMPOTENCY_KEY_TTL); later requests with the
+    same key, method and path get the stored response back without running the
+    view. Duplicates that arrive while the first is still running wait for it
+    (up to IDEMPOTENCY_WAIT_TIMEOUT) and replay its response. Reusing a key with
+    a different body is rejected with 422. Server errors and retryable
+    conflicts are not stored, so the client can retry them with the same key.
+    Requests without the header are passed straight through.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            response, record = await sync_to_async(_begin)(request)
+            if response is not None:
+                return response
+            if record is None:
+                return await view(request, *args, **kwargs)
+            response = None
+            try:
+                response = await view(request, *args, **kwargs)
+            finally:
+                await sync_to_async(_finish)(record, response)
+            return response
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response, record = _begin(request)
+        if response is not None:
+            return response
+        if record is None:
+            return view(request, *args, **kwargs)
+        response = None
+        try:
+            response = view(request, *args, **kwargs)
+        finally:
+            _finish(record, response)
+        return response
+
+    return wrapper
@@ -0,0 +1,151 @@
+"""
+The inbox projection: pending work per assignee, denormalized into InboxItem.
+
+An instance is in its assignee's inbox while the execution of its current
+step is pending. WorkflowService keeps the rows in step with the source
+tables in the same transactions that start and advance instances (see
+sync_inbox), so reading an inbox is one range scan of the assignee's rows
+instead of a join plus definition lookups per row. Anything that changes
+instances or executions outside the service (admin edits, data fixes) must
+call refresh_inbox, or run `python manage.py rebuild_inbox` afterwards.
+"""
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import InboxItem, StepExecution, WorkflowInstance
+from .pagination import akeyset_paginate, keyset_paginate
+from .queries import INBOX_ORDERING, inbox_groups, inbox_items
+
+
+# Rows per INSERT when rebuilding
+REBUILD_BATCH_SIZE = 500
+
+_COPIED_FIELDS = [
+    'execution', 'assigned_to_email', 'workflow_id', 'workflow_name', 'step_id', 'step_name',
+    'status', 'initiated_by_email', 'created_at', 'step_created_at'
+]
+
+
+def inbox_item(instance: WorkflowInstance, execution: StepExecution) -> InboxItem:
+    """The inbox row for an instance waiting on a (saved) pending execution"""
+    return InboxItem(
+        instance=instance,
+        execution=execution,
+        assigned_to_email=execution.assigned_to_email,
+        workflow_id=instance.workflow_id,
+        workflow_name=instance.workflow_name,
+        step_id=execution.step_id,
+        step_name=execution.step_name,
+        status=instance.status,
+        initiated_by_email=instance.initiated_by_email,
+        created_at=instance.created_at,
+        step_created_at=execution.created_at
+    )
+
+
+def sync_inbox(waiting: Dict[WorkflowInstance, Optional[StepExecution]]):
+    """
+    Bring the inbox rows of instances written in the current transaction up
+    to date: `waiting` maps each instance to the pending execution of its
+    current step, or None if nobody is assigned to it (or it completed).
+    At most two queries, one upsert and one delete, however many instances.
+    """
+    items = []
+    cleared = []
+    for instance, execution in waiting.items():
+        if execution is not None and execution.status == 'pending' and execution.assigned_to_email:
+            items.append(inbox_item(instance, execution))
+        else:
+            cleared.append(instance.pk)
+    if items:
+        InboxItem.objects.bulk_create(items, update_conflicts=True, unique_fields=['instance'], update_fields=_COPIED_FIELDS)
+    if cleared:
+        InboxItem.objects.filter(instance_id__in=cleared).delete()
+
+
+def refresh_inbox(instance_ids: Optional[Iterable] = None, batch_size: int = REBUILD_BATCH_SIZE) -> int:
+    """
+    Regenerate the inbox rows of the given instances (all of them if None)
+    from the source tables; returns the number of rows written.
+    """
+    executions = StepExecution.objects.filter(
+        status='pending',
+        step_id=F('workflow_instance__current_step_id')
+    ).exclude(assigned_to_email__isnull=True).exclude(assigned_to_email='').select_related('workflow_instance')
+    items = InboxItem.objects.all()
+    if instance_ids is not None:
+        instance_ids = list(instance_ids)
+        executions = executions.filter(workflow_instance_id__in=instance_ids)
+        items = items.filter(instance_id__in=instance_ids)
+
+    written = 0
+    with transaction.atomic():
+        items.delete()
+        batch = []
+        for execution in executions.iterator(chunk_size=batch_size):
+            batch.append(inbox_item(execution.workflow_instance, execution))
+            if len(batch) >= batch_size:
+                InboxItem.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            InboxItem.objects.bulk_create(batch)
+            written += len(batch)
+    return written
+
+
+def serialize_item(item: InboxItem) -> Dict[str, Any]:
+    return {
+        "instance_id": str(item.instance_id),
+        "workflow_id": item.workflow_id,
+        "workflow_name": item.workflow_name,
+        "current_step_id": item.step_id,
+        "step_name": item.step_name,
+        "initiated_by_email": item.initiated_by_email,
+        "created_at": item.created_at,
+        "step_created_at": item.step_created_at,
+        "status": item.status
+    }
+
+
+def inbox_page(user_email: str, cursor: Optional[str] = None, limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    A user's inbox, oldest pending step first, with the number of items per
+    workflow. The whole inbox without a limit, otherwise one keyset page and
+    its next_cursor (raises InvalidCursor for a bad cursor). Two queries.
+    """
+    queryset = inbox_items(user_email)
+    if limit is None and not cursor:
+        items: List[InboxItem] = list(queryset)
+        next_cursor = None
+    else:
+        items, next_cursor = keyset_paginate(queryset, INBOX_ORDERING, cursor, limit or 100)
+    return _inbox_response(items, next_cursor, list(inbox_groups(user_email)))
+
+
+async def ainbox_page(user_email: str, cursor: Optional[str] = None, limit: Optional[int] = None) -> Dict[str, Any]:
+    """Async inbox_page, reading with the async ORM"""
+    queryset = inbox_items(user_email)
+    if limit is None and not cursor:
+        items: List[InboxItem] = [item async for item in queryset]
+        next_cursor = None
+    else:
+        items, next_cursor = await akeyset_paginate(queryset, INBOX_ORDERING, cursor, limit or 100)
+    return _inbox_response(items, next_cursor, [group async for group in inbox_groups(user_email)])
+
+
+def _inbox_response(items: List[InboxItem], next_cursor: Optional[str], groups: List[Dict[str, Any]]) -> Dict[str, Any]:
+    groups = [
+        {"workflow_id": group['workflow_id'], "workflow_name": group['workflow_name'], "count": group['count']}
+        for group in groups
+    ]
+    return {
+        "success": True,
+        "data": [serialize_item(item) for item in items],
+        "count": len(items),
+        "total_count": sum(group['count'] for group in groups),
+        "groups": groups,
+        "next_cursor": next_cursor
+    }
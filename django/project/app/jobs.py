@@ -0,0 +1,232 @@
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import threading
+import traceback
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import django
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils.timezone import now
+
+from .models import Job
+
+
+logger = logging.getLogger(__name__)
+
+# Longest traceback kept in Job.last_error
+MAX_ERROR_LENGTH = 10000
+
+_handlers: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+# Names of the handlers that run inside a transaction
+_atomic_handlers: Set[str] = set()
+
+
+def job(name: str, atomic: bool = False):
+    """
+    Register the decorated function as the handler for jobs called `name`; it receives the payload dict.
+
+    Handlers run in autocommit mode. A transaction holds the SQLite write lock
+    until it ends, blocking every web request that writes, so handlers open
+    short ones around their database writes only, never around network calls.
+    atomic=True runs the whole handler in one, for quick handlers that only
+    touch the database.
+    """
+    def decorator(func):
+        if _handlers.get(name, func) is not func:
+            raise ValueError(f"A job handler is already registered for '{name}'")
+        _handlers[name] = func
+        if atomic:
+            _atomic_handlers.add(name)
+        return func
+    return decorator
+
+
+def enqueue(name: str, payload: Optional[Dict[str, Any]] = None, delay: float = 0, max_attempts: Optional[int] = None) -> Job:
+    """
+    Queue a job. Call it inside the transaction that makes the change the job
+    follows up on: the job then commits (or rolls back) together with it.
+    """
+    return enqueue_many([(name, payload)], delay, max_attempts)[0]
+
+
+def enqueue_many(jobs: Iterable[Tuple[str, Optional[Dict[str, Any]]]], delay: float = 0, max_attempts: Optional[int] = None) -> List[Job]:
+    """Queue several (name, payload) jobs with one INSERT"""
+    run_at = now() + timedelta(seconds=delay)
+    rows = []
+    for name, payload in jobs:
+        if name not in _handlers:
+            raise ValueError(f"No job handler registered for '{name}'")
+        rows.append(Job(
+            name=name,
+            payload=payload or {},
+            run_at=run_at,
+            max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS
+        ))
+    return Job.objects.bulk_create(rows)
+
+
+def retry_delay(attempt: int) -> float:
+    """Seconds to wait before retrying after the given (1-based) failed attempt: exponential, capped, with jitter"""
+    delay = min(settings.JOB_RETRY_BACKOFF_MAX, settings.JOB_RETRY_BACKOFF * 2 ** (attempt - 1))
+    return delay * random.uniform(0.9, 1.1)
+
+
+def claim(worker_id: str, limit: int) -> List[Job]:
+    """
+    Lock up to `limit` due jobs for this worker. Jobs still running past
+    JOB_LOCK_TIMEOUT (their worker died) are due again. The claim is a
+    conditional UPDATE, so concurrent workers never get the same job.
+    """
+    timestamp = now()
+    due = Q(status='queued', run_at__lte=timestamp) | Q(
+        status='running',
+        locked_at__lt=timestamp - timedelta(seconds=settings.JOB_LOCK_TIMEOUT)
+    )
+    ids = list(Job.objects.filter(due).order_by('run_at', 'job_id').values_list('job_id', flat=True)[:limit])
+    if not ids:
+        return []
+    Job.objects.filter(due, job_id__in=ids).update(
+        status='running',
+        locked_by=worker_id,
+        locked_at=timestamp,
+        attempts=F('attempts') + 1,
+        updated_at=timestamp
+    )
+    return list(Job.objects.filter(job_id__in=ids, status='running', locked_by=worker_id, locked_at=timestamp).order_by('run_at', 'job_id'))
+
+
+def run_job(claimed: Job) -> str:
+    """Run one claimed job (in a transaction if its handler is atomic) and record the outcome; returns the job's new status"""
+    handler = _handlers.get(claimed.name)
+    try:
+        if handler is None:
+            raise LookupError(f"No job handler registered for '{claimed.name}'")
+        if claimed.name in _atomic_handlers:
+            with transaction.atomic():
+                handler(claimed.payload)
+        else:
+            handler(claimed.payload)
+    except Exception:
+        error = traceback.format_exc()[-MAX_ERROR_LENGTH:]
+        if claimed.attempts >= claimed.max_attempts:
+            status, run_at = 'dead', claimed.run_at
+            logger.error("Job %s (%s) is dead after %d attempts", claimed.job_id, claimed.name, claimed.attempts, exc_info=True)
+        else:
+            status, run_at = 'queued', now() + timedelta(seconds=retry_delay(claimed.attempts))
+            logger.warning("Job %s (%s) failed on attempt %d, retrying at %s", claimed.job_id, claimed.name, claimed.attempts, run_at, exc_info=True)
+    else:
+        status, run_at, error = 'succeeded', claimed.run_at, ''
+
+    # Only the worker holding the lock records the outcome
+    Job.objects.filter(job_id=claimed.job_id, locked_by=claimed.locked_by, locked_at=claimed.locked_at).update(
+        status=status,
+        run_at=run_at,
+        last_error=error,
+        locked_by='',
+        locked_at=None,
+        updated_at=now()
+    )
+    return status
+
+
+def run_pending(worker_id: Optional[str] = None, limit: int = 100) -> Dict[str, int]:
+    """Claim and run due jobs in the current thread until none are left; returns counts by outcome"""
+    worker_id = worker_id or default_worker_id()
+    outcomes: Dict[str, int] = {}
+    while True:
+        claimed = claim(worker_id, limit)
+        if not claimed:
+            return outcomes
+        for pending in claimed:
+            status = run_job(pending)
+            outcomes[status] = outcomes.get(status, 0) + 1
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _run_in_thread(claimed: Job) -> str:
+    try:
+        return run_job(claimed)
+    finally:
+        connections.close_all()
+
+
+def _run_in_process(job_id: int, locked_by: str) -> str:
+    claimed = Job.objects.filter(job_id=job_id, locked_by=locked_by).first()
+    return run_job(claimed) if claimed is not None else 'lost'
+
+
+class Worker:
+    """
+    Polls the queue and runs jobs on a thread or process pool.
+
+    Only as many jobs are claimed as there are free pool slots, so a job is
+    never locked while waiting in a local queue.
+    """
+
+    def __init__(self, concurrency: int = 4, pool: str = 'thread', poll_interval: Optional[float] = None, worker_id: Optional[str] = None):
+        if pool not in ('thread', 'process'):
+            raise ValueError("pool must be 'thread' or 'process'")
+        self.concurrency = max(1, concurrency)
+        self.pool = pool
+        self.poll_interval = settings.JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.worker_id = worker_id or default_worker_id()
+        self.stopping = threading.Event()
+
+    def stop(self):
+        self.stopping.set()
+
+    def run(self, once: bool = False) -> Dict[str, int]:
+        """Process jobs until stop() is called (or, with once, until the queue is empty); returns counts by outcome"""
+        outcomes: Dict[str, int] = {}
+        if self.pool == 'process':
+            # Spawned (not forked) children never inherit this process's database connections;
+            # django.setup is the initializer because this module can only be imported after it
+            executor = ProcessPoolExecutor(
+                max_workers=self.concurrency,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup
+            )
+        else:
+            executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='job')
+
+        running = set()
+        try:
+            while not self.stopping.is_set():
+                claimed = claim(self.worker_id, self.concurrency - len(running)) if len(running) < self.concurrency else []
+                for pending in claimed:
+                    if self.pool == 'process':
+                        running.add(executor.submit(_run_in_process, pending.job_id, pending.locked_by))
+                    else:
+                        running.add(executor.submit(_run_in_thread, pending))
+
+                if not running:
+                    if once:
+                        break
+                    self.stopping.wait(self.poll_interval)
+                    continue
+
+                done, running = wait(running, timeout=0 if claimed else self.poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        status = future.result()
+                    except Exception:
+                        logger.exception("Job runner crashed")
+                        status = 'crashed'
+                    outcomes[status] = outcomes.get(status, 0) + 1
+        finally:
+            for future in wait(running).done:
+                if not future.exception():
+                    outcomes[future.result()] = outcomes.get(future.result(), 0) + 1
+            executor.shutdown(wait=True)
+        return outcomes
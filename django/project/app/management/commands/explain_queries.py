@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.queries import HOT_QUERIES, explain, full_scans
+
+
+class Command(BaseCommand):
+    help = "Print the database's plan for each hot workflow query and fail if any of them reads a whole table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help="Only explain these queries (default: all of them)")
+
+    def handle(self, *args, **options):
+        names = options['names'] or list(HOT_QUERIES)
+        unknown = [name for name in names if name not in HOT_QUERIES]
+        if unknown:
+            raise CommandError(f"Unknown queries: {', '.join(unknown)}. Known: {', '.join(HOT_QUERIES)}")
+
+        scanning = []
+        for name in names:
+            plan = explain(HOT_QUERIES[name]())
+            scans = full_scans(plan)
+            if scans:
+                scanning.append(name)
+            self.stdout.write(self.style.ERROR(f"{name}: full scan") if scans else self.style.SUCCESS(f"{name}: ok"))
+            for line in plan:
+                self.stdout.write(f"    {line}")
+
+        if scanning:
+            raise CommandError(f"{len(scanning)} queries read a whole table, add an index for: {', '.join(scanning)}")
+        self.stdout.write(self.style.SUCCESS(f"All {len(names)} queries use indexes"))
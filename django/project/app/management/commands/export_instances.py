@@ -0,0 +1,51 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from app.export import CONTENT_TYPES, NDJSON, export_queryset, stream_export
+
+
+class Command(BaseCommand):
+    help = "Stream workflow instances with their step executions and step_data as NDJSON or CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=list(CONTENT_TYPES), default=NDJSON, help="Output format (default ndjson)")
+        parser.add_argument('--output', default='-', help="File to write (default: standard output)")
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help="Instances read per round trip (default: settings.EXPORT_CHUNK_SIZE)")
+        parser.add_argument('--status', help="Only instances with this status")
+        parser.add_argument('--initiated-by', help="Only instances started by this email")
+        parser.add_argument('--assigned-to', help="Only instances whose current step is pending for this email")
+        parser.add_argument('--created-after', help="Only instances created at or after this ISO 8601 datetime")
+        parser.add_argument('--created-before', help="Only instances created at or before this ISO 8601 datetime")
+
+    def handle(self, *args, **options):
+        filters = {
+            'status': options['status'],
+            'initiated_by': options['initiated_by'],
+            'assigned_to': options['assigned_to'],
+            'created_after': self._datetime(options, 'created_after'),
+            'created_before': self._datetime(options, 'created_before'),
+        }
+        chunks = stream_export(export_queryset(**filters), options['format'], options['chunk_size'])
+
+        if options['output'] == '-':
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+        written = 0
+        with open(options['output'], 'wb') as output:
+            for chunk in chunks:
+                output.write(chunk)
+                written += len(chunk)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} bytes to {options['output']}"))
+
+    def _datetime(self, options, name):
+        if not options[name]:
+            return None
+        value = parse_datetime(options[name])
+        if value is None:
+            raise CommandError(f"--{name.replace('_', '-')} must be an ISO 8601 datetime, got {options[name]!r}")
+        return value
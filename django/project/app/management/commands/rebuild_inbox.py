@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from app.inbox import REBUILD_BATCH_SIZE, refresh_inbox
+from app.models import InboxItem
+
+
+class Command(BaseCommand):
+    help = "Regenerate the inbox projection (InboxItem) from workflow instances and their pending step executions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('instance_ids', nargs='*', help="Only rebuild the rows of these instances (default: all of them)")
+        parser.add_argument('--batch-size', type=int, default=REBUILD_BATCH_SIZE,
+                            help=f"Rows read and inserted per batch (default {REBUILD_BATCH_SIZE})")
+        parser.add_argument('--if-empty', action='store_true',
+                            help="Only rebuild if the inbox has no rows yet, i.e. backfill it on first deploy")
+
+    def handle(self, *args, **options):
+        if options['if_empty'] and InboxItem.objects.exists():
+            self.stdout.write("The inbox is already populated, nothing to rebuild")
+            return
+        written = refresh_inbox(options['instance_ids'] or None, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the inbox: {written} items"))
@@ -0,0 +1,36 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from app.jobs import Worker
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (audit records, notifications, ...) on a thread or process pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help="Jobs run at the same time (default 4)")
+        parser.add_argument('--pool', choices=['thread', 'process'], default='thread',
+                            help="Run jobs on threads (I/O bound work, default) or processes (CPU bound work)")
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help="Seconds between queue polls when idle (default: settings.JOB_POLL_INTERVAL)")
+        parser.add_argument('--once', action='store_true', help="Exit once no job is due instead of waiting for more")
+
+    def handle(self, *args, **options):
+        worker = Worker(
+            concurrency=options['concurrency'],
+            pool=options['pool'],
+            poll_interval=options['poll_interval']
+        )
+
+        def shutdown(signum, frame):
+            self.stdout.write("Stopping after the running jobs finish...")
+            worker.stop()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        self.stdout.write(f"Job worker {worker.worker_id} started ({options['pool']} pool, concurrency {worker.concurrency})")
+        outcomes = worker.run(once=options['once'])
+        summary = ', '.join(f"{count} {status}" for status, count in sorted(outcomes.items())) or 'no jobs'
+        self.stdout.write(self.style.SUCCESS(f"Job worker {worker.worker_id} stopped: {summary}"))
@@ -9,6 +9,115 @@ import json
 # Create your models here.
 
 
+class WorkflowDefinition(models.Model):
+    workflow_id = models.CharField(max_length=255)
+    version = models.PositiveIntegerField()
+    name = models.CharField(max_length=255)
+    definition = models.JSONField(help_text="Workflow definition as loaded from workflow.json")
+    checksum = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ['workflow_id', 'version']
+    
+    def __str__(self):
+        return f"WorkflowDefinition {self.workflow_id} v{self.version} - {self.name}"
+
+
+class IdempotencyRecord(models.Model):
+    STATES = [
+        ('in_progress', 'In Progress'),
+        ('completed', 'Completed'),
+    ]
+    
+    scope = models.CharField(max_length=255, help_text="HTTP method and path the key was used on")
+    key = models.CharField(max_length=255, help_text="Client supplied Idempotency-Key header")
+    fingerprint = models.CharField(max_length=64, help_text="sha256 of the request body")
+    status = models.CharField(max_length=32, choices=STATES, default='in_progress')
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_content_type = models.CharField(max_length=255, blank=True, default='')
+    response_body = models.BinaryField(null=True, blank=True, help_text="zlib-compressed response body")
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        unique_together = ['scope', 'key']
+    
+    def __str__(self):
+        return f"IdempotencyRecord {self.key} - {self.scope} ({self.status})"
+
+
+class Job(models.Model):
+    JOB_STATES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('dead', 'Dead'),
+    ]
+    
+    job_id = models.BigAutoField(primary_key=True)
+    name = models.CharField(max_length=255, help_text="Registered handler name (see app/jobs.py)")
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=32, choices=JOB_STATES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(help_text="Not picked up before this time (used for retry backoff)")
+    locked_by = models.CharField(max_length=255, blank=True, default='')
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_at'])]
+    
+    def __str__(self):
+        return f"Job {self.job_id} - {self.name} ({self.status})"
+
+
+class PendingNotification(models.Model):
+    NOTIFICATION_STATES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    
+    notification_id = models.BigAutoField(primary_key=True)
+    recipient = models.EmailField(max_length=254)
+    kind = models.CharField(max_length=64)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=32, choices=NOTIFICATION_STATES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    claimed_at = models.DateTimeField(null=True, blank=True, help_text="When a digest run took the notification for sending")
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [models.Index(fields=['status', 'recipient'])]
+    
+    def __str__(self):
+        return f"PendingNotification {self.kind} to {self.recipient} ({self.status})"
+
+
+class StepDurationStats(models.Model):
+    workflow_id = models.CharField(max_length=255)
+    step_id = models.CharField(max_length=255, blank=True, help_text="Empty for the end-to-end cycle time of completed instances")
+    count = models.PositiveBigIntegerField(default=0)
+    total_seconds = models.FloatField(default=0)
+    min_seconds = models.FloatField(null=True, blank=True)
+    max_seconds = models.FloatField(null=True, blank=True)
+    buckets = models.JSONField(default=dict, help_text="Duration sketch: bucket index -> count (see app/step_analytics.py)")
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['workflow_id', 'step_id']
+    
+    def __str__(self):
+        return f"StepDurationStats {self.workflow_id}/{self.step_id or 'cycle'} ({self.count})"
+
+
 class WorkflowInstance(models.Model):
     WORKFLOW_STATES = [
         ('started', 'Started'),
@@ -27,6 +136,17 @@ class WorkflowInstance(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     completed_at = models.DateTimeField(null=True, blank=True)
+    workflow_version = models.PositiveIntegerField(null=True, blank=True, help_text="WorkflowDefinition version this instance was started on")
+    version = models.PositiveIntegerField(default=1, help_text="Row version for optimistic concurrency; bumped on every state change")
+    
+    class Meta:
+        indexes = [
+            # Keyset pagination of listings (newest first)
+            models.Index(fields=['created_at', 'instance_id']),
+            # Listing filters, each followed by the listing order
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['initiated_by_email', 'created_at']),
+        ]
     
     def __str__(self):
         return f"WorkflowInstance {self.instance_id} - {self.workflow_name} ({self.status})"
@@ -51,14 +171,53 @@ class StepExecution(models.Model):
     completed_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    version = models.PositiveIntegerField(default=1, help_text="Row version for optimistic concurrency; bumped on every update")
     
     class Meta:
         unique_together = ['workflow_instance', 'step_id']
+        indexes = [
+            # Inboxes and the assigned_to filter of listings
+            models.Index(fields=['assigned_to_email', 'status']),
+            # Catch-up of inbox event streams: changes since a point in time, by assignee or executor.
+            # Pending executions have no executor, so that index only holds completed ones.
+            models.Index(fields=['assigned_to_email', 'updated_at']),
+            models.Index(
+                fields=['executed_by_email', 'updated_at'],
+                condition=models.Q(executed_by_email__isnull=False),
+                name='step_executor_changes_idx'
+            ),
+        ]
     
     def __str__(self):
         return f"StepExecution {self.step_id} for {self.workflow_instance.instance_id} ({self.status})"
 
 
+class InboxItem(models.Model):
+    # One row per instance waiting on its current step's pending execution, copied from the
+    # instance and the execution so an inbox reads a single table (maintained by app/inbox.py)
+    instance = models.OneToOneField(WorkflowInstance, primary_key=True, on_delete=models.CASCADE, related_name='inbox_item')
+    execution = models.OneToOneField(StepExecution, on_delete=models.CASCADE, related_name='inbox_item')
+    assigned_to_email = models.EmailField(max_length=254)
+    workflow_id = models.CharField(max_length=255)
+    workflow_name = models.CharField(max_length=255)
+    step_id = models.CharField(max_length=255)
+    step_name = models.CharField(max_length=255)
+    status = models.CharField(max_length=255, help_text="Status of the instance")
+    initiated_by_email = models.EmailField(max_length=254)
+    created_at = models.DateTimeField(help_text="When the instance was started")
+    step_created_at = models.DateTimeField(help_text="When the pending execution was created")
+    
+    class Meta:
+        indexes = [
+            # A user's inbox in inbox order (oldest pending step first), and its per-workflow counts
+            models.Index(fields=['assigned_to_email', 'step_created_at', 'instance']),
+            models.Index(fields=['assigned_to_email', 'workflow_id']),
+        ]
+    
+    def __str__(self):
+        return f"InboxItem {self.step_id} of {self.instance_id} for {self.assigned_to_email}"
+
+
 # models.py
 from django.db import models
 
@@ -167,4 +326,5 @@ class AuditLog(models.Model):
 
     class Meta:
         db_table = 'AuditLog'
-        verbose_name_plural = 'Audit Logs'
\ No newline at end of file
+        verbose_name_plural = 'Audit Logs'
+        indexes = [models.Index(fields=['Timestamp', 'AuditLogID'])]
\ No newline at end of file
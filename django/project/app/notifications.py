@@ -0,0 +1,229 @@
+import logging
+import smtplib
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.core.mail.backends.smtp import EmailBackend
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils.timezone import now
+
+from .jobs import enqueue, job
+from .models import EmailSettings, Job, PendingNotification
+
+
+logger = logging.getLogger(__name__)
+
+STEP_ASSIGNED = 'step_assigned'
+SEND_DIGESTS_JOB = 'notifications.send_digests'
+
+# Notifications handled per digest run; a follow-up run is queued for the rest
+DIGEST_BATCH_SIZE = 500
+
+# Errors after which a pooled connection is dropped and opened again once
+_RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError)
+
+
+class SmtpConnectionPool:
+    """
+    One persistent SMTP connection per EmailSettings row, kept open across
+    digests (and jobs) of the worker process. A connection whose row changed
+    is replaced, and one the server dropped while idle is reopened once.
+    EmailSettings.PasswordHash holds the SMTP password. Port 465 uses
+    implicit TLS and 587 STARTTLS.
+    """
+
+    def __init__(self):
+        self._connections: Dict[int, Tuple[tuple, EmailBackend, threading.Lock]] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, email_settings: EmailSettings) -> Tuple[EmailBackend, threading.Lock]:
+        key = (email_settings.SmtpServer, email_settings.SmtpPort, email_settings.Username, email_settings.PasswordHash)
+        with self._lock:
+            entry = self._connections.get(email_settings.pk)
+            if entry is not None and entry[0] != key:
+                self._close(entry)
+                entry = None
+            if entry is None:
+                backend = EmailBackend(
+                    host=email_settings.SmtpServer,
+                    port=email_settings.SmtpPort,
+                    username=email_settings.Username or None,
+                    password=email_settings.PasswordHash or None,
+                    use_ssl=email_settings.SmtpPort == 465,
+                    use_tls=email_settings.SmtpPort == 587,
+                    timeout=settings.NOTIFICATION_SMTP_TIMEOUT,
+                    fail_silently=False
+                )
+                entry = (key, backend, threading.Lock())
+                self._connections[email_settings.pk] = entry
+            return entry[1], entry[2]
+
+    def send(self, email_settings: EmailSettings, message: EmailMessage):
+        """Send one message over the row's persistent connection; raises on failure"""
+        backend, lock = self._get(email_settings)
+        with lock:
+            try:
+                backend.open()
+                backend.send_messages([message])
+            except _RECONNECT_ERRORS:
+                logger.debug("SMTP connection to %s was dropped, reconnecting", email_settings.SmtpServer)
+                backend.close()
+                backend.open()
+                backend.send_messages([message])
+
+    def retain(self, setting_ids):
+        """Close connections of rows that are no longer enabled"""
+        with self._lock:
+            for pk in [pk for pk in self._connections if pk not in setting_ids]:
+                self._close(self._connections.pop(pk))
+
+    def close_all(self):
+        self.retain(())
+
+    @staticmethod
+    def _close(entry):
+        try:
+            entry[1].close()
+        except Exception:
+            logger.debug("Error closing SMTP connection", exc_info=True)
+
+
+smtp_pool = SmtpConnectionPool()
+
+
+def queue_notification(recipient: str, kind: str, payload: Dict[str, Any]) -> PendingNotification:
+    """Store a notification and make sure a digest run is scheduled to send it"""
+    notification = PendingNotification.objects.create(recipient=recipient.lower(), kind=kind, payload=payload)
+    schedule_digests()
+    return notification
+
+
+def schedule_digests(delay: Optional[float] = None):
+    """
+    Queue a digest run unless one is already waiting; notifications that
+    arrive before it runs are coalesced into the same digests.
+    """
+    if not Job.objects.filter(name=SEND_DIGESTS_JOB, status='queued').exists():
+        enqueue(SEND_DIGESTS_JOB, delay=settings.NOTIFICATION_DIGEST_WINDOW if delay is None else delay)
+
+
+def _task_url(payload: Dict[str, Any]) -> Optional[str]:
+    """NOTIFICATION_TASK_URL filled in from the payload, or None if the payload lacks one of its placeholders"""
+    try:
+        return settings.NOTIFICATION_TASK_URL.format(**payload)
+    except (KeyError, IndexError, AttributeError, ValueError) as e:
+        logger.warning("Task link omitted from digest, NOTIFICATION_TASK_URL does not fit the payload: %r", e)
+        return None
+
+
+def build_digest(recipient: str, notifications: List[PendingNotification], from_email: str) -> EmailMessage:
+    """One email listing every task assigned to the recipient"""
+    count = len(notifications)
+    subject = "1 new workflow task assigned to you" if count == 1 else f"{count} new workflow tasks assigned to you"
+    lines = ["Hello,", "", "The following workflow steps are waiting for you:", ""]
+    for notification in notifications:
+        payload = notification.payload
+        line = f"- {payload.get('workflow_name')}: {payload.get('step_name')}"
+        if payload.get('initiated_by_email'):
+            line += f" (started by {payload['initiated_by_email']})"
+        if settings.NOTIFICATION_TASK_URL:
+            link = _task_url(payload)
+            if link:
+                line += "\n  " + link
+        lines.append(line)
+    return EmailMessage(subject=subject, body="\n".join(lines) + "\n", from_email=from_email, to=[recipient])
+
+
+def _from_email(email_settings: EmailSettings) -> str:
+    if settings.NOTIFICATION_FROM_EMAIL:
+        return settings.NOTIFICATION_FROM_EMAIL
+    if '@' in (email_settings.Username or ''):
+        return email_settings.Username
+    return settings.DEFAULT_FROM_EMAIL
+
+
+def claim_notifications(limit: int = DIGEST_BATCH_SIZE) -> List[PendingNotification]:
+    """
+    Mark up to `limit` pending notifications as sending for this run, in one
+    short transaction. Notifications a run claimed more than JOB_LOCK_TIMEOUT
+    ago (its worker died mid-send) can be claimed again.
+    """
+    timestamp = now()
+    claimable = Q(status='pending') | Q(status='sending', claimed_at__lt=timestamp - timedelta(seconds=settings.JOB_LOCK_TIMEOUT))
+    with transaction.atomic():
+        ids = list(
+            PendingNotification.objects.select_for_update(skip_locked=True)
+            .filter(claimable)
+            .order_by('notification_id')
+            .values_list('notification_id', flat=True)[:limit]
+        )
+        PendingNotification.objects.filter(claimable, pk__in=ids).update(status='sending', claimed_at=timestamp)
+    return list(PendingNotification.objects.filter(pk__in=ids, status='sending', claimed_at=timestamp).order_by('notification_id'))
+
+
+def _record_failure(ids: List[int], error: str) -> int:
+    """Put undelivered notifications back to pending (failed after NOTIFICATION_MAX_ATTEMPTS); returns how many failed"""
+    with transaction.atomic():
+        PendingNotification.objects.filter(pk__in=ids).update(
+            status='pending', claimed_at=None, attempts=F('attempts') + 1, last_error=error
+        )
+        return PendingNotification.objects.filter(pk__in=ids, attempts__gte=settings.NOTIFICATION_MAX_ATTEMPTS).update(status='failed')
+
+
+@job(SEND_DIGESTS_JOB)
+def send_digests(payload: Dict[str, Any]):
+    """
+    Send every pending notification, one digest email per recipient, through
+    the first enabled EmailSettings row that accepts it (the others are
+    fallbacks). SMTP failures never fail the job: the affected notifications
+    stay pending (or become failed after NOTIFICATION_MAX_ATTEMPTS) and
+    another run is scheduled for them.
+
+    No transaction is open while talking to SMTP servers, so the database
+    write lock is never held for a network round trip: notifications are
+    claimed in one short transaction, and each recipient's outcome is
+    recorded in another right after its digest is sent.
+    """
+    email_settings = list(EmailSettings.objects.filter(IsEnabled=True).order_by('EmailSettingID'))
+    smtp_pool.retain({row.pk for row in email_settings})
+    if not email_settings:
+        logger.warning("Pending notifications are not sent: no EmailSettings row is enabled")
+        return
+
+    pending = claim_notifications()
+    by_recipient: 'OrderedDict[str, List[PendingNotification]]' = OrderedDict()
+    for notification in pending:
+        by_recipient.setdefault(notification.recipient, []).append(notification)
+
+    retry = False
+    for recipient, notifications in by_recipient.items():
+        ids = [notification.pk for notification in notifications]
+        error = None
+        for row in email_settings:
+            try:
+                smtp_pool.send(row, build_digest(recipient, notifications, _from_email(row)))
+            except (smtplib.SMTPException, OSError) as e:
+                logger.warning("Sending digest to %s via %s failed: %s", recipient, row.SmtpServer, e)
+                error = f"{row.SmtpServer}: {e}"
+                continue
+            error = None
+            break
+
+        if error is None:
+            PendingNotification.objects.filter(pk__in=ids).update(status='sent', sent_at=now(), last_error='')
+            continue
+
+        failed = _record_failure(ids, error)
+        if failed:
+            logger.error("Giving up on %d notifications for %s after %d attempts", failed, recipient, settings.NOTIFICATION_MAX_ATTEMPTS)
+        retry = retry or failed < len(ids)
+
+    if len(pending) == DIGEST_BATCH_SIZE:
+        schedule_digests(delay=0)
+    elif retry:
+        schedule_digests(delay=settings.NOTIFICATION_RETRY_DELAY)
@@ -0,0 +1,102 @@
+"""
+Keyset (cursor) pagination.
+
+A page is fetched with WHERE (a, b) < (last a, last b) ORDER BY a DESC, b DESC
+LIMIT n instead of OFFSET, so with an index on the ordering columns every page
+costs the same as the first one. The cursor handed to the client is the signed
+key of the last row of the page; it is opaque and cannot be forged.
+
+Totals are not part of a page. Views that offer one use approximate_count(),
+which caches the COUNT(*) per query for PAGINATION_COUNT_CACHE_TTL seconds
+instead of running it on every request.
+"""
+import hashlib
+from typing import List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db.models import Q, QuerySet
+
+
+_SALT = 'app.pagination'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _fields(queryset: QuerySet, ordering: Sequence[str]):
+    return [(queryset.model._meta.get_field(name.lstrip('-')), name.startswith('-')) for name in ordering]
+
+
+def encode_cursor(row, queryset: QuerySet, ordering: Sequence[str]) -> str:
+    return signing.dumps([field.value_to_string(row) for field, _ in _fields(queryset, ordering)], salt=_SALT, compress=True)
+
+
+def decode_cursor(cursor: str, queryset: QuerySet, ordering: Sequence[str]) -> list:
+    fields = _fields(queryset, ordering)
+    try:
+        values = signing.loads(cursor, salt=_SALT)
+        if not isinstance(values, list) or len(values) != len(fields):
+            raise InvalidCursor("Invalid cursor")
+        return [field.to_python(value) for (field, _), value in zip(fields, values)]
+    except (signing.BadSignature, ValueError, TypeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+
+
+def after_key(queryset: QuerySet, ordering: Sequence[str], values: Sequence) -> Q:
+    """The rows that come after the key `values` in `ordering`"""
+    fields = _fields(queryset, ordering)
+    after = Q()
+    for position, (field, descending) in enumerate(fields):
+        equal = {fields[index][0].name: values[index] for index in range(position)}
+        lookup = f"{field.name}__{'lt' if descending else 'gt'}"
+        after |= Q(**equal, **{lookup: values[position]})
+    # Redundant with the OR above, but it gives the database a range on the
+    # leading index column to seek to instead of walking the index from the start
+    first, descending = fields[0]
+    return Q(**{f"{first.name}__{'lte' if descending else 'gte'}": values[0]}) & after
+
+
+def keyset_paginate(queryset: QuerySet, ordering: Sequence[str], cursor: Optional[str], limit: int) -> Tuple[List, Optional[str]]:
+    """
+    One page of queryset ordered by `ordering` (ending in a unique field),
+    after the row the cursor points at; returns (rows, next_cursor), with
+    next_cursor None on the last page. Raises InvalidCursor for a cursor
+    this server did not issue.
+    """
+    if cursor:
+        values = decode_cursor(cursor, queryset, ordering)
+        queryset = queryset.filter(after_key(queryset, ordering, values))
+
+    rows = list(queryset.order_by(*ordering)[:limit + 1])
+    return _page(rows, queryset, ordering, limit)
+
+
+async def akeyset_paginate(queryset: QuerySet, ordering: Sequence[str], cursor: Optional[str], limit: int) -> Tuple[List, Optional[str]]:
+    """Async keyset_paginate, for the async views"""
+    if cursor:
+        values = decode_cursor(cursor, queryset, ordering)
+        queryset = queryset.filter(after_key(queryset, ordering, values))
+
+    rows = [row async for row in queryset.order_by(*ordering)[:limit + 1]]
+    return _page(rows, queryset, ordering, limit)
+
+
+def _page(rows: List, queryset: QuerySet, ordering: Sequence[str], limit: int) -> Tuple[List, Optional[str]]:
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1], queryset, ordering)
+
+
+def approximate_count(queryset: QuerySet) -> int:
+    """COUNT(*) of the queryset, cached per query for PAGINATION_COUNT_CACHE_TTL seconds"""
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+    key = 'pagination:count:' + hashlib.sha256(repr((sql, params)).encode()).hexdigest()
+    return cache.get_or_set(key, queryset.count, settings.PAGINATION_COUNT_CACHE_TTL)
@@ -0,0 +1,127 @@
+"""
+The hot read queries of the workflow API, and the tools that keep them on indexes.
+
+Querysets that views and services share are built by the functions below.
+HOT_QUERIES lists those and the other per-request or per-poll lookups with
+representative arguments, so that `python manage.py explain_queries` and the
+test suite can check the plans the database actually picks. A plan that
+reads a whole table means an index is missing (see the Meta.indexes of the
+models involved).
+"""
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from django.db import connections
+from django.db.models import Count, F, Max, Q, QuerySet
+from django.utils.timezone import now
+
+from .models import IdempotencyRecord, InboxItem, Job, PendingNotification, StepExecution, WorkflowInstance
+from .pagination import after_key
+
+
+# Oldest pending step first; the instance breaks ties (and keys inbox cursors)
+INBOX_ORDERING = ('step_created_at', 'instance')
+
+
+def inbox_items(user_email: str) -> QuerySet:
+    """A user's inbox rows (see app/inbox.py) in inbox order"""
+    return InboxItem.objects.filter(assigned_to_email=user_email).order_by(*INBOX_ORDERING)
+
+
+def inbox_groups(user_email: str) -> QuerySet:
+    """Number of inbox rows per workflow, as dicts with workflow_id, workflow_name and count"""
+    return InboxItem.objects.filter(assigned_to_email=user_email).values('workflow_id').annotate(
+        workflow_name=Max('workflow_name'),
+        count=Count('pk')
+    ).order_by('workflow_id')
+
+
+def filter_workflow_instances(queryset: QuerySet, status: Optional[str] = None, initiated_by: Optional[str] = None,
+                              created_after: Optional[datetime] = None, created_before: Optional[datetime] = None,
+                              assigned_to: Optional[str] = None) -> QuerySet:
+    """The filters of the workflow instance listing"""
+    if status:
+        queryset = queryset.filter(status=status)
+    if initiated_by:
+        queryset = queryset.filter(initiated_by_email=initiated_by)
+    if created_after:
+        queryset = queryset.filter(created_at__gte=created_after)
+    if created_before:
+        queryset = queryset.filter(created_at__lte=created_before)
+    if assigned_to:
+        # Only current pending steps assigned to the user. A join rather than EXISTS, so the
+        # database can start from the assignee's pending executions instead of walking every
+        # instance; (workflow_instance, step_id) is unique, so it never duplicates a row.
+        queryset = queryset.filter(
+            step_executions__assigned_to_email=assigned_to,
+            step_executions__status='pending',
+            step_executions__step_id=F('current_step_id')
+        )
+    return queryset
+
+
+def step_execution_changes(user_email: str, since: datetime) -> QuerySet:
+    """Step executions assigned to or executed by a user that changed at or after `since`, oldest first"""
+    return StepExecution.objects.filter(
+        Q(assigned_to_email=user_email) | Q(executed_by_email=user_email),
+        updated_at__gte=since
+    ).select_related('workflow_instance').order_by('updated_at', 'execution_id')
+
+
+def _listing(**filters) -> QuerySet:
+    return filter_workflow_instances(WorkflowInstance.objects.all(), **filters).order_by('-created_at')[:100]
+
+
+def _keyset_page() -> QuerySet:
+    ordering = ('-created_at', '-instance_id')
+    queryset = WorkflowInstance.objects.all()
+    return queryset.filter(after_key(queryset, ordering, [now(), uuid.uuid4()])).order_by(*ordering)[:101]
+
+
+def _inbox_page() -> QuerySet:
+    queryset = inbox_items(USER)
+    return queryset.filter(after_key(queryset, INBOX_ORDERING, [now(), uuid.uuid4()]))[:101]
+
+
+def _claim_jobs() -> QuerySet:
+    timestamp = now()
+    return Job.objects.filter(
+        Q(status='queued', run_at__lte=timestamp) | Q(status='running', locked_at__lt=timestamp - timedelta(minutes=5))
+    ).order_by('run_at', 'job_id').values_list('job_id', flat=True)[:10]
+
+
+USER = 'someone@company.com'
+
+# name -> representative queryset of each hot path
+HOT_QUERIES: Dict[str, Callable[[], QuerySet]] = {
+    'inbox': lambda: inbox_items(USER),
+    'inbox page': _inbox_page,
+    'inbox groups': lambda: inbox_groups(USER),
+    'instances by status': lambda: _listing(status='in_progress'),
+    'instances by initiator': lambda: _listing(initiated_by=USER),
+    'instances created after': lambda: _listing(created_after=now() - timedelta(days=1)),
+    'instances assigned to': lambda: _listing(assigned_to=USER),
+    'instances keyset page': _keyset_page,
+    'instance step executions': lambda: StepExecution.objects.filter(workflow_instance_id=uuid.uuid4(), step_id__in=['a', 'b']),
+    'inbox event catch-up': lambda: step_execution_changes(USER, now() - timedelta(minutes=5))[:201],
+    'claim jobs': _claim_jobs,
+    'pending notifications': lambda: PendingNotification.objects.filter(status='pending').order_by('notification_id')[:500],
+    'expired idempotency keys': lambda: IdempotencyRecord.objects.filter(expires_at__lt=now()),
+}
+
+
+def explain(queryset: QuerySet) -> List[str]:
+    """The database's plan for the queryset, one line per step"""
+    connection = connections[queryset.db]
+    if connection.vendor != 'sqlite':
+        return queryset.explain().splitlines()
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def full_scans(plan: List[str]) -> List[str]:
+    """Plan lines that read a whole table or index (SQLite SCAN, PostgreSQL Seq Scan)"""
+    return [line for line in plan if line.lstrip().startswith('SCAN ') or 'Seq Scan' in line]
@@ -0,0 +1,74 @@
+import datetime
+import decimal
+import json
+import uuid
+from typing import Any
+
+from django.http import HttpResponse
+from django.utils.functional import Promise
+from rest_framework.renderers import BaseRenderer
+
+from .tracing import timed
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is listed in requirements.txt
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    """Types orjson does not encode natively (kept compatible with DjangoJSONEncoder)"""
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if isinstance(obj, Promise):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, datetime.timedelta):
+        return obj.total_seconds()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class _FallbackEncoder(json.JSONEncoder):
+    """Stdlib fallback producing the same output as the orjson path"""
+
+    def default(self, obj):
+        if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+            return obj.isoformat()
+        if isinstance(obj, uuid.UUID):
+            return str(obj)
+        return _default(obj)
+
+
+def dumps(data: Any) -> bytes:
+    """
+    Encode data to JSON bytes. datetime/date/time are written in ISO 8601,
+    UUIDs as strings and Decimals as strings, so views can pass model values
+    through without converting them field by field.
+    """
+    with timed('serialization'):
+        if orjson is not None:
+            return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(data, cls=_FallbackEncoder, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class FastJsonResponse(HttpResponse):
+    """Drop-in replacement for django.http.JsonResponse using the shared encoder"""
+
+    def __init__(self, data: Any, safe: bool = True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError("In order to allow non-dict objects to be serialized set the safe parameter to False.")
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
+
+
+class FastJSONRenderer(BaseRenderer):
+    """DRF renderer backed by the shared encoder (used for rest_framework Response)"""
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return dumps(data)
@@ -0,0 +1,103 @@
+"""
+Time-in-step and cycle time percentiles per workflow.
+
+Each completed step execution adds its duration (completed_at - started_at)
+to a StepDurationStats row for its (workflow, step); each completed instance
+adds its cycle time (completed_at - created_at) to the workflow's row with an
+empty step_id. Rows hold a DDSketch-style histogram with logarithmic buckets,
+so every quantile is estimated within SKETCH_RELATIVE_ACCURACY of the true
+value, the row stays small however many durations it has seen, and reading
+percentiles never touches the execution table.
+"""
+import math
+from typing import Any, Dict, Iterable, List, Optional
+
+from .models import StepDurationStats
+
+
+# Estimated quantiles are within this fraction of the exact value
+SKETCH_RELATIVE_ACCURACY = 0.02
+_GAMMA = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+
+# Durations below this (seconds) share the lowest bucket
+MIN_TRACKED_SECONDS = 0.001
+
+# step_id of the row holding end-to-end cycle times
+CYCLE_TIME = ''
+
+QUANTILES = {'p50': 0.5, 'p90': 0.9, 'p99': 0.99}
+
+
+def bucket_index(seconds: float) -> int:
+    return math.ceil(math.log(max(seconds, MIN_TRACKED_SECONDS)) / _LOG_GAMMA)
+
+
+def bucket_value(index: int) -> float:
+    """Representative duration of a bucket: the value with the smallest relative error across it"""
+    return 2 * _GAMMA ** index / (_GAMMA + 1)
+
+
+def add_duration(stats: StepDurationStats, seconds: float):
+    """Add one duration to the row in memory"""
+    seconds = max(seconds, 0.0)
+    key = str(bucket_index(seconds))
+    stats.buckets[key] = stats.buckets.get(key, 0) + 1
+    stats.count += 1
+    stats.total_seconds += seconds
+    stats.min_seconds = seconds if stats.min_seconds is None else min(stats.min_seconds, seconds)
+    stats.max_seconds = seconds if stats.max_seconds is None else max(stats.max_seconds, seconds)
+
+
+def quantile(stats: StepDurationStats, q: float) -> Optional[float]:
+    """Estimated q-quantile (0..1) of the row's durations, clamped to the observed range"""
+    if not stats.count:
+        return None
+    rank = max(math.ceil(q * stats.count) - 1, 0)
+    seen = 0
+    for index in sorted(int(key) for key in stats.buckets):
+        seen += stats.buckets[str(index)]
+        if seen > rank:
+            return min(max(bucket_value(index), stats.min_seconds), stats.max_seconds)
+    return stats.max_seconds
+
+
+def record_durations(workflow_id: str, durations: Dict[str, List[float]]):
+    """Merge durations (step_id -> seconds; CYCLE_TIME for cycle times) into the stats rows, one write per row; call inside a transaction"""
+    for step_id, values in durations.items():
+        stats, _ = StepDurationStats.objects.select_for_update().get_or_create(workflow_id=workflow_id, step_id=step_id)
+        for seconds in values:
+            add_duration(stats, seconds)
+        stats.save()
+
+
+def summarize(stats: Optional[StepDurationStats]) -> Dict[str, Any]:
+    if stats is None or not stats.count:
+        return {"count": 0, "mean": None, "min": None, "max": None, **{name: None for name in QUANTILES}}
+    return {
+        "count": stats.count,
+        "mean": stats.total_seconds / stats.count,
+        "min": stats.min_seconds,
+        "max": stats.max_seconds,
+        **{name: quantile(stats, q) for name, q in QUANTILES.items()}
+    }
+
+
+def workflow_duration_summary(workflow_id: str, steps: Iterable[Dict[str, Any]] = ()) -> Dict[str, Any]:
+    """
+    Time-in-step per step and cycle time, in seconds, from one query. Steps
+    are listed in the given (definition) order, followed by any that only
+    have statistics (e.g. from an older definition version).
+    """
+    rows = {stats.step_id: stats for stats in StepDurationStats.objects.filter(workflow_id=workflow_id)}
+    step_summaries: List[Dict[str, Any]] = []
+    for step in steps:
+        step_summaries.append({"step_id": step['id'], "step_name": step.get('name', step['id']), **summarize(rows.pop(step['id'], None))})
+    cycle = rows.pop(CYCLE_TIME, None)
+    for step_id in sorted(rows):
+        step_summaries.append({"step_id": step_id, "step_name": step_id, **summarize(rows[step_id])})
+    return {
+        "workflow_id": workflow_id,
+        "steps": step_summaries,
+        "cycle_time": summarize(cycle)
+    }
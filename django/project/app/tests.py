@@ -1,3 +1,1688 @@
-from django.test import TestCase
+import asyncio
+import csv
+import datetime
+import decimal
+import gzip
+import hashlib
+import io
+import json
+import os
+import socketserver
+import threading
+import tempfile
+import uuid
+import zlib
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+
+from .models import AuditLog, EmailSettings, IdempotencyRecord, InboxItem, Job, PendingNotification, StepDurationStats, WorkflowDefinition, WorkflowInstance, StepExecution
+from . import events, export, jobs, notifications, step_analytics
+from .checks import check_workflow_definitions
+from .queries import HOT_QUERIES, explain, full_scans
+from .renderers import dumps
+from .workflow_analysis import WorkflowDefinitionError
+from .workflow_registry import WorkflowRegistry
+from .workflow_service import SUBMIT_STEP_QUERY_BUDGET, WorkflowConflictError, WorkflowService, workflow_service
+from .workflow_templates import compile_template
+
+
+WORKFLOWS = {
+    "workflows": [
+        {
+            "id": "onboarding",
+            "name": "Onboarding",
+            "steps": [
+                {"id": "step_2", "name": "Manager Review", "next_step": "step_3", "assignedTo": "manager@company.com"},
+                {"id": "step_1", "name": "Request", "next_step": "step_2"},
+                {"id": "step_3", "name": "Confirm", "assignedTo": "{{step_1.user_email}}"},
+            ],
+        },
+        {
+            "id": "single",
+            "name": "Single Step",
+            "steps": [{"id": "only", "name": "Only Step", "assignedTo": "{{only.user_email}}"}],
+        },
+        {
+            "id": "expense",
+            "name": "Expense Claim",
+            "steps": [
+                {"id": "claim", "name": "Claim", "next_step": "approve"},
+                {
+                    "id": "approve",
+                    "name": "Approve",
+                    "assignedTo": "{{claim.manager.email | finance@company.com}}",
+                    "form": {
+                        "fields": [
+                            {"id": "amount", "value": "{{claim.amount}}"},
+                            {"id": "city", "value": "{{ claim.address.city }}"},
+                            {"id": "note", "value": "{{claim.note | 'n/a'}}"},
+                            {"id": "requester", "value": "{{claim.user_email}}"},
+                            {"id": "comment", "value": "Looks good"},
+                        ]
+                    },
+                },
+            ],
+        },
+    ]
+}
+
+
+def make_service(document=WORKFLOWS):
+    service = WorkflowService()
+    service._registry = WorkflowRegistry(document)
+    return service
+
+
+TRANSACTION_CONTROL = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT', 'BEGIN', 'COMMIT')
+
+
+class CaptureDataQueries(CaptureQueriesContext):
+    """Captures queries, leaving out transaction control statements"""
+
+    def __init__(self):
+        super().__init__(connection)
+
+    @property
+    def data_queries(self):
+        return [query['sql'] for query in self.captured_queries if not query['sql'].startswith(TRANSACTION_CONTROL)]
+
+
+class WorkflowApiTestCase(TestCase):
+    """Runs the views against the WORKFLOWS fixture instead of workflow.json"""
+
+    def setUp(self):
+        patcher = mock.patch.object(workflow_service, '_registry', WorkflowRegistry(WORKFLOWS, version='fixture'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        workflow_service.definitions.clear()
+        self.addCleanup(workflow_service.definitions.clear)
+
+
+class WorkflowRegistryTests(TestCase):
+    def test_indexes_workflows_and_steps(self):
+        registry = WorkflowRegistry(WORKFLOWS)
+
+        self.assertEqual(len(registry), 3)
+        self.assertEqual(registry.get_workflow('onboarding').name, 'Onboarding')
+        self.assertEqual(registry.get_step('onboarding', 'step_3')['name'], 'Confirm')
+        self.assertIsNone(registry.get_step('onboarding', 'missing'))
+        self.assertIsNone(registry.get_workflow('missing'))
+
+    def test_start_step_and_step_maps(self):
+        workflow = WorkflowRegistry(WORKFLOWS).get_workflow('onboarding')
+
+        self.assertEqual(workflow.start_step['id'], 'step_1')
+        self.assertEqual(workflow.get_next_step_id('step_1'), 'step_2')
+        self.assertIsNone(workflow.get_next_step_id('step_3'))
+        self.assertEqual(workflow.get_previous_step_id('step_3'), 'step_2')
+        self.assertIsNone(workflow.get_previous_step_id('step_1'))
+        self.assertEqual(workflow.steps_count, 3)
+
+    def test_registry_is_read_only(self):
+        registry = WorkflowRegistry(WORKFLOWS)
+        step = registry.get_step('expense', 'approve')
+
+        with self.assertRaises(TypeError):
+            registry.workflows['other'] = None
+        with self.assertRaises(TypeError):
+            step['form']['fields'][0]['value'] = 'leaked'
+        with self.assertRaises(TypeError):
+            step.update(name='Renamed')
+        with self.assertRaises(AttributeError):
+            step['form']['fields'].append({})
+
+
+class WorkflowAnalysisTests(TestCase):
+    def compile(self, steps):
+        return WorkflowRegistry({"workflows": [{"id": "wf", "name": "Workflow", "steps": steps}]})
+
+    def assertDefinitionError(self, steps, message):
+        with self.assertRaises(WorkflowDefinitionError) as raised:
+            self.compile(steps)
+        self.assertTrue(any(message in error for error in raised.exception.messages), raised.exception.messages)
+
+    def test_valid_definition_records_predecessors(self):
+        analysis = WorkflowRegistry(WORKFLOWS).get_workflow('onboarding').analysis
+
+        self.assertTrue(analysis.is_valid)
+        self.assertEqual(analysis.predecessors['step_3'], {'step_1', 'step_2'})
+        self.assertEqual(analysis.predecessors['step_1'], frozenset())
+
+    def test_dangling_next_step(self):
+        self.assertDefinitionError([{"id": "a", "next_step": "missing"}], "next_step 'missing' which does not exist")
+
+    def test_cycle(self):
+        self.assertDefinitionError([
+            {"id": "start", "next_step": "a"},
+            {"id": "a", "next_step": "b"},
+            {"id": "b", "next_step": "a"},
+        ], "next_step cycle: a -> b -> a")
+
+    def test_workflow_without_steps(self):
+        self.assertDefinitionError([], "workflow has no steps")
+
+    def test_duplicate_step_ids(self):
+        self.assertDefinitionError([{"id": "a"}, {"id": "a"}], "duplicate step id 'a'")
+
+    def test_template_reading_a_later_step(self):
+        self.assertDefinitionError([
+            {"id": "a", "next_step": "b", "assignedTo": "{{b.approver}}"},
+            {"id": "b"},
+        ], "step 'a' uses templates from step 'b'")
+
+    def test_unreachable_steps_are_warnings(self):
+        workflow = self.compile([{"id": "a"}, {"id": "orphan"}]).get_workflow('wf')
+
+        self.assertEqual(workflow.analysis.warnings, ("step 'orphan' is unreachable from the starting step",))
+
+    def test_system_check_reports_invalid_definitions(self):
+        with mock.patch.object(workflow_service, '_registry', None), \
+                mock.patch.object(workflow_service, '_load_registry', side_effect=WorkflowDefinitionError(["Workflow 'wf': broken"])):
+            errors = check_workflow_definitions(None)
+
+        self.assertEqual([error.id for error in errors], ['app.E002'])
+
+
+class WorkflowServiceTests(TestCase):
+    def setUp(self):
+        self.service = make_service()
+
+    def test_start_workflow_instance_uses_start_step(self):
+        instance = self.service.start_workflow_instance('onboarding', 'user@company.com', 'clerk_1')
+
+        self.assertEqual(instance.current_step_id, 'step_1')
+        self.assertEqual(instance.workflow_name, 'Onboarding')
+
+    def test_submit_step_data_advances_and_assigns_next_step(self):
+        instance = self.service.start_workflow_instance('onboarding', 'user@company.com', 'clerk_1')
+
+        self.service.submit_step_data(str(instance.instance_id), 'step_1', {'reason': 'new hire'}, 'user@company.com')
+        self.service.submit_step_data(str(instance.instance_id), 'step_2', {'approved': True}, 'manager@company.com')
+
+        instance.refresh_from_db()
+        self.assertEqual(instance.current_step_id, 'step_3')
+        pending = StepExecution.objects.get(workflow_instance=instance, step_id='step_3')
+        self.assertEqual(pending.status, 'pending')
+        self.assertEqual(pending.assigned_to_email, 'user@company.com')
+
+        self.service.submit_step_data(str(instance.instance_id), 'step_3', {}, 'user@company.com')
+        instance.refresh_from_db()
+        self.assertEqual(instance.status, 'completed')
+        self.assertIsNone(instance.current_step_id)
+
+    def test_submit_for_unresolvable_definition_is_rejected(self):
+        # Unpinned instances (started before definitions were versioned) follow the active definition
+        gone = WorkflowInstance.objects.create(workflow_id='gone', workflow_name='Gone', current_step_id='a',
+                                               initiated_by_email='user@company.com', initiated_by_clerk_id='clerk_1')
+        renamed = WorkflowInstance.objects.create(workflow_id='onboarding', workflow_name='Onboarding', current_step_id='old_step',
+                                                  initiated_by_email='user@company.com', initiated_by_clerk_id='clerk_1')
+
+        for instance in (gone, renamed):
+            with self.assertRaisesMessage(ValidationError, "User not authorized for this step"):
+                self.service.submit_step_data(str(instance.instance_id), instance.current_step_id, {}, 'user@company.com')
+
+
+class WorkflowTemplateTests(TestCase):
+    def setUp(self):
+        self.service = make_service()
+        self.instance = self.service.start_workflow_instance('expense', 'claimant@company.com', 'clerk_1')
+
+    def test_compile_template(self):
+        self.assertIsNone(compile_template('admin@company.com'))
+        self.assertIsNone(compile_template('{{step_1}}'))
+        self.assertIsNone(compile_template(None))
+
+        expression = compile_template('{{ step_1.address.city | "Cairo" }}')
+        self.assertEqual(expression.step_id, 'step_1')
+        self.assertEqual(expression.path, ('address', 'city'))
+        self.assertEqual(expression.default, 'Cairo')
+        self.assertIs(compile_template('{{ step_1.address.city | "Cairo" }}'), expression)
+
+    def test_non_string_field_values_are_plain_values(self):
+        self.assertIsNone(compile_template(['a', 'b']))
+        self.assertIsNone(compile_template({'option': 'a'}))
+
+        registry = WorkflowRegistry({"workflows": [{
+            "id": "choices",
+            "name": "Choices",
+            "steps": [{"id": "pick", "name": "Pick", "form": {"fields": [
+                {"id": "options", "value": ["a", "b"]},
+                {"id": "meta", "value": {"source": "{{pick.user_email}}"}},
+            ]}}],
+        }]})
+        self.assertEqual(registry.get_workflow('choices').get_templates('pick').fields, ())
+
+    def test_unresolved_reference_falls_back_to_default_or_source(self):
+        self.assertEqual(self.service.resolve_template_variables('{{claim.amount}}', self.instance), '{{claim.amount}}')
+        self.assertEqual(self.service.resolve_template_variables('{{claim.note | n/a}}', self.instance), 'n/a')
+        self.assertEqual(self.service.resolve_template_variables('{{claim.user_display_name}}', self.instance), 'claimant')
+
+    def test_step_templates_resolve_with_a_single_query(self):
+        self.service.submit_step_data(str(self.instance.instance_id), 'claim', {
+            'amount': 120,
+            'address': {'city': 'Giza'},
+            'manager': {'email': 'boss@company.com'},
+        }, 'claimant@company.com')
+
+        with self.assertNumQueries(1):
+            step_data = self.service.get_referenced_step_data(self.instance, 'approve')
+            authorized = self.service.is_user_authorized_for_step('expense', 'approve', 'Boss@company.com', self.instance, step_data)
+            values = self.service.resolve_form_field_values(self.instance, 'approve', step_data)
+
+        self.assertTrue(authorized)
+        self.assertEqual(values, {0: 120, 1: 'Giza', 2: 'n/a', 3: 'claimant@company.com'})
+
+    def test_assignment_default_is_used_when_reference_is_missing(self):
+        self.service.submit_step_data(str(self.instance.instance_id), 'claim', {'amount': 5}, 'claimant@company.com')
+
+        pending = StepExecution.objects.get(workflow_instance=self.instance, step_id='approve')
+        self.assertEqual(pending.assigned_to_email, 'finance@company.com')
+
+
+class WorkflowDefinitionVersionTests(TestCase):
+    def setUp(self):
+        self.service = make_service()
+
+    def edit_onboarding(self):
+        """Simulate an edited workflow.json where step_2 was removed"""
+        edited = json.loads(json.dumps(WORKFLOWS))
+        onboarding = edited['workflows'][0]
+        onboarding['steps'] = [step for step in onboarding['steps'] if step['id'] != 'step_2']
+        onboarding['steps'][0]['next_step'] = 'step_3'
+        self.service._registry = WorkflowRegistry(edited)
+
+    def test_instances_are_pinned_to_the_version_they_started_on(self):
+        first = self.service.start_workflow_instance('onboarding', 'user@company.com', 'clerk_1')
+        again = self.service.start_workflow_instance('onboarding', 'user@company.com', 'clerk_1')
+        self.assertEqual(first.workflow_version, 1)
+        self.assertEqual(again.workflow_version, 1)
+
+        self.edit_onboarding()
+        edited = self.service.start_workflow_instance('onboarding', 'user@company.com', 'clerk_1')
+        self.assertEqual(edited.workflow_version, 2)
+        self.assertEqual(WorkflowDefinition.objects.filter(workflow_id='onboarding').count(), 2)
+
+        # The in-flight instance keeps walking the steps it started with
+        self.service.submit_step_data(str(first.instance_id), 'step_1', {}, 'user@company.com')
+        first.refresh_from_db()
+        self.assertEqual(first.current_step_id, 'step_2')
+
+        self.service.submit_step_data(str(edited.instance_id), 'step_1', {}, 'user@company.com')
+        edited.refresh_from_db()
+        self.assertEqual(edited.current_step_id, 'step_3')
+
+    def test_pinned_lookups_are_cached(self):
+        instance = self.service.start_workflow_instance('onboarding', 'user@company.com', 'clerk_1')
+        self.service.definitions.clear()
+
+        with self.assertNumQueries(1):
+            self.service.get_instance_workflow(instance)
+        with self.assertNumQueries(0):
+            workflow = self.service.get_instance_workflow(instance)
+        self.assertEqual(workflow.version, 1)
+
+    def test_lru_evicts_least_recently_used_versions(self):
+        self.service.definitions.maxsize = 1
+        onboarding = self.service.start_workflow_instance('onboarding', 'user@company.com', 'clerk_1')
+        self.service.start_workflow_instance('single', 'user@company.com', 'clerk_1')
+
+        with self.assertNumQueries(1):
+            self.service.get_instance_workflow(onboarding)
+
+
+class WorkflowReloadTests(TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+        self.write(WORKFLOWS)
+        self.service = WorkflowService()
+        self.service.workflow_file_path = self.path
+
+    def write(self, document):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(document, f)
+
+    def test_reload_swaps_registry_only_when_content_changes(self):
+        registry = self.service.get_registry()
+        self.assertEqual(len(registry.version), 64)
+
+        self.write(WORKFLOWS)
+        self.assertIs(self.service.reload_workflows(), registry)
+
+        self.write({"workflows": WORKFLOWS["workflows"][:1]})
+        reloaded = self.service.reload_workflows()
+        self.assertIsNot(reloaded, registry)
+        self.assertNotEqual(reloaded.version, registry.version)
+        self.assertIsNone(self.service.get_compiled_workflow('single'))
+
+    @override_settings(WORKFLOW_DEFINITIONS_AUTO_RELOAD=True, WORKFLOW_DEFINITIONS_CHECK_INTERVAL=0)
+    def test_auto_reload_rebuilds_in_background(self):
+        registry = self.service.get_registry()
+
+        self.write({"workflows": WORKFLOWS["workflows"][:1]})
+        with self.assertLogs('app.workflow_service', 'INFO'):
+            # The request that notices the change is still served from the old registry
+            self.assertIs(self.service.get_registry(), registry)
+            self.service._reload_thread.join()
+
+        self.assertNotEqual(self.service.get_definitions_version()['version'], registry.version)
+        self.assertIsNone(self.service.get_compiled_workflow('single'))
+
+    @override_settings(WORKFLOW_DEFINITIONS_AUTO_RELOAD=True, WORKFLOW_DEFINITIONS_CHECK_INTERVAL=0)
+    def test_invalid_file_keeps_previous_registry(self):
+        registry = self.service.get_registry()
+
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('{not json')
+        with self.assertLogs('app.workflow_service', 'ERROR'):
+            self.service.get_registry()
+            self.service._reload_thread.join()
+
+        self.assertIs(self.service.get_registry(), registry)
+
+
+class WorkflowDefinitionEndpointTests(WorkflowApiTestCase):
+    def test_catalog_is_served_with_etag_and_revalidated(self):
+        response = self.client.get('/app/workflows/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], '"fixture"')
+        self.assertEqual(json.loads(response.content)['data'], WORKFLOWS)
+
+        response = self.client.get('/app/workflows/', HTTP_IF_NONE_MATCH='"fixture"')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        response = self.client.get('/app/workflows/', HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_definition_is_serialized_once(self):
+        workflow = workflow_service.get_compiled_workflow('onboarding')
+
+        response = self.client.get('/app/workflows/onboarding/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], workflow.etag)
+        self.assertIs(workflow.response_body, workflow.response_body)
+        self.assertEqual(json.loads(response.content)['data']['name'], 'Onboarding')
+
+        response = self.client.get('/app/workflows/onboarding/', HTTP_IF_NONE_MATCH=f'"other", {workflow.etag}')
+        self.assertEqual(response.status_code, 304)
+
+        self.assertEqual(self.client.get('/app/workflows/missing/').status_code, 404)
+
+    def test_version_endpoint_does_not_shadow_workflow_ids(self):
+        workflows = {"workflows": [dict(WORKFLOWS["workflows"][0], id='version')]}
+        with mock.patch.object(workflow_service, '_registry', WorkflowRegistry(workflows, version='fixture')):
+            definition = self.client.get('/app/workflows/version/')
+            version = self.client.get('/app/workflow-definitions/version/')
+
+        self.assertEqual(json.loads(definition.content)['data']['id'], 'version')
+        self.assertEqual(json.loads(version.content)['data']['version'], 'fixture')
+
+
+class RendererTests(TestCase):
+    def test_dumps_encodes_model_value_types(self):
+        moment = datetime.datetime(2025, 1, 2, 3, 4, 5, 600000, tzinfo=datetime.timezone.utc)
+        identifier = uuid.UUID('12345678-1234-5678-1234-567812345678')
+
+        encoded = json.loads(dumps({'at': moment, 'id': identifier, 'amount': decimal.Decimal('1.50'), 'day': moment.date()}))
+
+        self.assertEqual(encoded, {
+            'at': moment.isoformat(),
+            'id': str(identifier),
+            'amount': '1.50',
+            'day': '2025-01-02',
+        })
+
+    @override_settings(JSON_COMPRESSION_MIN_SIZE=64)
+    def test_large_json_responses_are_compressed_when_enabled(self):
+        with mock.patch.object(workflow_service, '_registry', WorkflowRegistry(WORKFLOWS, version='fixture')):
+            response = self.client.get('/app/workflows/', HTTP_ACCEPT_ENCODING='gzip')
+
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(response['ETag'], 'W/"fixture"')
+            self.assertEqual(json.loads(gzip.decompress(response.content))['data'], WORKFLOWS)
+
+            response = self.client.get('/app/workflows/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH='W/"fixture"')
+            self.assertEqual(response.status_code, 304)
+
+    def test_compression_is_off_by_default(self):
+        with mock.patch.object(workflow_service, '_registry', WorkflowRegistry(WORKFLOWS, version='fixture')):
+            response = self.client.get('/app/workflows/', HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class RequestTimingTests(WorkflowApiTestCase):
+    def test_one_timing_record_per_request(self):
+        instance = workflow_service.start_workflow_instance('onboarding', 'user@company.com', 'clerk_1')
+
+        with self.assertLogs('app.requests', 'INFO') as captured:
+            response = self.client.get(f'/app/workflows/instances/{instance.instance_id}/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(captured.records), 1)
+        record = captured.records[0]
+        self.assertEqual(record.status, 200)
+        self.assertEqual(record.queries, 1)
+        self.assertIn('db', record.phases_ms)
+        self.assertIn('serialization', record.phases_ms)
+
+    def test_request_timing_is_disabled_by_default(self):
+        with mock.patch('app.tracing.connections') as connections:
+            response = self.client.get('/app/workflows/')
+
+        self.assertEqual(response.status_code, 200)
+        connections.__getitem__.assert_not_called()
+
+    def test_debug_tracing_is_disabled_by_default(self):
+        import logging
+        self.assertFalse(logging.getLogger('app.views').isEnabledFor(logging.DEBUG))
+
+
+class ValidateStepAccessTests(WorkflowApiTestCase):
+    def start_claim(self, amount):
+        instance = workflow_service.start_workflow_instance('expense', 'claimant@company.com', 'clerk_1')
+        workflow_service.submit_step_data(str(instance.instance_id), 'claim', {'amount': amount}, 'claimant@company.com')
+        return instance
+
+    def validate(self, instance):
+        response = self.client.get(
+            f'/app/workflows/instances/{instance.instance_id}/steps/approve/validate/',
+            {'user_email': 'finance@company.com'}
+        )
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)['data']['step']['form']['fields']
+
+    def test_resolved_values_do_not_leak_between_requests(self):
+        first = self.start_claim(100)
+        second = self.start_claim(250)
+
+        self.assertEqual(self.validate(first)[0]['value'], 100)
+        self.assertEqual(self.validate(second)[0]['value'], 250)
+        self.assertEqual(self.validate(first)[4]['value'], 'Looks good')
+
+        shared = workflow_service.get_compiled_workflow('expense').get_step('approve')
+        self.assertEqual(shared['form']['fields'][0]['value'], '{{claim.amount}}')
+
+
+class SubmitStepQueryBudgetTests(WorkflowApiTestCase):
+    def test_submit_with_templated_next_assignment_stays_within_budget(self):
+        instance = workflow_service.start_workflow_instance('onboarding', 'user@company.com', 'clerk_1')
+        workflow_service.submit_step_data(str(instance.instance_id), 'step_1', {}, 'user@company.com')
+
+        with CaptureDataQueries() as queries:
+            step_execution = workflow_service.submit_step_data(str(instance.instance_id), 'step_2', {'ok': True}, 'manager@company.com')
+
+        self.assertLessEqual(len(queries.data_queries), SUBMIT_STEP_QUERY_BUDGET, queries.data_queries)
+        self.assertEqual(step_execution.workflow_instance.current_step_id, 'step_3')
+        self.assertEqual(StepExecution.objects.get(workflow_instance=instance, step_id='step_3').assigned_to_email, 'user@company.com')
+
+    def test_submit_endpoint_does_not_refetch_the_instance(self):
+        instance = workflow_service.start_workflow_instance('expense', 'claimant@company.com', 'clerk_1')
+
+        with CaptureDataQueries() as queries:
+            response = self.client.post(
+                f'/app/workflows/instances/{instance.instance_id}/steps/claim/submit/',
+                json.dumps({'user_email': 'claimant@company.com', 'step_data': {'manager': {'email': 'boss@company.com'}}}),
+                content_type='application/json'
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['data']['instance']['current_step_id'], 'approve')
+        self.assertLessEqual(len(queries.data_queries), SUBMIT_STEP_QUERY_BUDGET, queries.data_queries)
+        self.assertEqual(StepExecution.objects.get(workflow_instance=instance, step_id='approve').assigned_to_email, 'boss@company.com')
+
+    def test_rejected_submission_writes_nothing(self):
+        instance = workflow_service.start_workflow_instance('onboarding', 'user@company.com', 'clerk_1')
+        workflow_service.submit_step_data(str(instance.instance_id), 'step_1', {}, 'user@company.com')
+
+        with self.assertRaises(ValidationError):
+            workflow_service.submit_step_data(str(instance.instance_id), 'step_2', {}, 'intruder@company.com')
+
+        self.assertEqual(StepExecution.objects.get(workflow_instance=instance, step_id='step_2').status, 'pending')
+
+
+class BulkStartTests(WorkflowApiTestCase):
+    def post(self, entries):
+        return self.client.post('/app/workflows/instances/bulk-start/', json.dumps({'entries': entries}), content_type='application/json')
+
+    def test_reports_per_item_results(self):
+        response = self.post([
+            {'workflow_id': 'onboarding', 'user_email': 'a@company.com', 'user_clerk_id': 'clerk_a'},
+            {'workflow_id': 'missing', 'user_email': 'b@company.com', 'user_clerk_id': 'clerk_b'},
+            {'workflow_id': 'single', 'user_email': 'c@company.com'},
+            {'workflow_id': 'single', 'user_email': 'd@company.com', 'user_clerk_id': 'clerk_d'},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        body = json.loads(response.content)
+        self.assertEqual((body['succeeded'], body['failed']), (2, 2))
+        self.assertEqual([item['success'] for item in body['data']], [True, False, False, True])
+        self.assertEqual(body['data'][0]['data']['current_step_id'], 'step_1')
+        self.assertIn('not found', body['data'][1]['error'])
+        self.assertIn('user_clerk_id', body['data'][2]['error'])
+
+        # Assigned start steps get their pending execution up front
+        pending = StepExecution.objects.get(workflow_instance_id=body['data'][3]['data']['instance_id'])
+        self.assertEqual((pending.step_id, pending.status, pending.assigned_to_email), ('only', 'pending', 'd@company.com'))
+        self.assertFalse(StepExecution.objects.filter(workflow_instance_id=body['data'][0]['data']['instance_id']).exists())
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        entries = [
+            {'workflow_id': workflow_id, 'user_email': f'user{i}@company.com', 'user_clerk_id': f'clerk_{i}'}
+            for i in range(300) for workflow_id in ('onboarding', 'single')
+        ]
+        workflow_service.bulk_start_workflow_instances(entries[:2])
+
+        with CaptureDataQueries() as queries:
+            results = workflow_service.bulk_start_workflow_instances(entries)
+
+        self.assertTrue(all(result['success'] for result in results))
+        # Only INSERT batches (instances, executions, inbox rows, jobs): no per-item queries
+        # (batch size is capped by the backend's parameter limit)
+        self.assertTrue(all(sql.startswith('INSERT') for sql in queries.data_queries))
+        self.assertLess(len(queries.data_queries), 30)
+        self.assertEqual(WorkflowInstance.objects.count(), 602)
+
+    def test_rejects_invalid_payloads(self):
+        self.assertEqual(self.post([]).status_code, 400)
+        self.assertEqual(self.client.post('/app/workflows/instances/bulk-start/', 'nope', content_type='application/json').status_code, 400)
+
+
+class BulkSubmitTests(WorkflowApiTestCase):
+    def start(self, workflow_id, count=1):
+        return [
+            str(workflow_service.start_workflow_instance(workflow_id, f'user{i}@company.com', f'clerk_{i}').instance_id)
+            for i in range(count)
+        ]
+
+    def post(self, user_email, entries, **extra):
+        payload = {'user_email': user_email, 'entries': entries, **extra}
+        return self.client.post('/app/workflows/instances/bulk-submit/', json.dumps(payload), content_type='application/json')
+
+    def test_reports_per_item_results(self):
+        claim_ids = self.start('expense', 2)
+        single_id = str(workflow_service.start_workflow_instance('single', 'other@company.com', 'clerk_other').instance_id)
+
+        response = self.post('user0@company.com', [
+            {'instance_id': claim_ids[0], 'step_id': 'claim', 'step_data': {'manager': {'email': 'boss@company.com'}}},
+            {'instance_id': claim_ids[1], 'step_id': 'approve', 'step_data': {}},
+            {'instance_id': single_id, 'step_id': 'only', 'step_data': {}},
+            {'instance_id': claim_ids[0], 'step_id': 'claim', 'step_data': {}},
+            {'instance_id': str(uuid.uuid4()), 'step_id': 'claim', 'step_data': {}},
+            {'instance_id': claim_ids[1], 'step_id': 'claim'},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        body = json.loads(response.content)
+        self.assertEqual((body['succeeded'], body['failed']), (1, 5))
+        self.assertEqual(body['data'][0]['data']['instance']['current_step_id'], 'approve')
+        self.assertIn('not current', body['data'][1]['error'])
+        self.assertIn('not authorized', body['data'][2]['error'])
+        self.assertIn('more than once', body['data'][3]['error'])
+        self.assertIn('not found', body['data'][4]['error'])
+        self.assertIn('required', body['data'][5]['error'])
+
+        pending = StepExecution.objects.get(workflow_instance_id=claim_ids[0], step_id='approve')
+        self.assertEqual((pending.status, pending.assigned_to_email), ('pending', 'boss@company.com'))
+        self.assertEqual(WorkflowInstance.objects.get(pk=single_id).current_step_id, 'only')
+
+    def test_unresolvable_definition_fails_only_its_entry(self):
+        claim_id = self.start('expense')[0]
+        gone = WorkflowInstance.objects.create(workflow_id='gone', workflow_name='Gone', current_step_id='a',
+                                               initiated_by_email='user0@company.com', initiated_by_clerk_id='clerk_0')
+
+        response = self.post('user0@company.com', [
+            {'instance_id': str(gone.instance_id), 'step_id': 'a', 'step_data': {}},
+            {'instance_id': claim_id, 'step_id': 'claim', 'step_data': {}},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        body = json.loads(response.content)
+        self.assertEqual((body['succeeded'], body['failed']), (1, 1))
+        self.assertIn('not authorized', body['data'][0]['error'])
+
+    def test_completes_pending_steps(self):
+        claim_ids = self.start('expense', 3)
+        workflow_service.bulk_submit_step_data('user0@company.com', [
+            {'instance_id': instance_id, 'step_id': 'claim', 'step_data': {'amount': 10}} for instance_id in claim_ids
+        ])
+
+        results = workflow_service.bulk_submit_step_data('finance@company.com', [
+            {'instance_id': instance_id, 'step_id': 'approve', 'step_data': {'ok': True}} for instance_id in claim_ids
+        ])
+
+        self.assertTrue(all(result['success'] for result in results))
+        approvals = StepExecution.objects.filter(workflow_instance_id__in=claim_ids, step_id='approve')
+        self.assertEqual(approvals.count(), 3)
+        self.assertTrue(all(a.status == 'completed' and a.step_data == {'ok': True} for a in approvals))
+        self.assertEqual(set(WorkflowInstance.objects.filter(pk__in=claim_ids).values_list('status', flat=True)), {'completed'})
+
+    def test_all_or_nothing_writes_nothing_when_an_entry_fails(self):
+        claim_ids = self.start('expense', 2)
+
+        response = self.post('user0@company.com', [
+            {'instance_id': claim_ids[0], 'step_id': 'claim', 'step_data': {}},
+            {'instance_id': claim_ids[1], 'step_id': 'approve', 'step_data': {}},
+        ], all_or_nothing=True)
+
+        body = json.loads(response.content)
+        self.assertEqual(body['succeeded'], 0)
+        self.assertIn('all-or-nothing', body['data'][0]['error'])
+        self.assertFalse(StepExecution.objects.filter(workflow_instance_id__in=claim_ids).exists())
+        self.assertEqual(set(WorkflowInstance.objects.filter(pk__in=claim_ids).values_list('current_step_id', flat=True)), {'claim'})
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        def submit(count):
+            claim_ids = self.start('expense', count)
+            entries = [{'instance_id': instance_id, 'step_id': 'claim', 'step_data': {}} for instance_id in claim_ids]
+            with CaptureDataQueries() as queries:
+                results = workflow_service.bulk_submit_step_data('user0@company.com', entries)
+            self.assertTrue(all(result['success'] for result in results))
+            return len(queries.data_queries)
+
+        self.assertEqual(submit(2), submit(40))
+
+
+class OptimisticConcurrencyTests(WorkflowApiTestCase):
+    def bump_during_submission(self, *instance_ids):
+        """Simulate another request advancing the instances after they were read"""
+        apply_submission = workflow_service._apply_submission
+
+        def racing(instance, *args, **kwargs):
+            result = apply_submission(instance, *args, **kwargs)
+            if str(instance.pk) in instance_ids:
+                WorkflowInstance.objects.filter(pk=instance.pk).update(version=F('version') + 1)
+            return result
+        return mock.patch.object(workflow_service, '_apply_submission', racing)
+
+    def test_submit_bumps_versions(self):
+        instance = workflow_service.start_workflow_instance('onboarding', 'user@company.com', 'clerk_1')
+        workflow_service.submit_step_data(str(instance.instance_id), 'step_1', {}, 'user@company.com')
+
+        step_execution = workflow_service.submit_step_data(str(instance.instance_id), 'step_2', {}, 'manager@company.com', expected_version=2)
+
+        self.assertEqual(step_execution.workflow_instance.version, 3)
+        self.assertEqual(WorkflowInstance.objects.get(pk=instance.pk).version, 3)
+        self.assertEqual((step_execution.version, StepExecution.objects.get(pk=step_execution.pk).version), (2, 2))
+
+    def test_lost_race_raises_conflict_and_writes_nothing(self):
+        instance = workflow_service.start_workflow_instance('expense', 'claimant@company.com', 'clerk_1')
+
+        with self.bump_during_submission(str(instance.pk)), self.assertRaises(WorkflowConflictError):
+            workflow_service.submit_step_data(str(instance.instance_id), 'claim', {}, 'claimant@company.com')
+
+        self.assertEqual(WorkflowInstance.objects.get(pk=instance.pk).current_step_id, 'claim')
+        self.assertFalse(StepExecution.objects.filter(workflow_instance=instance).exists())
+
+    def test_stale_version_is_rejected_with_409(self):
+        instance = workflow_service.start_workflow_instance('expense', 'claimant@company.com', 'clerk_1')
+
+        response = self.client.post(
+            f'/app/workflows/instances/{instance.instance_id}/steps/claim/submit/',
+            json.dumps({'user_email': 'claimant@company.com', 'step_data': {}, 'version': 7}),
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(json.loads(response.content)['conflict'])
+
+    def test_bulk_submit_reports_conflicts_per_entry(self):
+        ids = [str(workflow_service.start_workflow_instance('expense', 'claimant@company.com', 'clerk_1').pk) for _ in range(3)]
+        entries = [{'instance_id': instance_id, 'step_id': 'claim', 'step_data': {}} for instance_id in ids]
+
+        with self.bump_during_submission(ids[1]):
+            results = workflow_service.bulk_submit_step_data('claimant@company.com', entries)
+
+        self.assertEqual([result['success'] for result in results], [True, False, True])
+        self.assertTrue(results[1]['conflict'])
+        self.assertEqual(
+            dict(WorkflowInstance.objects.filter(pk__in=ids).values_list('current_step_id', 'version').order_by('current_step_id')),
+            {'approve': 2, 'claim': 2}
+        )
+        self.assertFalse(StepExecution.objects.filter(workflow_instance_id=ids[1]).exists())
+
+    def test_bulk_all_or_nothing_rolls_back_on_conflict(self):
+        ids = [str(workflow_service.start_workflow_instance('expense', 'claimant@company.com', 'clerk_1').pk) for _ in range(2)]
+        entries = [{'instance_id': instance_id, 'step_id': 'claim', 'step_data': {}} for instance_id in ids]
+
+        with self.bump_during_submission(ids[0]):
+            results = workflow_service.bulk_submit_step_data('claimant@company.com', entries, all_or_nothing=True)
+
+        self.assertFalse(any(result['success'] for result in results))
+        self.assertTrue(results[0]['conflict'])
+        self.assertFalse(StepExecution.objects.filter(workflow_instance_id__in=ids).exists())
+        self.assertEqual(set(WorkflowInstance.objects.filter(pk__in=ids).values_list('current_step_id', flat=True)), {'claim'})
+
+
+class IdempotencyKeyTests(WorkflowApiTestCase):
+    START = {'workflow_id': 'onboarding', 'user_email': 'user@company.com', 'user_clerk_id': 'clerk_1'}
+
+    def start(self, key, payload=START):
+        return self.client.post(
+            '/app/workflows/instances/start/', json.dumps(payload), content_type='application/json',
+            headers={'Idempotency-Key': key} if key else {}
+        )
+
+    def test_retries_replay_the_first_response(self):
+        first = self.start('key-1')
+        with CaptureDataQueries() as queries:
+            retry = self.start('key-1')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual((retry.status_code, retry.content), (201, first.content))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(WorkflowInstance.objects.count(), 1)
+        self.assertFalse(any('app_workflowinstance' in sql for sql in queries.data_queries))
+
+    def test_requests_without_a_key_are_not_deduplicated(self):
+        self.start(None)
+        self.start(None)
+        self.assertEqual(WorkflowInstance.objects.count(), 2)
+
+    def test_key_reused_with_a_different_body_is_rejected(self):
+        self.start('key-1')
+        response = self.start('key-1', {**self.START, 'user_email': 'other@company.com'})
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(WorkflowInstance.objects.count(), 1)
+
+    def test_duplicate_waits_for_in_flight_request(self):
+        fingerprint = hashlib.sha256(json.dumps(self.START).encode()).hexdigest()
+        record = IdempotencyRecord.objects.create(
+            scope='POST /app/workflows/instances/start/', key='key-1', fingerprint=fingerprint,
+            expires_at=datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)
+        )
+
+        def original_finishes(seconds):
+            IdempotencyRecord.objects.filter(pk=record.pk).update(
+                status='completed', response_status=201, response_content_type='application/json',
+                response_body=zlib.compress(b'{"success":true}')
+            )
+
+        with mock.patch('app.idempotency.time.sleep', side_effect=original_finishes) as sleep:
+            response = self.start('key-1')
+
+        sleep.assert_called_once()
+        self.assertEqual((response.status_code, response.content), (201, b'{"success":true}'))
+        self.assertEqual(WorkflowInstance.objects.count(), 0)
+
+        with override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0):
+            IdempotencyRecord.objects.filter(pk=record.pk).update(status='in_progress')
+            self.assertEqual(self.start('key-1').status_code, 409)
+
+    def test_expired_keys_run_again(self):
+        self.start('key-1')
+        IdempotencyRecord.objects.update(expires_at=datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc))
+
+        response = self.start('key-1')
+
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(WorkflowInstance.objects.count(), 2)
+
+    def test_conflicts_are_not_stored(self):
+        instance = workflow_service.start_workflow_instance('expense', 'claimant@company.com', 'clerk_1')
+        url = f'/app/workflows/instances/{instance.instance_id}/steps/claim/submit/'
+        payload = json.dumps({'user_email': 'claimant@company.com', 'step_data': {}, 'version': 1})
+
+        with mock.patch.object(workflow_service, '_update_instances', return_value=set()):
+            conflict = self.client.post(url, payload, content_type='application/json', headers={'Idempotency-Key': 'key-1'})
+        retry = self.client.post(url, payload, content_type='application/json', headers={'Idempotency-Key': 'key-1'})
+
+        self.assertEqual((conflict.status_code, retry.status_code), (409, 200))
+        self.assertEqual(IdempotencyRecord.objects.get(key='key-1').status, 'completed')
+
+
+class AsyncViewTests(WorkflowApiTestCase):
+    async def test_pending_inbox_matches_sync_view(self):
+        instance = await sync_to_async(workflow_service.start_workflow_instance)('single', 'user@company.com', 'clerk_1')
+
+        async_response = await self.async_client.get('/app/async/workflows/pending/', {'user_email': 'user@company.com'})
+        sync_response = await sync_to_async(self.client.get)('/app/workflows/pending/', {'user_email': 'user@company.com'})
+
+        self.assertEqual(async_response.status_code, 200)
+        self.assertEqual(json.loads(async_response.content), json.loads(sync_response.content))
+        self.assertEqual(json.loads(async_response.content)['data'][0]['instance_id'], str(instance.instance_id))
+
+    async def test_pending_inbox_pages_match_sync_view(self):
+        for _ in range(3):
+            await sync_to_async(workflow_service.start_workflow_instance)('single', 'user@company.com', 'clerk_1')
+
+        first = json.loads((await self.async_client.get('/app/async/workflows/pending/', {'user_email': 'user@company.com', 'limit': 2})).content)
+        second = await self.async_client.get('/app/async/workflows/pending/', {'user_email': 'user@company.com', 'limit': 2, 'cursor': first['next_cursor']})
+        sync_second = await sync_to_async(self.client.get)('/app/workflows/pending/', {'user_email': 'user@company.com', 'limit': 2, 'cursor': first['next_cursor']})
+        bad_cursor = await self.async_client.get('/app/async/workflows/pending/', {'user_email': 'user@company.com', 'cursor': 'bogus'})
+
+        self.assertEqual((first['count'], first['total_count']), (2, 3))
+        self.assertEqual(json.loads(second.content), json.loads(sync_second.content))
+        self.assertIsNone(json.loads(second.content)['next_cursor'])
+        self.assertEqual(bad_cursor.status_code, 400)
+
+    async def test_validate_and_submit(self):
+        instance = await sync_to_async(workflow_service.start_workflow_instance)('expense', 'claimant@company.com', 'clerk_1')
+        base = f'/app/async/workflows/instances/{instance.instance_id}'
+
+        submitted = await self.async_client.post(
+            f'{base}/steps/claim/submit/',
+            json.dumps({'user_email': 'claimant@company.com', 'step_data': {'amount': 12, 'manager': {'email': 'boss@company.com'}}}),
+            content_type='application/json'
+        )
+        forbidden = await self.async_client.get(f'{base}/steps/approve/validate/', {'user_email': 'claimant@company.com'})
+        allowed = await self.async_client.get(f'{base}/steps/approve/validate/', {'user_email': 'boss@company.com'})
+        stale = await self.async_client.post(
+            f'{base}/steps/approve/submit/',
+            json.dumps({'user_email': 'boss@company.com', 'step_data': {}, 'version': 1}),
+            content_type='application/json'
+        )
+
+        self.assertEqual(submitted.status_code, 200)
+        self.assertEqual(json.loads(submitted.content)['data']['instance']['version'], 2)
+        self.assertEqual(forbidden.status_code, 403)
+        self.assertEqual(allowed.status_code, 200)
+        self.assertEqual(json.loads(allowed.content)['data']['step']['form']['fields'][0]['value'], 12)
+        self.assertEqual(stale.status_code, 409)
+
+    async def test_start_and_get_instance(self):
+        started = await self.async_client.post(
+            '/app/async/workflows/instances/start/',
+            json.dumps({'workflow_id': 'onboarding', 'user_email': 'user@company.com', 'user_clerk_id': 'clerk_1'}),
+            content_type='application/json', headers={'Idempotency-Key': 'async-key'}
+        )
+        replayed = await self.async_client.post(
+            '/app/async/workflows/instances/start/',
+            json.dumps({'workflow_id': 'onboarding', 'user_email': 'user@company.com', 'user_clerk_id': 'clerk_1'}),
+            content_type='application/json', headers={'Idempotency-Key': 'async-key'}
+        )
+        instance_id = json.loads(started.content)['data']['instance_id']
+        fetched = await self.async_client.get(f'/app/async/workflows/instances/{instance_id}/')
+        missing = await self.async_client.get('/app/async/workflows/instances/not-a-uuid/')
+
+        self.assertEqual(started.status_code, 201)
+        self.assertEqual(replayed.content, started.content)
+        self.assertEqual(await WorkflowInstance.objects.acount(), 1)
+        self.assertEqual(json.loads(fetched.content)['data']['current_step_id'], 'step_1')
+        self.assertEqual(missing.status_code, 404)
+
+
+FLAKY_CALLS = []
+
+
+@jobs.job('tests.flaky')
+def flaky_job(payload):
+    FLAKY_CALLS.append(payload)
+    if len(FLAKY_CALLS) <= payload.get('failures', 0):
+        raise RuntimeError("downstream unavailable")
+
+
+@jobs.job('tests.transaction_state')
+def transaction_state_job(payload):
+    FLAKY_CALLS.append(connection.in_atomic_block)
+
+
+@jobs.job('tests.atomic_audit', atomic=True)
+def atomic_audit_job(payload):
+    FLAKY_CALLS.append(connection.in_atomic_block)
+    AuditLog.objects.create(Action='partial')
+    raise RuntimeError("fails after writing")
+
+
+class JobQueueTests(WorkflowApiTestCase):
+    def setUp(self):
+        super().setUp()
+        FLAKY_CALLS.clear()
+
+    def test_submit_enqueues_audit_record(self):
+        instance = workflow_service.start_workflow_instance('expense', 'claimant@company.com', 'clerk_1')
+        workflow_service.submit_step_data(str(instance.instance_id), 'claim', {}, 'claimant@company.com')
+
+        queued = Job.objects.get(name='workflow.audit_step_submitted')
+        self.assertEqual(queued.status, 'queued')
+        self.assertFalse(AuditLog.objects.exists())
+
+        self.assertEqual(jobs.run_pending(), {'succeeded': 3})
+        audit = AuditLog.objects.get()
+        self.assertEqual(audit.Metadata['instance_id'], str(instance.instance_id))
+        self.assertEqual(audit.Metadata['next_step_id'], 'approve')
+
+    def test_rejected_submission_enqueues_nothing(self):
+        instance = workflow_service.start_workflow_instance('expense', 'claimant@company.com', 'clerk_1')
+        with mock.patch.object(workflow_service, '_update_instances', return_value=set()), self.assertRaises(WorkflowConflictError):
+            workflow_service.submit_step_data(str(instance.instance_id), 'claim', {}, 'claimant@company.com')
+        self.assertFalse(Job.objects.exists())
+
+    def test_failures_are_retried_with_backoff_then_dead(self):
+        queued = jobs.enqueue('tests.flaky', {'failures': 5}, max_attempts=2)
+
+        with self.assertLogs('app.jobs', 'WARNING'):
+            self.assertEqual(jobs.run_pending(), {'queued': 1})
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('queued', 1))
+        self.assertIn('downstream unavailable', queued.last_error)
+        self.assertGreater(queued.run_at, queued.updated_at)
+
+        # Not due yet
+        self.assertEqual(jobs.run_pending(), {})
+
+        Job.objects.update(run_at=queued.created_at)
+        with self.assertLogs('app.jobs', 'ERROR'):
+            self.assertEqual(jobs.run_pending(), {'dead': 1})
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts, len(FLAKY_CALLS)), ('dead', 2, 2))
+
+    def test_claimed_jobs_are_not_handed_out_twice(self):
+        jobs.enqueue_many([('tests.flaky', {'n': n}) for n in range(3)])
+
+        first = jobs.claim('worker-a', 2)
+        second = jobs.claim('worker-b', 5)
+
+        self.assertEqual(len(first), 2)
+        self.assertEqual([job.payload['n'] for job in second], [2])
+
+        # A worker that died holding jobs loses them after the lock timeout
+        with override_settings(JOB_LOCK_TIMEOUT=0):
+            reclaimed = jobs.claim('worker-c', 5)
+        self.assertEqual(len(reclaimed), 3)
+        self.assertEqual(jobs.run_job(first[0]), 'succeeded')
+        self.assertEqual(Job.objects.get(pk=first[0].pk).status, 'running')
+
+    def test_unknown_job_names_are_rejected(self):
+        with self.assertRaises(ValueError):
+            jobs.enqueue('tests.missing')
+
+
+class JobWorkerTests(TransactionTestCase):
+    def setUp(self):
+        FLAKY_CALLS.clear()
+
+    def test_thread_pool_drains_queue(self):
+        jobs.enqueue_many([('tests.flaky', {'n': n}) for n in range(10)])
+
+        outcomes = jobs.Worker(concurrency=3, pool='thread', poll_interval=0.01).run(once=True)
+
+        self.assertEqual(outcomes, {'succeeded': 10})
+        self.assertEqual(sorted(call['n'] for call in FLAKY_CALLS), list(range(10)))
+        self.assertEqual(set(Job.objects.values_list('status', flat=True)), {'succeeded'})
+
+    def test_only_atomic_handlers_run_in_a_transaction(self):
+        jobs.enqueue_many([('tests.transaction_state', {}), ('tests.atomic_audit', {})])
+
+        with self.assertLogs('app.jobs', 'WARNING'):
+            outcomes = jobs.run_pending()
+
+        self.assertEqual(outcomes, {'succeeded': 1, 'queued': 1})
+        self.assertEqual(FLAKY_CALLS, [False, True])
+        # The failed atomic handler's writes were rolled back
+        self.assertFalse(AuditLog.objects.exists())
+
+
+class LocalSmtpServer(socketserver.ThreadingTCPServer):
+    """Minimal SMTP stand-in recording delivered messages and the number of connections"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        self.messages = []
+        self.connections = 0
+        self.drop_after_message = False
+        self.reject = False
+        super().__init__(('127.0.0.1', 0), LocalSmtpHandler)
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+
+class LocalSmtpHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.reply("220 localhost ready")
+        envelope = {}
+        while True:
+            line = self.rfile.readline().decode()
+            if not line:
+                return
+            command = line.strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply("250 localhost")
+            elif command.startswith('MAIL FROM'):
+                envelope = {'from': line.strip()[10:], 'to': []}
+                self.reply("250 OK")
+            elif command.startswith('RCPT TO'):
+                if server.reject:
+                    self.reply("550 mailbox unavailable")
+                    continue
+                envelope['to'].append(line.strip()[8:].strip('<>'))
+                self.reply("250 OK")
+            elif command == 'DATA':
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                for data_line in self.rfile:
+                    if data_line in (b".\r\n", b".\n"):
+                        break
+                    data.append(data_line.decode())
+                server.messages.append({**envelope, 'data': ''.join(data)})
+                self.reply("250 OK")
+                if server.drop_after_message:
+                    return
+            elif command == 'QUIT':
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+@override_settings(NOTIFICATION_DIGEST_WINDOW=0, NOTIFICATION_FROM_EMAIL='workflows@company.com')
+class NotificationTests(WorkflowApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.smtp = LocalSmtpServer().__enter__()
+        self.addCleanup(self.smtp.__exit__)
+        self.addCleanup(notifications.smtp_pool.close_all)
+        self.email_settings = EmailSettings.objects.create(
+            SmtpServer='127.0.0.1', SmtpPort=self.smtp.port, Username='', PasswordHash='', IsEnabled=True
+        )
+
+    def claim_expense(self, manager):
+        instance = workflow_service.start_workflow_instance('expense', 'claimant@company.com', 'clerk_1')
+        workflow_service.submit_step_data(str(instance.instance_id), 'claim', {'manager': {'email': manager}}, 'claimant@company.com')
+        return instance
+
+    def test_assignments_within_the_window_share_one_digest(self):
+        self.claim_expense('boss@company.com')
+        self.claim_expense('boss@company.com')
+        self.claim_expense('other@company.com')
+
+        jobs.run_pending()
+
+        self.assertEqual(sorted(message['to'][0] for message in self.smtp.messages), ['boss@company.com', 'other@company.com'])
+        digest = next(message for message in self.smtp.messages if message['to'] == ['boss@company.com'])
+        self.assertIn('2 new workflow tasks assigned to you', digest['data'])
+        self.assertEqual(digest['data'].count('- Expense Claim: Approve (started by claimant@company.com)'), 2)
+        self.assertEqual(set(PendingNotification.objects.values_list('status', flat=True)), {'sent'})
+
+    def test_connection_is_reused_across_digests(self):
+        self.claim_expense('boss@company.com')
+        jobs.run_pending()
+        self.claim_expense('other@company.com')
+        jobs.run_pending()
+
+        self.assertEqual(len(self.smtp.messages), 2)
+        self.assertEqual(self.smtp.connections, 1)
+
+    def test_dropped_connection_is_reopened(self):
+        self.smtp.drop_after_message = True
+        self.claim_expense('boss@company.com')
+        jobs.run_pending()
+        self.claim_expense('other@company.com')
+        jobs.run_pending()
+
+        self.assertEqual(len(self.smtp.messages), 2)
+        self.assertEqual(self.smtp.connections, 2)
+
+    @override_settings(NOTIFICATION_MAX_ATTEMPTS=2, NOTIFICATION_RETRY_DELAY=3600)
+    def test_failed_deliveries_are_retried_then_given_up(self):
+        self.smtp.reject = True
+        self.claim_expense('boss@company.com')
+
+        with self.assertLogs('app.notifications', 'WARNING'):
+            jobs.run_pending()
+        notification = PendingNotification.objects.get()
+        self.assertEqual((notification.status, notification.attempts), ('pending', 1))
+        retry = Job.objects.get(name=notifications.SEND_DIGESTS_JOB, status='queued')
+
+        Job.objects.filter(pk=retry.pk).update(run_at=retry.created_at)
+        with self.assertLogs('app.notifications', 'WARNING'):
+            jobs.run_pending()
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, 'failed')
+        self.assertIn('550', notification.last_error)
+        self.assertFalse(Job.objects.filter(name=notifications.SEND_DIGESTS_JOB, status='queued').exists())
+
+    @override_settings(NOTIFICATION_TASK_URL='https://app.company.com/tasks/{instance_id}')
+    def test_link_is_omitted_when_payload_lacks_a_placeholder(self):
+        notifications.queue_notification('boss@company.com', notifications.STEP_ASSIGNED, {'workflow_name': 'Expense Claim', 'step_name': 'Approve'})
+
+        with self.assertLogs('app.notifications', 'WARNING'):
+            jobs.run_pending()
+
+        self.assertIn('- Expense Claim: Approve', self.smtp.messages[0]['data'])
+        self.assertNotIn('https://', self.smtp.messages[0]['data'])
+        self.assertEqual(PendingNotification.objects.get().status, 'sent')
+
+    def test_abandoned_claims_are_taken_again(self):
+        fresh = PendingNotification.objects.create(recipient='boss@company.com', kind=notifications.STEP_ASSIGNED, status='sending', claimed_at=now())
+        stale = PendingNotification.objects.create(recipient='boss@company.com', kind=notifications.STEP_ASSIGNED, status='sending',
+                                                   claimed_at=now() - datetime.timedelta(hours=1))
+
+        self.assertEqual(notifications.claim_notifications(), [stale])
+        claimed_at = fresh.claimed_at
+        fresh.refresh_from_db()
+        self.assertEqual((fresh.status, fresh.claimed_at), ('sending', claimed_at))
+
+
+@override_settings(NOTIFICATION_DIGEST_WINDOW=0, NOTIFICATION_FROM_EMAIL='workflows@company.com')
+class NotificationTransactionTests(TransactionTestCase):
+    def test_digests_are_sent_outside_transactions(self):
+        EmailSettings.objects.create(SmtpServer='127.0.0.1', SmtpPort=2525, Username='', PasswordHash='', IsEnabled=True)
+        notifications.queue_notification('boss@company.com', notifications.STEP_ASSIGNED, {'workflow_name': 'Expense Claim'})
+        seen = []
+
+        def send(row, message):
+            seen.append((connection.in_atomic_block, list(PendingNotification.objects.values_list('status', flat=True))))
+
+        with mock.patch.object(notifications.smtp_pool, 'send', side_effect=send):
+            self.assertEqual(jobs.run_pending(), {'succeeded': 1})
+
+        self.assertEqual(seen, [(False, ['sending'])])
+        self.assertEqual(PendingNotification.objects.get().status, 'sent')
+
+
+def read_event(chunk):
+    """Parse one SSE frame into a dict of its fields (data decoded as JSON)"""
+    fields = dict(line.split(': ', 1) for line in chunk.decode().strip().split('\n'))
+    if 'data' in fields:
+        fields['data'] = json.loads(fields['data'])
+    return fields
+
+
+@override_settings(SSE_RESYNC_INTERVAL=0)
+class InboxEventStreamTests(WorkflowApiTestCase):
+    def submit_and_commit(self, instance_id, step_id, step_data, user_email):
+        with self.captureOnCommitCallbacks(execute=True):
+            workflow_service.submit_step_data(instance_id, step_id, step_data, user_email)
+
+    async def open_stream(self, user_email, **headers):
+        response = await self.async_client.get('/app/async/workflows/pending/events/', {'user_email': user_email}, headers=headers)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        return stream
+
+    async def test_submission_is_pushed_to_assignee_and_executor(self):
+        instance = await sync_to_async(workflow_service.start_workflow_instance)('expense', 'claimant@company.com', 'clerk_1')
+        boss = await self.open_stream('boss@company.com')
+        claimant = await self.open_stream('claimant@company.com')
+        self.assertEqual(read_event(await anext(boss))['event'], 'ready')
+        self.assertEqual(read_event(await anext(claimant))['event'], 'ready')
+
+        await sync_to_async(self.submit_and_commit)(str(instance.instance_id), 'claim', {'manager': {'email': 'boss@company.com'}}, 'claimant@company.com')
+
+        assigned = read_event(await asyncio.wait_for(anext(boss), 1))
+        completed = read_event(await asyncio.wait_for(anext(claimant), 1))
+        self.assertEqual(assigned['event'], 'assigned')
+        self.assertEqual((assigned['data']['instance_id'], assigned['data']['step_id']), (str(instance.instance_id), 'approve'))
+        self.assertEqual(completed['event'], 'completed')
+        self.assertEqual(completed['data']['executed_by_email'], 'claimant@company.com')
+
+        await boss.aclose()
+        await claimant.aclose()
+
+    async def test_closing_the_stream_unsubscribes(self):
+        stream = events.inbox_event_stream('Listener@company.com', None)
+        await anext(stream)
+        self.assertTrue(events.broker.has_subscribers('listener@company.com'))
+
+        await stream.aclose()
+        self.assertFalse(events.broker.has_subscribers('listener@company.com'))
+
+    async def test_reconnect_catches_up_after_last_event_id(self):
+        instance = await sync_to_async(workflow_service.start_workflow_instance)('expense', 'claimant@company.com', 'clerk_1')
+        stream = await self.open_stream('boss@company.com')
+        last_event_id = read_event(await anext(stream))['id']
+        await stream.aclose()
+
+        await sync_to_async(workflow_service.submit_step_data)(str(instance.instance_id), 'claim', {'manager': {'email': 'boss@company.com'}}, 'claimant@company.com')
+
+        stream = await self.open_stream('boss@company.com', **{'Last-Event-ID': last_event_id})
+        missed = read_event(await anext(stream))
+        await stream.aclose()
+        self.assertEqual((missed['event'], missed['data']['step_id']), ('assigned', 'approve'))
+        self.assertGreaterEqual(int(missed['id']), int(last_event_id))
+
+    @override_settings(SSE_KEEPALIVE_INTERVAL=0.01, SSE_RESYNC_INTERVAL=0.05)
+    async def test_idle_stream_sends_keepalives_and_resyncs_changes_made_elsewhere(self):
+        instance = await sync_to_async(workflow_service.start_workflow_instance)('expense', 'claimant@company.com', 'clerk_1')
+        stream = await self.open_stream('boss@company.com')
+        await anext(stream)
+        self.assertEqual(await anext(stream), b': keepalive\n\n')
+
+        # Not published here (the commit callback never runs), as if another worker made the change
+        await sync_to_async(workflow_service.submit_step_data)(str(instance.instance_id), 'claim', {'manager': {'email': 'boss@company.com'}}, 'claimant@company.com')
+
+        chunk = b': keepalive\n\n'
+        while chunk == b': keepalive\n\n':
+            chunk = await asyncio.wait_for(anext(stream), 1)
+        await stream.aclose()
+        self.assertEqual(read_event(chunk)['data']['step_id'], 'approve')
+
+    async def test_invalid_requests(self):
+        missing = await self.async_client.get('/app/async/workflows/pending/events/')
+        bad_id = await self.async_client.get('/app/async/workflows/pending/events/', {'user_email': 'boss@company.com'}, headers={'Last-Event-ID': 'abc'})
+
+        self.assertEqual(missing.status_code, 400)
+        self.assertEqual(bad_id.status_code, 400)
+
+    def test_event_data_is_encoded_like_rest_responses(self):
+        data = {'instance_id': uuid.uuid4(), 'updated_at': now()}
+
+        frame = events.format_event({'event': events.ASSIGNED, 'id': '1', 'data': data})
+
+        self.assertIn('data: ' + dumps(data).decode() + '\n', frame)
+
+
+class StepAnalyticsTests(WorkflowApiTestCase):
+    def complete_expense(self):
+        instance = workflow_service.start_workflow_instance('expense', 'claimant@company.com', 'clerk_1')
+        workflow_service.submit_step_data(str(instance.instance_id), 'claim', {'manager': {'email': 'boss@company.com'}}, 'claimant@company.com')
+        workflow_service.submit_step_data(str(instance.instance_id), 'approve', {}, 'boss@company.com')
+        return instance
+
+    def test_submissions_record_step_and_instance_timestamps(self):
+        instance = workflow_service.start_workflow_instance('expense', 'claimant@company.com', 'clerk_1')
+        workflow_service.submit_step_data(str(instance.instance_id), 'claim', {'manager': {'email': 'boss@company.com'}}, 'claimant@company.com')
+        claim = StepExecution.objects.get(workflow_instance=instance, step_id='claim')
+        approve = StepExecution.objects.get(workflow_instance=instance, step_id='approve')
+
+        self.assertEqual(claim.started_at, instance.updated_at)
+        self.assertEqual(approve.started_at, claim.completed_at)
+        self.assertIsNone(approve.completed_at)
+
+        workflow_service.submit_step_data(str(instance.instance_id), 'approve', {}, 'boss@company.com')
+        approve.refresh_from_db()
+        instance.refresh_from_db()
+        self.assertGreaterEqual(approve.completed_at, approve.started_at)
+        self.assertEqual(instance.completed_at, approve.completed_at)
+
+    def test_bulk_submit_records_timestamps(self):
+        instance = workflow_service.start_workflow_instance('expense', 'claimant@company.com', 'clerk_1')
+        workflow_service.bulk_submit_step_data('claimant@company.com', [
+            {'instance_id': str(instance.instance_id), 'step_id': 'claim', 'step_data': {}}
+        ])
+
+        claim = StepExecution.objects.get(workflow_instance=instance, step_id='claim')
+        approve = StepExecution.objects.get(workflow_instance=instance, step_id='approve')
+        self.assertIsNotNone(claim.started_at)
+        self.assertEqual((approve.started_at, approve.completed_at), (claim.completed_at, None))
+
+    def test_sketch_quantiles_are_within_relative_accuracy(self):
+        stats = StepDurationStats(workflow_id='expense', step_id='claim')
+        for seconds in range(1, 1001):
+            step_analytics.add_duration(stats, float(seconds))
+
+        self.assertEqual((stats.count, stats.min_seconds, stats.max_seconds), (1000, 1.0, 1000.0))
+        for q, exact in ((0.5, 500), (0.9, 900), (0.99, 990)):
+            self.assertAlmostEqual(step_analytics.quantile(stats, q), exact, delta=exact * step_analytics.SKETCH_RELATIVE_ACCURACY)
+        self.assertLess(len(stats.buckets), 200)
+
+    def test_analytics_endpoint_reads_aggregated_durations(self):
+        self.complete_expense()
+        self.complete_expense()
+        jobs.run_pending()
+        step_analytics.record_durations('expense', {'approve': [3600.0]})
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/app/workflows/expense/analytics/')
+        data = json.loads(response.content)['data']
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(step['step_id'], step['count']) for step in data['steps']], [('claim', 2), ('approve', 3)])
+        self.assertAlmostEqual(data['steps'][1]['p99'], 3600.0, delta=3600 * step_analytics.SKETCH_RELATIVE_ACCURACY)
+        self.assertEqual(data['cycle_time']['count'], 2)
+        self.assertEqual(self.client.get('/app/workflows/missing/analytics/').status_code, 404)
+
+
+class WorkflowInstanceListTests(WorkflowApiTestCase):
+    def start_claims(self, managers):
+        started = workflow_service.bulk_start_workflow_instances([
+            {'workflow_id': 'expense', 'user_email': 'claimant@company.com', 'user_clerk_id': 'clerk_1'} for _ in managers
+        ])
+        workflow_service.bulk_submit_step_data('claimant@company.com', [
+            {'instance_id': str(result['instance'].instance_id), 'step_id': 'claim', 'step_data': {'manager': {'email': manager}}}
+            for result, manager in zip(started, managers)
+        ])
+        return [str(result['instance'].instance_id) for result in started]
+
+    def list_assigned(self, user_email):
+        with CaptureDataQueries() as queries:
+            response = self.client.get('/app/workflows/instances/', {'assigned_to': user_email})
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content), len(queries.data_queries)
+
+    def test_assigned_to_matches_pending_current_step_only(self):
+        boss_ids = self.start_claims(['boss@company.com', 'boss@company.com'])
+        self.start_claims(['other@company.com'])
+        done = self.start_claims(['boss@company.com'])[0]
+        workflow_service.submit_step_data(done, 'approve', {}, 'boss@company.com')
+
+        body, _ = self.list_assigned('boss@company.com')
+
+        self.assertEqual(body['pagination']['total_count'], 2)
+        self.assertEqual({instance['instance_id'] for instance in body['data']}, set(boss_ids))
+
+    def test_assigned_to_query_count_does_not_grow_with_table_size(self):
+        self.start_claims(['boss@company.com', 'boss@company.com'])
+        _, small_table = self.list_assigned('boss@company.com')
+
+        self.start_claims([f'other{i}@company.com' for i in range(50)])
+        body, large_table = self.list_assigned('boss@company.com')
+
+        self.assertEqual(body['pagination']['total_count'], 2)
+        self.assertEqual(small_table, large_table)
+
+    def test_page_is_serialized_with_constant_queries(self):
+        boss_ids = self.start_claims(['boss@company.com'] * 30)
+        workflow_service.bulk_start_workflow_instances([
+            {'workflow_id': 'onboarding', 'user_email': 'user@company.com', 'user_clerk_id': 'clerk_1'} for _ in range(20)
+        ])
+
+        with self.assertNumQueries(3):
+            response = self.client.get('/app/workflows/instances/', {'limit': 500})
+        body = json.loads(response.content)
+
+        self.assertEqual(body['pagination']['total_count'], 50)
+        claims = {instance['instance_id']: instance for instance in body['data'] if instance['workflow_id'] == 'expense'}
+        self.assertEqual(set(claims), set(boss_ids))
+        claim = claims[boss_ids[0]]
+        self.assertEqual((claim['current_step']['step_id'], claim['current_step']['assigned_to_email']), ('approve', 'boss@company.com'))
+        self.assertNotIn('created_at', claim['current_step'])
+        self.assertEqual([step['step_id'] for step in claim['steps']], ['claim', 'approve'])
+        self.assertEqual((claim['workflow_name'], claim['steps_count']), ('Expense Claim', 2))
+
+        # Definitions missing from the cache are loaded together
+        workflow_service.definitions.clear()
+        with self.assertNumQueries(4):
+            self.client.get('/app/workflows/instances/', {'limit': 500})
+
+
+class CursorPaginationTests(WorkflowApiTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        workflow_service.bulk_start_workflow_instances([
+            {'workflow_id': 'onboarding', 'user_email': f'user{i}@company.com', 'user_clerk_id': f'clerk_{i}'} for i in range(25)
+        ])
+        # Identical timestamps for half of the rows, so pages must break ties on instance_id
+        tied = list(WorkflowInstance.objects.order_by('created_at').values_list('pk', flat=True)[:12])
+        WorkflowInstance.objects.filter(pk__in=tied).update(created_at=WorkflowInstance.objects.get(pk=tied[0]).created_at)
+
+    def page(self, **params):
+        with CaptureDataQueries() as queries:
+            response = self.client.get('/app/workflows/instances/', {'pagination': 'cursor', 'limit': 10, **params})
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content), queries.data_queries
+
+    def test_cursor_walks_every_instance_once_newest_first(self):
+        seen = []
+        cursor = None
+        query_counts = []
+        while True:
+            body, queries = self.page(**({'cursor': cursor} if cursor else {}))
+            seen.extend(body['data'])
+            query_counts.append(len(queries))
+            self.assertFalse(any('COUNT(' in sql for sql in queries))
+            cursor = body['pagination']['next_cursor']
+            if not cursor:
+                break
+
+        expected = list(WorkflowInstance.objects.order_by('-created_at', '-instance_id').values_list('instance_id', flat=True))
+        self.assertEqual([instance['instance_id'] for instance in seen], [str(pk) for pk in expected])
+        self.assertEqual([len(body) for body in (seen[:10], seen[10:20], seen[20:])], [10, 10, 5])
+        self.assertEqual(query_counts, [2, 2, 2])
+
+    def test_total_count_is_optional_and_cached(self):
+        body, _ = self.page()
+        self.assertNotIn('total_count', body['pagination'])
+
+        body, queries = self.page(include_count='true')
+        self.assertEqual(body['pagination']['total_count'], 25)
+        self.assertTrue(any('COUNT(' in sql for sql in queries))
+
+        body, queries = self.page(include_count='true')
+        self.assertEqual(body['pagination']['total_count'], 25)
+        self.assertFalse(any('COUNT(' in sql for sql in queries))
+
+    def test_tampered_cursor_is_rejected(self):
+        body, _ = self.page()
+        cursor = body['pagination']['next_cursor']
+
+        response = self.client.get('/app/workflows/instances/', {'cursor': cursor[:-2] + 'xx'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_audit_log_pages(self):
+        for i in range(5):
+            AuditLog.objects.create(Action=f'action {i}')
+
+        first = self.client.get('/app/audit-log/', {'limit': 3}).json()
+        second = self.client.get('/app/audit-log/', {'limit': 3, 'cursor': first['next_cursor']}).json()
+
+        self.assertEqual([log['Action'] for log in first['data'] + second['data']], [f'action {i}' for i in reversed(range(5))])
+        self.assertIsNone(second['next_cursor'])
+        self.assertEqual(len(self.client.get('/app/audit-log/').json()), 5)
+
+    def test_audit_log_page_is_one_query(self):
+        for i in range(3):
+            AuditLog.objects.create(Action=f'action {i}')
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/app/audit-log/', {'limit': 2})
+        self.assertIsNotNone(response.json()['next_cursor'])
+
+
+
+class InboxProjectionTests(WorkflowApiTestCase):
+    def start_claim(self, manager):
+        instance = workflow_service.start_workflow_instance('expense', 'claimant@company.com', 'clerk_1')
+        workflow_service.submit_step_data(str(instance.instance_id), 'claim', {'manager': {'email': manager}}, 'claimant@company.com')
+        return str(instance.instance_id)
+
+    def inbox(self, user_email, **params):
+        with CaptureDataQueries() as queries:
+            response = self.client.get('/app/workflows/pending/', {'user_email': user_email, **params})
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content), queries.data_queries
+
+    def test_rows_follow_the_instance_through_its_steps(self):
+        instance = workflow_service.start_workflow_instance('onboarding', 'starter@company.com', 'clerk_1')
+        instance_id = str(instance.instance_id)
+        self.assertFalse(InboxItem.objects.exists())
+
+        workflow_service.submit_step_data(instance_id, 'step_1', {}, 'starter@company.com')
+        item = InboxItem.objects.get()
+        self.assertEqual((str(item.instance_id), item.assigned_to_email, item.step_id, item.step_name, item.status),
+                         (instance_id, 'manager@company.com', 'step_2', 'Manager Review', 'in_progress'))
+
+        workflow_service.submit_step_data(instance_id, 'step_2', {}, 'manager@company.com')
+        self.assertEqual(list(InboxItem.objects.values_list('assigned_to_email', 'step_id')), [('starter@company.com', 'step_3')])
+
+        workflow_service.submit_step_data(instance_id, 'step_3', {}, 'starter@company.com')
+        self.assertFalse(InboxItem.objects.exists())
+
+    def test_bulk_submit_maintains_rows(self):
+        started = workflow_service.bulk_start_workflow_instances([
+            {'workflow_id': 'expense', 'user_email': 'claimant@company.com', 'user_clerk_id': 'clerk_1'} for _ in range(3)
+        ])
+        instance_ids = [str(result['instance'].instance_id) for result in started]
+        workflow_service.bulk_submit_step_data('claimant@company.com', [
+            {'instance_id': instance_id, 'step_id': 'claim', 'step_data': {'manager': {'email': 'boss@company.com'}}}
+            for instance_id in instance_ids
+        ])
+        self.assertEqual(InboxItem.objects.filter(assigned_to_email='boss@company.com').count(), 3)
+
+        workflow_service.bulk_submit_step_data('boss@company.com', [
+            {'instance_id': instance_id, 'step_id': 'approve', 'step_data': {}} for instance_id in instance_ids[:2]
+        ])
+        self.assertEqual([str(item.instance_id) for item in InboxItem.objects.all()], instance_ids[2:])
+
+    def test_inbox_response_and_group_counts(self):
+        first = self.start_claim('manager@company.com')
+        self.start_claim('manager@company.com')
+        self.start_claim('other@company.com')
+        instance = workflow_service.start_workflow_instance('onboarding', 'starter@company.com', 'clerk_1')
+        workflow_service.submit_step_data(str(instance.instance_id), 'step_1', {}, 'starter@company.com')
+
+        body, queries = self.inbox('manager@company.com')
+
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(body['count'], 3)
+        self.assertEqual(body['total_count'], 3)
+        self.assertEqual(body['groups'], [
+            {'workflow_id': 'expense', 'workflow_name': 'Expense Claim', 'count': 2},
+            {'workflow_id': 'onboarding', 'workflow_name': 'Onboarding', 'count': 1},
+        ])
+        self.assertEqual(body['data'][0]['instance_id'], first)
+        self.assertEqual(
+            {key: body['data'][0][key] for key in ('workflow_id', 'workflow_name', 'current_step_id', 'step_name', 'initiated_by_email', 'status')},
+            {'workflow_id': 'expense', 'workflow_name': 'Expense Claim', 'current_step_id': 'approve', 'step_name': 'Approve',
+             'initiated_by_email': 'claimant@company.com', 'status': 'in_progress'}
+        )
+
+    def test_pages_and_query_count_do_not_depend_on_inbox_size(self):
+        instance_ids = [self.start_claim('boss@company.com') for _ in range(5)]
+
+        first, queries = self.inbox('boss@company.com', limit=3)
+        second, _ = self.inbox('boss@company.com', limit=3, cursor=first['next_cursor'])
+
+        self.assertEqual(len(queries), 2)
+        self.assertEqual([item['instance_id'] for item in first['data'] + second['data']], instance_ids)
+        self.assertEqual(second['total_count'], 5)
+        self.assertIsNone(second['next_cursor'])
+        response = self.client.get('/app/workflows/pending/', {'user_email': 'boss@company.com', 'cursor': 'bogus'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_rebuild_regenerates_rows_from_source_tables(self):
+        self.start_claim('boss@company.com')
+        self.start_claim('other@company.com')
+        expected = list(InboxItem.objects.order_by('pk').values())
+        InboxItem.objects.all().delete()
+        StepExecution.objects.filter(assigned_to_email='other@company.com').update(assigned_to_email='boss@company.com')
+
+        out = io.StringIO()
+        call_command('rebuild_inbox', stdout=out)
+
+        self.assertIn('2 items', out.getvalue())
+        rebuilt = list(InboxItem.objects.order_by('pk').values())
+        self.assertEqual([item['assigned_to_email'] for item in rebuilt], ['boss@company.com', 'boss@company.com'])
+        for item in expected:
+            item['assigned_to_email'] = 'boss@company.com'
+        self.assertEqual(rebuilt, expected)
+
+    def test_rebuild_if_empty_only_backfills(self):
+        self.start_claim('boss@company.com')
+        InboxItem.objects.all().delete()
+
+        call_command('rebuild_inbox', '--if-empty', stdout=io.StringIO())
+        self.assertEqual(InboxItem.objects.count(), 1)
+
+        StepExecution.objects.update(assigned_to_email='other@company.com')
+        out = io.StringIO()
+        call_command('rebuild_inbox', '--if-empty', stdout=out)
+
+        self.assertIn('already populated', out.getvalue())
+        self.assertEqual(InboxItem.objects.get().assigned_to_email, 'boss@company.com')
+
+
+class ExportTests(WorkflowApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.instance_ids = []
+        for amount in (10, 20, 30):
+            instance = workflow_service.start_workflow_instance('expense', 'claimant@company.com', 'clerk_1')
+            workflow_service.submit_step_data(
+                str(instance.instance_id), 'claim', {'amount': amount, 'manager': {'email': 'boss@company.com'}}, 'claimant@company.com'
+            )
+            self.instance_ids.append(str(instance.instance_id))
+        workflow_service.submit_step_data(self.instance_ids[0], 'approve', {'approved': True}, 'boss@company.com')
+        instance = workflow_service.start_workflow_instance('onboarding', 'starter@company.com', 'clerk_2')
+        self.instance_ids.append(str(instance.instance_id))
+
+    def export(self, **params):
+        response = self.client.get('/app/workflows/instances/export/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode('utf-8')
+
+    def test_ndjson_has_one_line_per_instance_with_step_data(self):
+        response, body = self.export()
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertIn('attachment; filename="workflow-instances-', response['Content-Disposition'])
+        records = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([record['instance_id'] for record in records], self.instance_ids)
+        self.assertEqual(
+            [(step['step_id'], step['status'], step['step_data']) for step in records[0]['steps']],
+            [('claim', 'completed', {'amount': 10, 'manager': {'email': 'boss@company.com'}}), ('approve', 'completed', {'approved': True})]
+        )
+        self.assertEqual(records[0]['status'], 'completed')
+        self.assertEqual(records[3]['steps'], [])
+
+    def test_csv_has_one_row_per_step_execution(self):
+        response, body = self.export(format='csv', status='in_progress')
+
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([(row['instance_id'], row['step_id'], row['step_status']) for row in rows], [
+            (self.instance_ids[1], 'claim', 'completed'), (self.instance_ids[1], 'approve', 'pending'),
+            (self.instance_ids[2], 'claim', 'completed'), (self.instance_ids[2], 'approve', 'pending'),
+        ])
+        self.assertEqual(json.loads(rows[0]['step_data']), {'amount': 20, 'manager': {'email': 'boss@company.com'}})
+        self.assertEqual(rows[1]['executed_by_email'], '')
+
+    def test_rejects_unknown_format(self):
+        response = self.client.get('/app/workflows/instances/export/', {'format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_reads_instances_a_chunk_at_a_time(self):
+        with CaptureDataQueries() as queries:
+            records = list(export.export_records(export.export_queryset(), chunk_size=2))
+
+        self.assertEqual(len(records), 4)
+        # The instances, then the step executions of each chunk of two
+        self.assertEqual(len(queries.data_queries), 3)
+
+    def test_command_writes_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'export.csv')
+            call_command('export_instances', '--format', 'csv', '--initiated-by', 'starter@company.com', '--output', path, stdout=io.StringIO())
+            with open(path, newline='') as output:
+                rows = list(csv.DictReader(output))
+
+        self.assertEqual([(row['instance_id'], row['step_id']) for row in rows], [(self.instance_ids[3], '')])
+
+
+class QueryPlanTests(TestCase):
+    def test_hot_queries_use_indexes(self):
+        for name, build in HOT_QUERIES.items():
+            with self.subTest(name):
+                plan = explain(build())
+                self.assertEqual(full_scans(plan), [], plan)
+
+    def test_full_scans_are_detected(self):
+        plan = explain(WorkflowInstance.objects.filter(workflow_name='Expense claim'))
+        self.assertTrue(full_scans(plan), plan)
+
+    def test_explain_queries_command(self):
+        out = io.StringIO()
+        call_command('explain_queries', 'inbox page', stdout=out)
+        self.assertIn('inbox page: ok', out.getvalue())
@@ -0,0 +1,138 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connections
+
+
+request_logger = logging.getLogger('app.requests')
+
+_current_timing: ContextVar[Optional['RequestTiming']] = ContextVar('request_timing', default=None)
+
+
+class RequestTiming:
+    """Accumulated per-phase durations (seconds) for the current request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.queries = 0
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def as_dict(self) -> Dict[str, float]:
+        return {phase: round(seconds * 1000, 3) for phase, seconds in self.phases.items()}
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+
+@contextmanager
+def timed(phase: str):
+    """Add the duration of the block to `phase` of the current request, if one is being timed"""
+    timing = _current_timing.get()
+    if timing is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(phase, time.perf_counter() - started)
+
+
+def _time_query(execute, sql, params, many, context):
+    timing = _current_timing.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.queries += 1
+        timing.add('db', time.perf_counter() - started)
+
+
+class RequestTimingMiddleware:
+    """Times each request by phase (db, resolution, serialization) and logs one record for it"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not request_logger.isEnabledFor(logging.INFO):
+            return self.get_response(request)
+
+        timing = RequestTiming()
+        token = _current_timing.set(timing)
+        try:
+            with connections['default'].execute_wrapper(_time_query):
+                response = self.get_response(request)
+        finally:
+            _current_timing.reset(token)
+
+        self._log(request, response, timing)
+        return response
+
+    async def __acall__(self, request):
+        if not request_logger.isEnabledFor(logging.INFO):
+            return await self.get_response(request)
+
+        timing = RequestTiming()
+        token = _current_timing.set(timing)
+        try:
+            with connections['default'].execute_wrapper(_time_query):
+                response = await self.get_response(request)
+        finally:
+            _current_timing.reset(token)
+
+        self._log(request, response, timing)
+        return response
+
+    def _log(self, request, response, timing: RequestTiming):
+        request_logger.info(
+            "%s %s %s %.1fms",
+            request.method, request.path, response.status_code, timing.elapsed * 1000,
+            extra={
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round(timing.elapsed * 1000, 3),
+                'queries': timing.queries,
+                'phases_ms': timing.as_dict(),
+            }
+        )
+
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RESERVED_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class StructuredFormatter(logging.Formatter):
+    """Formats records as one JSON object per line, including `extra` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS:
+                payload[key] = value
+        if record.exc_info:
+            payload['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
@@ -1,4 +1,4 @@
-from django.urls import path
+from django.urls import include, path
 from . import views
 
 from .views import roles_view, permissions_view, role_permissions_view, users_view, user_roles_view, email_settings_view, status_dictionary_view, integrations_view, audit_log_view
@@ -6,12 +6,18 @@ from .views import roles_view, permissions_view, role_permissions_view, users_vi
 urlpatterns = [
     path('userCreated', views.user_created, name='user_created'),
     # Workflow Management Endpoints
+    path('async/', include('app.async_urls')),
     path('workflows/', views.get_workflow_definitions, name='get_workflow_definitions'),
+    path('workflow-definitions/version/', views.get_workflow_definitions_version, name='get_workflow_definitions_version'),
     path('workflows/pending/', views.get_pending_workflows_for_user, name='get_pending_workflows_for_user'),
     path('workflows/instances/', views.get_workflow_instances, name='get_workflow_instances'),
     path('workflows/instances/start/', views.start_workflow, name='start_workflow'),
+    path('workflows/instances/bulk-start/', views.bulk_start_workflows, name='bulk_start_workflows'),
+    path('workflows/instances/bulk-submit/', views.bulk_submit_step_data, name='bulk_submit_step_data'),
+    path('workflows/instances/export/', views.export_workflow_instances, name='export_workflow_instances'),
     path('workflows/instances/<str:instance_id>/', views.get_workflow_instance, name='get_workflow_instance'),
     path('workflows/<str:workflow_id>/', views.get_workflow_definition, name='get_workflow_definition'),
+    path('workflows/<str:workflow_id>/analytics/', views.get_workflow_analytics, name='get_workflow_analytics'),
     path('workflows/instances/<str:instance_id>/steps/<str:step_id>/validate/', views.validate_step_access, name='validate_step_access'),
     path('workflows/instances/<str:instance_id>/steps/<str:step_id>/submit/', views.submit_step_data, name='submit_step_data'),
      # path('check_user_exists/<str:email>', views.check_user_exists, name='check_user_exists'),
@@ -1,13 +1,23 @@
 from django.contrib.auth.models import User, Group
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import parse_etags
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.decorators import api_view
 from django.utils.timezone import now, timedelta
 from .models import *
-from .workflow_service import workflow_service
+from .workflow_service import workflow_service, WorkflowConflictError, BULK_MAX_ENTRIES
+from .renderers import FastJsonResponse
+from .export import CONTENT_TYPES, NDJSON, export_queryset, stream_export
+from .idempotency import idempotent
+from .inbox import inbox_page
+from .pagination import InvalidCursor, approximate_count, keyset_paginate
+from . import queries
+from .step_analytics import workflow_duration_summary
+from .workflow_templates import overlay_field_values
 from django.apps import apps
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET
 from django.utils.dateparse import parse_datetime
 from django.shortcuts import get_object_or_404
 from django.forms.models import model_to_dict
@@ -17,23 +27,53 @@ from django.utils.dateparse import parse_datetime
 from django.core.exceptions import ValidationError
 from urllib.parse import unquote
 import json
+import logging
 import random
 
 
+logger = logging.getLogger(__name__)
+
+
 # Workflow Management Endpoints
 
+def _definition_response(request, body, etag):
+    """Serve pre-serialized definition bytes, answering 304 when the client's ETag still matches"""
+    # Compare weakly: compressed responses hand out W/ variants of the same validator
+    client_etags = [tag.removeprefix('W/') for tag in parse_etags(request.headers.get('If-None-Match', ''))]
+    if etag in client_etags or '*' in client_etags:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    # Let clients cache, but revalidate so definition changes show up immediately
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
 @api_view(['GET'])
 @csrf_exempt
 def get_workflow_definitions(request):
     """Get all workflow definitions from workflow.json"""
     try:
-        workflows = workflow_service.get_workflows()
-        return JsonResponse({
+        registry = workflow_service.get_registry()
+        return _definition_response(request, registry.response_body, registry.etag)
+    except Exception as e:
+        return FastJsonResponse({
+            "error": f"Failed to load workflows: {str(e)}"
+        }, status=500)
+
+
+@api_view(['GET'])
+@csrf_exempt
+def get_workflow_definitions_version(request):
+    """Get the version (content hash) of the workflow definitions this worker is serving"""
+    try:
+        return FastJsonResponse({
             "success": True,
-            "data": workflows
+            "data": workflow_service.get_definitions_version()
         }, status=200)
     except Exception as e:
-        return JsonResponse({
+        return FastJsonResponse({
             "error": f"Failed to load workflows: {str(e)}"
         }, status=500)
 
@@ -43,24 +83,47 @@ def get_workflow_definitions(request):
 def get_workflow_definition(request, workflow_id):
     """Get specific workflow definition by ID"""
     try:
-        workflow = workflow_service.get_workflow_by_id(workflow_id)
+        workflow = workflow_service.get_compiled_workflow(workflow_id)
+        if not workflow:
+            return FastJsonResponse({
+                "error": "Workflow not found"
+            }, status=404)
+        
+        return _definition_response(request, workflow.response_body, workflow.etag)
+    except Exception as e:
+        return FastJsonResponse({
+            "error": f"Failed to load workflow: {str(e)}"
+        }, status=500)
+
+
+@api_view(['GET'])
+@csrf_exempt
+def get_workflow_analytics(request, workflow_id):
+    """
+    Time-in-step per step and end-to-end cycle time of a workflow, in seconds:
+    count, mean, min, max and p50/p90/p99 (estimated within 2%), read from the
+    pre-aggregated duration statistics
+    """
+    try:
+        workflow = workflow_service.get_compiled_workflow(workflow_id)
         if not workflow:
-            return JsonResponse({
+            return FastJsonResponse({
                 "error": "Workflow not found"
             }, status=404)
         
-        return JsonResponse({
+        return FastJsonResponse({
             "success": True,
-            "data": workflow
+            "data": workflow_duration_summary(workflow_id, workflow.steps.values())
         }, status=200)
     except Exception as e:
-        return JsonResponse({
-            "error": f"Failed to load workflow: {str(e)}"
+        return FastJsonResponse({
+            "error": f"An error occurred: {str(e)}"
         }, status=500)
 
 
 @api_view(['POST'])
 @csrf_exempt
+@idempotent
 def start_workflow(request):
     """
     Start a new workflow instance
@@ -79,7 +142,7 @@ def start_workflow(request):
         missing_fields = [field for field in required_fields if not data.get(field)]
         
         if missing_fields:
-            return JsonResponse({
+            return FastJsonResponse({
                 "error": f"Missing required fields: {', '.join(missing_fields)}"
             }, status=400)
         
@@ -90,25 +153,91 @@ def start_workflow(request):
             user_clerk_id=data['user_clerk_id']
         )
         
-        return JsonResponse({
+        return FastJsonResponse({
             "success": True,
             "message": "Workflow instance started successfully",
             "data": {
                 "instance_id": str(instance.instance_id),
                 "workflow_id": instance.workflow_id,
+                "workflow_version": instance.workflow_version,
                 "workflow_name": instance.workflow_name,
                 "current_step_id": instance.current_step_id,
                 "status": instance.status,
-                "created_at": instance.created_at.isoformat()
+                "created_at": instance.created_at
             }
         }, status=201)
         
     except ValidationError as e:
-        return JsonResponse({
+        return FastJsonResponse({
             "error": str(e)
         }, status=400)
     except Exception as e:
-        return JsonResponse({
+        return FastJsonResponse({
+            "error": f"An error occurred: {str(e)}"
+        }, status=500)
+
+
+@api_view(['POST'])
+@csrf_exempt
+@idempotent
+def bulk_start_workflows(request):
+    """
+    Start many workflow instances in one request
+    Expected JSON payload:
+    {
+        "entries": [
+            {"workflow_id": "string", "user_email": "email@example.com", "user_clerk_id": "string"},
+            ...
+        ]
+    }
+    Returns one result per entry (in order) with the new instance or that entry's error.
+    """
+    try:
+        data = json.loads(request.body) if request.body else {}
+        entries = data.get('entries')
+        
+        if not isinstance(entries, list) or not entries:
+            return FastJsonResponse({
+                "error": "entries must be a non-empty list"
+            }, status=400)
+        
+        if len(entries) > BULK_MAX_ENTRIES:
+            return FastJsonResponse({
+                "error": f"At most {BULK_MAX_ENTRIES} entries can be started per request"
+            }, status=400)
+        
+        results = workflow_service.bulk_start_workflow_instances(entries)
+        
+        items = []
+        for result in results:
+            instance = result.pop('instance', None)
+            if instance is not None:
+                result['data'] = {
+                    "instance_id": instance.instance_id,
+                    "workflow_id": instance.workflow_id,
+                    "workflow_version": instance.workflow_version,
+                    "workflow_name": instance.workflow_name,
+                    "current_step_id": instance.current_step_id,
+                    "status": instance.status,
+                    "created_at": instance.created_at
+                }
+            items.append(result)
+        
+        succeeded = sum(1 for item in items if item['success'])
+        return FastJsonResponse({
+            "success": True,
+            "message": f"Started {succeeded} of {len(items)} workflow instances",
+            "data": items,
+            "succeeded": succeeded,
+            "failed": len(items) - succeeded
+        }, status=200)
+        
+    except json.JSONDecodeError:
+        return FastJsonResponse({
+            "error": "Invalid JSON payload"
+        }, status=400)
+    except Exception as e:
+        return FastJsonResponse({
             "error": f"An error occurred: {str(e)}"
         }, status=500)
 
@@ -120,26 +249,28 @@ def get_workflow_instance(request, instance_id):
     try:
         instance = workflow_service.get_workflow_instance(instance_id)
         if not instance:
-            return JsonResponse({
+            return FastJsonResponse({
                 "error": "Workflow instance not found"
             }, status=404)
         
-        return JsonResponse({
+        return FastJsonResponse({
             "success": True,
             "data": {
                 "instance_id": str(instance.instance_id),
                 "workflow_id": instance.workflow_id,
+                "workflow_version": instance.workflow_version,
                 "workflow_name": instance.workflow_name,
                 "current_step_id": instance.current_step_id,
                 "status": instance.status,
                 "initiated_by_email": instance.initiated_by_email,
-                "created_at": instance.created_at.isoformat(),
-                "updated_at": instance.updated_at.isoformat()
+                "created_at": instance.created_at,
+                "updated_at": instance.updated_at,
+                "version": instance.version
             }
         }, status=200)
         
     except Exception as e:
-        return JsonResponse({
+        return FastJsonResponse({
             "error": f"An error occurred: {str(e)}"
         }, status=500)
 
@@ -154,45 +285,47 @@ def validate_step_access(request, instance_id, step_id):
     try:
         user_email = request.GET.get('user_email')
         if not user_email:
-            return JsonResponse({
+            return FastJsonResponse({
                 "error": "user_email query parameter required"
             }, status=400)
         
         instance = workflow_service.get_workflow_instance(instance_id)
         if not instance:
-            return JsonResponse({
+            return FastJsonResponse({
                 "error": "Workflow instance not found"
             }, status=404)
         
+        # One query fetches every completed step the assignment and form fields refer to
+        referenced_step_data = workflow_service.get_referenced_step_data(instance, step_id)
+        
         is_authorized = workflow_service.is_user_authorized_for_step(
             workflow_id=instance.workflow_id,
             step_id=step_id,
             user_email=user_email,
-            instance=instance
+            instance=instance,
+            step_data=referenced_step_data
         )
         
         if not is_authorized:
-            return JsonResponse({
+            return FastJsonResponse({
                 "error": "Not authorized to access this step",
                 "authorized": False
             }, status=403)
         
-        # Get step definition with resolved template variables
-        step = workflow_service.get_step_by_id(instance.workflow_id, step_id)
+        # Get step definition (from the version the instance is pinned to) with resolved template variables
+        workflow_definition = workflow_service.get_instance_workflow(instance)
+        step = workflow_definition.get_step(step_id) if workflow_definition else None
         if not step:
-            return JsonResponse({
+            return FastJsonResponse({
                 "error": "Step not found"
             }, status=404)
         
-        # Resolve template variables in form fields
-        if step.get('form') and step['form'].get('fields'):
-            for field in step['form']['fields']:
-                if field.get('value'):
-                    field['value'] = workflow_service.resolve_template_variables(
-                        field['value'], instance
-                    )
+        # Resolve template variables in form fields; the cached definition is shared and
+        # read-only, so the resolved values are overlaid onto it for this response only
+        resolved_values = workflow_service.resolve_form_field_values(instance, step_id, referenced_step_data)
+        step = overlay_field_values(step, resolved_values)
         
-        return JsonResponse({
+        return FastJsonResponse({
             "success": True,
             "authorized": True,
             "data": {
@@ -200,39 +333,43 @@ def validate_step_access(request, instance_id, step_id):
                 "instance": {
                     "instance_id": str(instance.instance_id),
                     "current_step_id": instance.current_step_id,
-                    "status": instance.status
+                    "status": instance.status,
+                    "version": instance.version
                 }
             }
         }, status=200)
         
     except Exception as e:
-        return JsonResponse({
+        return FastJsonResponse({
             "error": f"An error occurred: {str(e)}"
         }, status=500)
 
 
 @api_view(['POST'])
 @csrf_exempt
+@idempotent
 def submit_step_data(request, instance_id, step_id):
     """
     Submit data for a workflow step
     Expected JSON payload:
     {
         "user_email": "email@example.com",
-        "step_data": {...}
+        "step_data": {...},
+        "version": 3  (optional: the instance version the client last saw)
     }
+    Responds 409 if the instance was changed by another request in the meantime.
     """
     try:
         data = json.loads(request.body) if request.body else {}
         
         # Validate required fields
         if not data.get('user_email'):
-            return JsonResponse({
+            return FastJsonResponse({
                 "error": "user_email is required"
             }, status=400)
         
         if 'step_data' not in data:
-            return JsonResponse({
+            return FastJsonResponse({
                 "error": "step_data is required"
             }, status=400)
         
@@ -241,13 +378,14 @@ def submit_step_data(request, instance_id, step_id):
             instance_id=instance_id,
             step_id=step_id,
             step_data=data['step_data'],
-            user_email=data['user_email']
+            user_email=data['user_email'],
+            expected_version=data.get('version')
         )
         
-        # Get updated instance
-        instance = workflow_service.get_workflow_instance(instance_id)
+        # The service returns the updated instance with the execution; no re-fetch needed
+        instance = step_execution.workflow_instance
         
-        return JsonResponse({
+        return FastJsonResponse({
             "success": True,
             "message": "Step data submitted successfully",
             "data": {
@@ -256,17 +394,103 @@ def submit_step_data(request, instance_id, step_id):
                     "instance_id": str(instance.instance_id),
                     "current_step_id": instance.current_step_id,
                     "status": instance.status,
-                    "updated_at": instance.updated_at.isoformat()
+                    "updated_at": instance.updated_at,
+                    "version": instance.version
                 }
             }
         }, status=200)
         
+    except WorkflowConflictError as e:
+        return FastJsonResponse({
+            "error": str(e),
+            "conflict": True
+        }, status=409)
     except ValidationError as e:
-        return JsonResponse({
+        return FastJsonResponse({
             "error": str(e)
         }, status=400)
     except Exception as e:
-        return JsonResponse({
+        return FastJsonResponse({
+            "error": f"An error occurred: {str(e)}"
+        }, status=500)
+
+
+@api_view(['POST'])
+@csrf_exempt
+@idempotent
+def bulk_submit_step_data(request):
+    """
+    Submit step data for many workflow instances on behalf of one user
+    Expected JSON payload:
+    {
+        "user_email": "email@example.com",
+        "entries": [
+            {"instance_id": "uuid", "step_id": "string", "step_data": {...}, "version": 3 (optional)},
+            ...
+        ],
+        "all_or_nothing": false
+    }
+    Returns one result per entry (in order); entries that raced with another
+    request are marked "conflict": true. With all_or_nothing, nothing is
+    written unless every entry can be applied.
+    """
+    try:
+        data = json.loads(request.body) if request.body else {}
+        entries = data.get('entries')
+        
+        if not data.get('user_email'):
+            return FastJsonResponse({
+                "error": "user_email is required"
+            }, status=400)
+        
+        if not isinstance(entries, list) or not entries:
+            return FastJsonResponse({
+                "error": "entries must be a non-empty list"
+            }, status=400)
+        
+        if len(entries) > BULK_MAX_ENTRIES:
+            return FastJsonResponse({
+                "error": f"At most {BULK_MAX_ENTRIES} entries can be submitted per request"
+            }, status=400)
+        
+        results = workflow_service.bulk_submit_step_data(
+            user_email=data['user_email'],
+            entries=entries,
+            all_or_nothing=bool(data.get('all_or_nothing', False))
+        )
+        
+        items = []
+        for result in results:
+            step_execution = result.pop('step_execution', None)
+            if step_execution is not None:
+                instance = step_execution.workflow_instance
+                result['data'] = {
+                    "step_execution_id": step_execution.execution_id,
+                    "instance": {
+                        "instance_id": str(instance.instance_id),
+                        "current_step_id": instance.current_step_id,
+                        "status": instance.status,
+                        "updated_at": instance.updated_at,
+                        "version": instance.version
+                    }
+                }
+            items.append(result)
+        
+        succeeded = sum(1 for item in items if item['success'])
+        return FastJsonResponse({
+            "success": True,
+            "message": f"Submitted {succeeded} of {len(items)} steps",
+            "data": items,
+            "succeeded": succeeded,
+            "failed": len(items) - succeeded
+        }, status=200)
+        
+    except json.JSONDecodeError:
+        return FastJsonResponse({
+            "error": "Invalid JSON payload"
+        }, status=400)
+    except Exception as e:
+        return FastJsonResponse({
             "error": f"An error occurred: {str(e)}"
         }, status=500)
 
@@ -274,70 +498,85 @@ def submit_step_data(request, instance_id, step_id):
 @api_view(['GET'])
 @csrf_exempt
 def get_pending_workflows_for_user(request):
-    """Get all workflows with pending steps assigned to the current user"""
+    """
+    Get all workflows with pending steps assigned to the current user, oldest
+    first, with per-workflow counts. Optional limit/cursor return keyset pages.
+    """
     try:
         from urllib.parse import unquote
         
         user_email = request.GET.get('user_email')
         if not user_email:
-            return JsonResponse({
+            return FastJsonResponse({
                 "error": "user_email parameter is required"
             }, status=400)
         
         # URL decode the email parameter (handle %40 -> @)
         user_email = unquote(user_email)
-        print(f"🔍 Looking for pending workflows for user: {user_email}")
-        
-        # Get all workflow instances with pending steps assigned to the user
-        pending_step_executions = StepExecution.objects.filter(
-            assigned_to_email=user_email,
-            status='pending'
-        ).select_related('workflow_instance')
+        logger.debug("Looking for pending workflows for user %s", user_email)
         
-        print(f"📊 Found {pending_step_executions.count()} pending step executions")
-        
-        # Group by workflow instance and prepare response data
-        pending_workflows = []
-        for step_execution in pending_step_executions:
-            instance = step_execution.workflow_instance
-            
-            print(f"📋 Processing step: {step_execution.step_name} for workflow {instance.workflow_name}")
-            
-            # Get workflow definition to get workflow name
-            try:
-                workflow_definition = workflow_service.get_workflow_by_id(instance.workflow_id)
-                workflow_name = workflow_definition['name']
-            except:
-                workflow_name = instance.workflow_name
-            
-            pending_workflows.append({
-                "instance_id": str(instance.instance_id),
-                "workflow_id": instance.workflow_id,
-                "workflow_name": workflow_name,
-                "current_step_id": step_execution.step_id,
-                "step_name": step_execution.step_name,
-                "initiated_by_email": instance.initiated_by_email,
-                "created_at": instance.created_at.isoformat(),
-                "step_created_at": step_execution.created_at.isoformat(),
-                "status": instance.status
-            })
+        # One range scan of the user's inbox rows, plus one grouped count per workflow
+        try:
+            limit = min(int(request.GET['limit']), 500) if 'limit' in request.GET else None
+            inbox = inbox_page(user_email, request.GET.get('cursor'), limit)
+        except (InvalidCursor, ValueError) as e:
+            return FastJsonResponse({"error": str(e)}, status=400)
         
+        logger.debug("Returning %d pending workflows for user %s", inbox["count"], user_email)
         
-        print(f"✅ Returning {len(pending_workflows)} pending workflows")
-        
-        return JsonResponse({
-            "success": True,
-            "data": pending_workflows,
-            "count": len(pending_workflows)
-        }, status=200)
+        return FastJsonResponse(inbox, status=200)
         
     except Exception as e:
-        print(f"❌ Error in get_pending_workflows_for_user: {str(e)}")
-        return JsonResponse({
+        logger.exception("Error in get_pending_workflows_for_user")
+        return FastJsonResponse({
             "error": f"An error occurred: {str(e)}"
         }, status=500)
 
 
+# Columns get_workflow_instances serializes (plus what the query and prefetch need)
+LISTING_INSTANCE_FIELDS = (
+    'instance_id', 'workflow_id', 'workflow_name', 'workflow_version', 'current_step_id', 'status',
+    'initiated_by_email', 'initiated_by_clerk_id', 'created_at', 'updated_at', 'completed_at'
+)
+LISTING_STEP_FIELDS = (
+    'workflow_instance', 'step_id', 'step_name', 'status', 'assigned_to_email', 'executed_by_email',
+    'started_at', 'completed_at', 'created_at'
+)
+# Keyset order of cursor pagination (newest first; instance_id breaks ties)
+LISTING_ORDERING = ('-created_at', '-instance_id')
+
+
+def _instance_filters(request):
+    """filter_workflow_instances() arguments from the listing's filter parameters"""
+    created_after = request.GET.get('created_after')
+    created_before = request.GET.get('created_before')
+    initiated_by = request.GET.get('initiated_by')
+    assigned_to = request.GET.get('assigned_to')
+    
+    # Unparseable dates are ignored
+    created_after_dt = created_before_dt = None
+    if created_after:
+        try:
+            created_after_dt = parse_datetime(created_after)
+        except:
+            pass
+            
+    if created_before:
+        try:
+            created_before_dt = parse_datetime(created_before)
+        except:
+            pass
+    
+    return {
+        "status": request.GET.get('status'),
+        "initiated_by": unquote(initiated_by) if initiated_by else None,
+        "created_after": created_after_dt,
+        "created_before": created_before_dt,
+        # Only current pending steps assigned to the user
+        "assigned_to": unquote(assigned_to) if assigned_to else None
+    }
+
+
 @api_view(['GET'])
 def get_workflow_instances(request):
     """
@@ -350,125 +589,90 @@ def get_workflow_instances(request):
     - initiated_by: Filter by user who initiated the workflow
     - limit: Limit number of results (default: 100)
     - offset: Pagination offset (default: 0)
+    - pagination: "cursor" for keyset pagination (newest first); follow pagination.next_cursor
+      with the cursor parameter. Pages cost the same at any depth; total_count is only
+      included with include_count=true and is then cached for a short while
+    - cursor: next_cursor of the previous page (implies pagination=cursor)
     """
     try:
         # Parse query parameters
-        status = request.GET.get('status')
-        assigned_to = request.GET.get('assigned_to')
-        created_after = request.GET.get('created_after')
-        created_before = request.GET.get('created_before')
-        initiated_by = request.GET.get('initiated_by')
+        filters = _instance_filters(request)
         limit = min(int(request.GET.get('limit', 100)), 500)  # Cap at 500
         offset = int(request.GET.get('offset', 0))
+        cursor = request.GET.get('cursor')
+        use_cursor = bool(cursor) or request.GET.get('pagination') == 'cursor'
         
-        print(f"🔍 Filtering workflow instances with params: status={status}, assigned_to={assigned_to}, initiated_by={initiated_by}")
-        
-        # Start with all instances
-        queryset = WorkflowInstance.objects.all()
-        
-        # Apply filters
-        if status:
-            queryset = queryset.filter(status=status)
-            
-        if initiated_by:
-            initiated_by = unquote(initiated_by)
-            queryset = queryset.filter(initiated_by_email=initiated_by)
-            
-        if created_after:
-            try:
-                created_after_dt = parse_datetime(created_after)
-                if created_after_dt:
-                    queryset = queryset.filter(created_at__gte=created_after_dt)
-            except:
-                pass
-                
-        if created_before:
-            try:
-                created_before_dt = parse_datetime(created_before)
-                if created_before_dt:
-                    queryset = queryset.filter(created_at__lte=created_before_dt)
-            except:
-                pass
-        
-        # Filter by assignment - only current pending steps assigned to user
-        if assigned_to:
-            assigned_to = unquote(assigned_to)
-            # Find instances where the current step is pending and assigned to this user
-            assigned_instance_ids = []
-            for instance in WorkflowInstance.objects.all():
-                if instance.current_step_id:
-                    current_step = instance.step_executions.filter(
-                        step_id=instance.current_step_id,
-                        status='pending',
-                        assigned_to_email=assigned_to
-                    ).first()
-                    if current_step:
-                        assigned_instance_ids.append(instance.instance_id)
-            
-            queryset = queryset.filter(instance_id__in=assigned_instance_ids)
-        
-        # Order by creation date (newest first)
-        queryset = queryset.order_by('-created_at')
-        
-        # Get total count before pagination
-        total_count = queryset.count()
+        logger.debug(
+            "Filtering workflow instances",
+            extra={'status': filters['status'], 'assigned_to': filters['assigned_to'], 'initiated_by': filters['initiated_by']}
+        )
         
-        # Apply pagination
-        instances = queryset[offset:offset + limit]
+        queryset = queries.filter_workflow_instances(WorkflowInstance.objects.all(), **filters)
         
-        # Prefetch related step executions for each instance
-        instances = instances.prefetch_related(
+        # One query for the page and one for all of its step executions, loading only the columns
+        # the payload uses; the current step is then picked from the prefetched rows in memory
+        page_queryset = queryset.only(*LISTING_INSTANCE_FIELDS).prefetch_related(
             Prefetch(
                 'step_executions',
-                queryset=StepExecution.objects.order_by('created_at')
+                queryset=StepExecution.objects.only(*LISTING_STEP_FIELDS).order_by('created_at')
             )
         )
         
+        if use_cursor:
+            instances, next_cursor = keyset_paginate(page_queryset, LISTING_ORDERING, cursor, limit)
+            pagination = {
+                "mode": "cursor",
+                "count": len(instances),
+                "limit": limit,
+                "next_cursor": next_cursor,
+                "has_more": next_cursor is not None
+            }
+            if request.GET.get('include_count') == 'true':
+                pagination["total_count"] = approximate_count(queryset)
+        else:
+            # Order by creation date (newest first)
+            queryset = queryset.order_by('-created_at')
+            
+            # Get total count before pagination
+            total_count = queryset.count()
+            instances = list(page_queryset.order_by('-created_at')[offset:offset + limit])
+            pagination = {
+                "total_count": total_count,
+                "count": len(instances),
+                "limit": limit,
+                "offset": offset,
+                "has_more": offset + limit < total_count
+            }
+        workflows = workflow_service.get_instance_workflows(instances)
+        
         # Prepare response data
         instances_data = []
         for instance in instances:
-            # Get current step info
-            current_step = None
-            if instance.current_step_id:
-                current_step_execution = instance.step_executions.filter(
-                    step_id=instance.current_step_id
-                ).first()
-                if current_step_execution:
-                    current_step = {
-                        "step_id": current_step_execution.step_id,
-                        "step_name": current_step_execution.step_name,
-                        "status": current_step_execution.status,
-                        "assigned_to_email": current_step_execution.assigned_to_email,
-                        "executed_by_email": current_step_execution.executed_by_email,
-                        "started_at": current_step_execution.started_at.isoformat() if current_step_execution.started_at else None,
-                        "completed_at": current_step_execution.completed_at.isoformat() if current_step_execution.completed_at else None
-                    }
-            
-            # Get all step executions for progress tracking
             steps = []
+            current_step = None
             for step_exec in instance.step_executions.all():
-                steps.append({
+                step = {
                     "step_id": step_exec.step_id,
                     "step_name": step_exec.step_name,
                     "status": step_exec.status,
                     "assigned_to_email": step_exec.assigned_to_email,
                     "executed_by_email": step_exec.executed_by_email,
-                    "started_at": step_exec.started_at.isoformat() if step_exec.started_at else None,
-                    "completed_at": step_exec.completed_at.isoformat() if step_exec.completed_at else None,
-                    "created_at": step_exec.created_at.isoformat()
-                })
+                    "started_at": step_exec.started_at,
+                    "completed_at": step_exec.completed_at
+                }
+                if current_step is None and instance.current_step_id and step_exec.step_id == instance.current_step_id:
+                    current_step = dict(step)
+                step["created_at"] = step_exec.created_at
+                steps.append(step)
             
-            # Try to get workflow name and total steps count from service
+            # Workflow name and total steps count from the pinned definition
             workflow_name = instance.workflow_name
             total_steps_count = len(steps)  # fallback to actual steps
-            try:
-                workflow_definition = workflow_service.get_workflow_by_id(instance.workflow_id)
-                workflow_name = workflow_definition['name']
-                # Get total steps count from workflow definition
-                if 'steps' in workflow_definition:
-                    total_steps_count = len(workflow_definition['steps'])
-            except:
-                pass
+            workflow_definition = workflows.get(instance.instance_id)
+            if workflow_definition:
+                workflow_name = workflow_definition.name
+                if 'steps' in workflow_definition.definition:
+                    total_steps_count = workflow_definition.steps_count
             
             instances_data.append({
                 "instance_id": str(instance.instance_id),
@@ -479,34 +683,58 @@ def get_workflow_instances(request):
                 "status": instance.status,
                 "initiated_by_email": instance.initiated_by_email,
                 "initiated_by_clerk_id": instance.initiated_by_clerk_id,
-                "created_at": instance.created_at.isoformat(),
-                "updated_at": instance.updated_at.isoformat(),
-                "completed_at": instance.completed_at.isoformat() if instance.completed_at else None,
+                "created_at": instance.created_at,
+                "updated_at": instance.updated_at,
+                "completed_at": instance.completed_at,
                 "steps": steps,
                 "steps_count": total_steps_count
             })
         
-        print(f"✅ Returning {len(instances_data)} workflow instances (total: {total_count})")
+        logger.debug("Returning %d workflow instances", len(instances_data))
         
-        return JsonResponse({
+        return FastJsonResponse({
             "success": True,
             "data": instances_data,
-            "pagination": {
-                "total_count": total_count,
-                "count": len(instances_data),
-                "limit": limit,
-                "offset": offset,
-                "has_more": offset + limit < total_count
-            }
+            "pagination": pagination
         }, status=200)
         
+    except InvalidCursor as e:
+        return FastJsonResponse({
+            "error": str(e)
+        }, status=400)
     except Exception as e:
-        print(f"❌ Error in get_workflow_instances: {str(e)}")
-        return JsonResponse({
+        logger.exception("Error in get_workflow_instances")
+        return FastJsonResponse({
             "error": f"An error occurred: {str(e)}"
         }, status=500)
 
 
+# A plain Django view: DRF would treat ?format= as a renderer override
+@require_GET
+def export_workflow_instances(request):
+    """
+    Stream every workflow instance matching the listing filters (status,
+    assigned_to, created_after, created_before, initiated_by), oldest first,
+    with its step executions and step_data.
+    Query parameters:
+    - format: "ndjson" (default, one instance per line) or "csv" (one row per step execution)
+    The response is written while instances are read, EXPORT_CHUNK_SIZE at a
+    time, so memory use does not depend on the size of the export.
+    """
+    try:
+        export_format = request.GET.get('format', NDJSON)
+        body = stream_export(export_queryset(**_instance_filters(request)), export_format)
+    except ValueError as e:
+        return FastJsonResponse({
+            "error": str(e)
+        }, status=400)
+    
+    response = StreamingHttpResponse(body, content_type=CONTENT_TYPES[export_format])
+    filename = f"workflow-instances-{now():%Y%m%d-%H%M%S}.{export_format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 @api_view(['POST'])
 @csrf_exempt
 def user_created(request):
@@ -522,7 +750,7 @@ def user_created(request):
         email = data.get('email')
         
         if not email:
-            return JsonResponse({
+            return FastJsonResponse({
                 'error': 'Email is required'
             }, status=400)
         
@@ -545,14 +773,14 @@ def user_created(request):
             user_group, _ = Group.objects.get_or_create(name='User')
             user.groups.add(user_group)
             
-            return JsonResponse({
+            return FastJsonResponse({
                 'message': 'User created successfully',
                 'user_id': user.id,
                 'email': user.email,
                 'created': True
             }, status=201)
         else:
-            return JsonResponse({
+            return FastJsonResponse({
                 'message': 'User already exists',
                 'user_id': user.id,
                 'email': user.email,
@@ -560,11 +788,11 @@ def user_created(request):
             }, status=200)
             
     except json.JSONDecodeError:
-        return JsonResponse({
+        return FastJsonResponse({
             'error': 'Invalid JSON payload'
         }, status=400)
     except Exception as e:
-        return JsonResponse({
+        return FastJsonResponse({
             'error': f'Internal server error: {str(e)}'
         }, status=500)
 
@@ -838,8 +1066,21 @@ def audit_log_view(request, id=None):
         if id:
             audit_log = AuditLog.objects.get(AuditLogID=id)
             return Response({"AuditLogID": audit_log.AuditLogID, "Action": audit_log.Action, "UserID": audit_log.UserID.UserID if audit_log.UserID else None}, status=status.HTTP_200_OK)
+        if 'cursor' in request.GET or 'limit' in request.GET:
+            # Keyset pages, newest first: {"data": [...], "next_cursor": ...}
+            try:
+                limit = min(int(request.GET.get('limit', 100)), 500)
+                audit_logs, next_cursor = keyset_paginate(
+                    AuditLog.objects.only('AuditLogID', 'Action', 'UserID', 'Timestamp'), ('-Timestamp', '-AuditLogID'), request.GET.get('cursor'), limit
+                )
+            except (InvalidCursor, ValueError) as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({
+                "data": [{"AuditLogID": al.AuditLogID, "Action": al.Action, "UserID": al.UserID_id} for al in audit_logs],
+                "next_cursor": next_cursor
+            }, status=status.HTTP_200_OK)
         audit_logs = AuditLog.objects.all()
-        return Response([{"AuditLogID": al.AuditLogID, "Action": al.Action, "UserID": al.UserID.UserID if al.UserID else None} for al in audit_logs], status=status.HTTP_200_OK)
+        return Response([{"AuditLogID": al.AuditLogID, "Action": al.Action, "UserID": al.UserID_id} for al in audit_logs], status=status.HTTP_200_OK)
 
     elif request.method == 'POST':
         audit_log = AuditLog.objects.create(
@@ -0,0 +1,88 @@
+from types import MappingProxyType
+from typing import Dict, Any, List, Mapping, FrozenSet, Optional, Tuple
+from django.core.exceptions import ValidationError
+
+
+class WorkflowDefinitionError(ValidationError):
+    """Raised when workflow.json contains definitions that cannot run"""
+
+
+class WorkflowAnalysis:
+    """
+    Facts about a workflow graph derived once at load time.
+
+    errors make the definition unusable (no steps, missing start step, dangling or cyclic
+    next_step, duplicate step ids, templates reading steps that cannot have
+    completed yet); warnings are kept for operators (unreachable steps).
+    """
+
+    def __init__(self, steps: List[Dict[str, Any]], next_steps: Mapping[str, str], start_step_id: Optional[str], templates: Mapping[str, Any]):
+        errors = []
+        warnings = []
+
+        step_ids = [step.get('id') for step in steps]
+        seen = set()
+        for step_id in step_ids:
+            if not step_id:
+                errors.append("step without an id")
+            elif step_id in seen:
+                errors.append(f"duplicate step id '{step_id}'")
+            seen.add(step_id)
+
+        for step_id, next_step_id in next_steps.items():
+            if next_step_id not in seen:
+                errors.append(f"step '{step_id}' has next_step '{next_step_id}' which does not exist")
+
+        if not steps:
+            errors.append("workflow has no steps")
+        elif start_step_id is None:
+            errors.append("no starting step (every step is the next_step of another)")
+
+        for cycle in self._find_cycles(step_ids, next_steps):
+            errors.append("next_step cycle: " + " -> ".join(cycle))
+
+        # Walk the chain from the start step; each step's predecessors are the steps before it
+        predecessors: Dict[str, FrozenSet[str]] = {}
+        path: Tuple[str, ...] = ()
+        step_id = start_step_id
+        while step_id in seen and step_id not in predecessors:
+            predecessors[step_id] = frozenset(path)
+            path += (step_id,)
+            step_id = next_steps.get(step_id)
+
+        for step_id in step_ids:
+            if step_id and step_id not in predecessors:
+                warnings.append(f"step '{step_id}' is unreachable from the starting step")
+
+        for step_id, step_templates in templates.items():
+            if step_id not in predecessors:
+                continue
+            for referenced in sorted(step_templates.referenced_step_ids - predecessors[step_id]):
+                errors.append(f"step '{step_id}' uses templates from step '{referenced}' which cannot precede it")
+
+        self.errors: Tuple[str, ...] = tuple(errors)
+        self.warnings: Tuple[str, ...] = tuple(warnings)
+        self.predecessors: Mapping[str, FrozenSet[str]] = MappingProxyType(predecessors)
+        self.reachable: FrozenSet[str] = frozenset(predecessors)
+
+    @property
+    def is_valid(self) -> bool:
+        return not self.errors
+
+    @staticmethod
+    def _find_cycles(step_ids, next_steps: Mapping[str, str]) -> List[List[str]]:
+        cycles = []
+        visited = set()
+        for origin in step_ids:
+            trail = []
+            positions = {}
+            step_id = origin
+            while step_id in next_steps and step_id not in visited:
+                if step_id in positions:
+                    cycles.append(trail[positions[step_id]:] + [step_id])
+                    break
+                positions[step_id] = len(trail)
+                trail.append(step_id)
+                step_id = next_steps[step_id]
+            visited.update(trail)
+        return cycles
@@ -0,0 +1,35 @@
+from typing import Any, Dict
+
+from .jobs import job
+from .models import AuditLog, Users
+from .notifications import STEP_ASSIGNED, queue_notification
+from .step_analytics import record_durations
+
+
+# Side effects of workflow changes, run by the job worker after the change commits
+
+STEP_SUBMITTED_AUDIT = 'workflow.audit_step_submitted'
+STEP_ASSIGNED_NOTIFICATION = 'workflow.notify_step_assigned'
+STEP_DURATIONS = 'workflow.record_step_durations'
+
+
+@job(STEP_SUBMITTED_AUDIT)
+def audit_step_submitted(payload: Dict[str, Any]):
+    """Record a step submission in the audit log"""
+    AuditLog.objects.create(
+        Action=f"Workflow step submitted: {payload['workflow_id']}/{payload['step_id']}",
+        UserID=Users.objects.filter(Email__iexact=payload['user_email']).first(),
+        Metadata=payload
+    )
+
+
+@job(STEP_ASSIGNED_NOTIFICATION, atomic=True)
+def notify_step_assigned(payload: Dict[str, Any]):
+    """Queue an email to the assignee of a new pending step (sent with the next digest)"""
+    queue_notification(payload['assigned_to_email'], STEP_ASSIGNED, payload)
+
+
+@job(STEP_DURATIONS, atomic=True)
+def record_step_durations(payload: Dict[str, Any]):
+    """Add completed steps' time-in-step (and cycle times) to the duration statistics"""
+    record_durations(payload['workflow_id'], payload['durations'])
@@ -0,0 +1,135 @@
+import hashlib
+import json
+from datetime import datetime, timezone
+from functools import cached_property
+from types import MappingProxyType
+from typing import Dict, Any, Optional, Mapping, Tuple
+
+from .frozen import freeze
+from .renderers import dumps
+from .workflow_analysis import WorkflowAnalysis, WorkflowDefinitionError
+from .workflow_templates import CompiledStepTemplates
+
+
+def definition_checksum(definition: Dict[str, Any]) -> str:
+    """Stable content hash of a single workflow definition"""
+    canonical = json.dumps(definition, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class CompiledWorkflow:
+    """Indexed, read-only view of a single workflow definition"""
+
+    def __init__(self, definition: Dict[str, Any], version: Optional[int] = None, checksum: Optional[str] = None):
+        # Shared by every request, so it is frozen: responses overlay per-request values instead
+        definition = freeze(definition)
+        self.definition = definition
+        self.id = definition.get('id')
+        self.name = definition.get('name', 'Unnamed Workflow')
+        # Database version this definition is pinned to, once published (see definition_store)
+        self.version = version
+        self.checksum = checksum or definition_checksum(definition)
+
+        steps = {}
+        templates = {}
+        next_steps = {}
+        previous_steps = {}
+        for step in definition.get('steps', []):
+            step_id = step.get('id')
+            if step_id not in steps:
+                steps[step_id] = step
+                templates[step_id] = CompiledStepTemplates(step)
+            next_step_id = step.get('next_step')
+            if next_step_id:
+                next_steps[step_id] = next_step_id
+                previous_steps.setdefault(next_step_id, step_id)
+
+        self.steps: Mapping[str, Dict[str, Any]] = MappingProxyType(steps)
+        self.templates: Mapping[str, CompiledStepTemplates] = MappingProxyType(templates)
+        self.next_steps: Mapping[str, str] = MappingProxyType(next_steps)
+        self.previous_steps: Mapping[str, str] = MappingProxyType(previous_steps)
+
+        # The start step is the first step in document order that no other step points to
+        self.start_step: Optional[Dict[str, Any]] = next(
+            (step for step in definition.get('steps', []) if step.get('id') not in previous_steps),
+            None
+        )
+
+        self.analysis = WorkflowAnalysis(
+            definition.get('steps', []),
+            self.next_steps,
+            self.start_step.get('id') if self.start_step else None,
+            self.templates
+        )
+
+    @cached_property
+    def response_body(self) -> bytes:
+        """The GET /workflows/<id>/ response, serialized once per definition"""
+        return dumps({"success": True, "data": self.definition})
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.checksum}"'
+
+    @property
+    def steps_count(self) -> int:
+        return len(self.definition.get('steps', []))
+
+    def get_step(self, step_id: str) -> Optional[Dict[str, Any]]:
+        return self.steps.get(step_id)
+
+    def get_templates(self, step_id: str) -> Optional[CompiledStepTemplates]:
+        return self.templates.get(step_id)
+
+    def get_next_step_id(self, step_id: str) -> Optional[str]:
+        return self.next_steps.get(step_id)
+
+    def get_previous_step_id(self, step_id: str) -> Optional[str]:
+        return self.previous_steps.get(step_id)
+
+
+class WorkflowRegistry:
+    """Immutable index over every workflow in workflow.json, built once per load"""
+
+    def __init__(self, document: Dict[str, Any], version: Optional[str] = None):
+        document = freeze(document)
+        self.document = document
+        self.version = version
+        self.loaded_at = datetime.now(timezone.utc)
+
+        workflows = {}
+        steps = {}
+        errors = []
+        for definition in document.get('workflows', []):
+            compiled = CompiledWorkflow(definition)
+            if compiled.id in workflows:
+                errors.append(f"Workflow '{compiled.id}': duplicate workflow id")
+                continue
+            errors.extend(f"Workflow '{compiled.id}': {error}" for error in compiled.analysis.errors)
+            workflows[compiled.id] = compiled
+            for step_id, step in compiled.steps.items():
+                steps[(compiled.id, step_id)] = step
+
+        if errors:
+            raise WorkflowDefinitionError(errors)
+
+        self.workflows: Mapping[str, CompiledWorkflow] = MappingProxyType(workflows)
+        self.steps: Mapping[Tuple[str, str], Dict[str, Any]] = MappingProxyType(steps)
+
+    def __len__(self) -> int:
+        return len(self.workflows)
+
+    @cached_property
+    def response_body(self) -> bytes:
+        """The GET /workflows/ catalog response, serialized once per registry version"""
+        return dumps({"success": True, "data": self.document})
+
+    @cached_property
+    def etag(self) -> str:
+        return f'"{self.version or hashlib.sha256(self.response_body).hexdigest()}"'
+
+    def get_workflow(self, workflow_id: str) -> Optional[CompiledWorkflow]:
+        return self.workflows.get(workflow_id)
+
+    def get_step(self, workflow_id: str, step_id: str) -> Optional[Dict[str, Any]]:
+        return self.steps.get((workflow_id, step_id))
@@ -1,104 +1,238 @@
+import hashlib
 import json
+import logging
 import os
-import re
-from typing import Dict, Any, Optional
+import threading
+import time
+import uuid
+from typing import Dict, Any, List, Optional, Tuple
 from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.utils.timezone import now
 from .models import WorkflowInstance, StepExecution
+from .definition_store import WorkflowDefinitionStore
+from .events import publish_on_commit
+from .inbox import sync_inbox
+from .jobs import enqueue_many
+from .step_analytics import CYCLE_TIME
+from .workflow_jobs import STEP_ASSIGNED_NOTIFICATION, STEP_DURATIONS, STEP_SUBMITTED_AUDIT
+from .workflow_registry import WorkflowRegistry, CompiledWorkflow
+from .tracing import timed
+from .workflow_templates import compile_template
+
+
+logger = logging.getLogger(__name__)
+
+# Queries a single submit_step_data call may issue, excluding transaction control
+# statements (enforced by the tests)
+SUBMIT_STEP_QUERY_BUDGET = 7
+
+# Rows per INSERT/UPDATE statement for the bulk APIs, and entries accepted per request
+BULK_BATCH_SIZE = 500
+BULK_MAX_ENTRIES = 10000
+
+
+class WorkflowConflictError(Exception):
+    """Raised when an instance changed between being read and being written; the caller may retry"""
+
+    def __init__(self, message: str = "Workflow instance was modified by another request; reload and retry"):
+        super().__init__(message)
 
 
 class WorkflowService:
     def __init__(self):
         self.workflow_file_path = os.path.join(settings.BASE_DIR, '..', 'workflow.json')
-        self._workflows_cache = None
+        self._registry = None
+        self._file_signature = None
+        self._last_checked = 0.0
+        self._reload_lock = threading.Lock()
+        self._reload_thread = None
+        self.definitions = WorkflowDefinitionStore()
     
     def get_workflows(self) -> Dict[str, Any]:
         """Load and cache workflow definitions from workflow.json"""
-        if self._workflows_cache is None:
-            try:
-                with open(self.workflow_file_path, 'r', encoding='utf-8') as f:
-                    self._workflows_cache = json.load(f)
-            except FileNotFoundError:
-                raise FileNotFoundError("workflow.json file not found in Django project root")
-            except json.JSONDecodeError:
-                raise ValidationError("Invalid JSON in workflow.json file")
-        return self._workflows_cache
+        return self.get_registry().document
     
-    def get_workflow_by_id(self, workflow_id: str) -> Optional[Dict[str, Any]]:
-        """Get specific workflow definition by ID"""
-        print(f"🔍 Searching for workflow with ID: {workflow_id}")
-        
-        try:
-            workflows = self.get_workflows()
-            print(f"📊 Total workflows available: {len(workflows.get('workflows', []))}")
-            
-            for i, workflow in enumerate(workflows.get('workflows', [])):
-                workflow_found_id = workflow.get('id')
-                print(f"📋 Workflow {i}: ID={workflow_found_id}, Name={workflow.get('name', 'Unknown')}")
-                
-                if workflow_found_id == workflow_id:
-                    print(f"✅ Found matching workflow: {workflow.get('name')}")
-                    return workflow
-            
-            print(f"❌ No workflow found with ID: {workflow_id}")
-            return None
-            
-        except Exception as e:
-            print(f"💥 Error in get_workflow_by_id: {e}")
-            raise e
+    def get_registry(self) -> WorkflowRegistry:
+        """Return the active compiled registry, loading workflow.json on first use"""
+        registry = self._registry
+        if registry is None:
+            with self._reload_lock:
+                if self._registry is None:
+                    self._file_signature = self._stat_workflow_file()
+                    self._registry = self._load_registry()
+                registry = self._registry
+        elif getattr(settings, 'WORKFLOW_DEFINITIONS_AUTO_RELOAD', False):
+            self._check_for_changes()
+        return registry
     
-    def get_step_by_id(self, workflow_id: str, step_id: str) -> Optional[Dict[str, Any]]:
-        """Get specific step definition from workflow"""
-        workflow = self.get_workflow_by_id(workflow_id)
-        if not workflow:
+    def reload_workflows(self) -> WorkflowRegistry:
+        """Re-read workflow.json now and swap in the new registry if its content changed"""
+        with self._reload_lock:
+            signature = self._stat_workflow_file()
+            registry = self._load_registry(previous=self._registry)
+            self._file_signature = signature
+            self._registry = registry
+        return registry
+    
+    def get_definitions_version(self) -> Dict[str, Any]:
+        """Describe the active definitions so operators can confirm workers have converged"""
+        registry = self.get_registry()
+        return {
+            "version": registry.version,
+            "loaded_at": registry.loaded_at,
+            "workflows_count": len(registry),
+            "auto_reload": getattr(settings, 'WORKFLOW_DEFINITIONS_AUTO_RELOAD', False),
+        }
+    
+    def _stat_workflow_file(self):
+        try:
+            stat = os.stat(self.workflow_file_path)
+        except FileNotFoundError:
             return None
-        
-        for step in workflow.get('steps', []):
-            if step.get('id') == step_id:
-                return step
-        return None
+        return (stat.st_mtime_ns, stat.st_size)
     
-    def resolve_template_variables(self, value: str, instance: WorkflowInstance) -> str:
-        """Resolve template variables like {{step_1.field_name}} in workflow definitions"""
-        if not isinstance(value, str) or not value.startswith('{{') or not value.endswith('}}'):
-            return value
-        
-        # Extract variable name (e.g., "step_1.user_email")
-        template_match = re.match(r'\{\{(.+)\}\}', value)
-        if not template_match:
-            return value
+    def _load_registry(self, previous: Optional[WorkflowRegistry] = None) -> WorkflowRegistry:
+        try:
+            with open(self.workflow_file_path, 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            raise FileNotFoundError("workflow.json file not found in Django project root")
         
-        variable_path = template_match.group(1).strip()
-        parts = variable_path.split('.')
+        version = hashlib.sha256(content).hexdigest()
+        if previous is not None and previous.version == version:
+            # Touched but unchanged: keep the compiled registry we already have
+            return previous
         
-        if len(parts) != 2:
-            return value
+        try:
+            document = json.loads(content)
+        except json.JSONDecodeError:
+            raise ValidationError("Invalid JSON in workflow.json file")
         
-        step_id, field_name = parts
+        return WorkflowRegistry(document, version=version)
+    
+    def _check_for_changes(self):
+        """Cheap mtime/size check, rate limited; changed files are recompiled in the background"""
+        now = time.monotonic()
+        interval = getattr(settings, 'WORKFLOW_DEFINITIONS_CHECK_INTERVAL', 2.0)
+        if now - self._last_checked < interval:
+            return
+        self._last_checked = now
         
-        # Special handling for user-related fields
-        if field_name == 'user_email':
-            return instance.initiated_by_email
-        elif field_name == 'user_display_name':
-            # For now, return email as display name
-            # This could be enhanced to query user profiles
-            return instance.initiated_by_email.split('@')[0]
+        signature = self._stat_workflow_file()
+        if signature is None or signature == self._file_signature:
+            return
+        if self._reload_thread is not None and self._reload_thread.is_alive():
+            return
         
-        # Look up field value from previous step execution
+        self._reload_thread = threading.Thread(
+            target=self._reload_in_background,
+            name='workflow-definitions-reload',
+            daemon=True
+        )
+        self._reload_thread.start()
+    
+    def _reload_in_background(self):
         try:
-            step_execution = StepExecution.objects.get(
+            registry = self.reload_workflows()
+            logger.info("Workflow definitions active version %s", registry.version, extra={'definitions_version': registry.version})
+        except Exception:
+            # Keep serving the previous registry until the file is fixed
+            logger.exception("Failed to reload workflow.json")
+            self._file_signature = self._stat_workflow_file()
+    
+    def get_compiled_workflow(self, workflow_id: str) -> Optional[CompiledWorkflow]:
+        """Get the compiled (indexed) workflow definition by ID"""
+        return self.get_registry().get_workflow(workflow_id)
+    
+    def get_instance_workflow(self, instance: WorkflowInstance) -> Optional[CompiledWorkflow]:
+        """Get the definition version an instance is pinned to, falling back to the active one"""
+        if instance.workflow_version is not None:
+            pinned = self.definitions.get(instance.workflow_id, instance.workflow_version)
+            if pinned is not None:
+                return pinned
+        return self.get_compiled_workflow(instance.workflow_id)
+    
+    def get_instance_workflows(self, instances: List[WorkflowInstance]) -> Dict[uuid.UUID, Optional[CompiledWorkflow]]:
+        """get_instance_workflow() for a page of instances, with at most one query; keyed by instance_id"""
+        pinned = self.definitions.get_many(
+            (instance.workflow_id, instance.workflow_version) for instance in instances if instance.workflow_version is not None
+        )
+        return {
+            instance.instance_id: pinned.get((instance.workflow_id, instance.workflow_version)) or self.get_compiled_workflow(instance.workflow_id)
+            for instance in instances
+        }
+    
+    def get_workflow_by_id(self, workflow_id: str) -> Optional[Dict[str, Any]]:
+        """Get specific workflow definition by ID"""
+        compiled = self.get_compiled_workflow(workflow_id)
+        return compiled.definition if compiled else None
+    
+    def get_step_by_id(self, workflow_id: str, step_id: str) -> Optional[Dict[str, Any]]:
+        """Get specific step definition from workflow"""
+        return self.get_registry().get_step(workflow_id, step_id)
+    
+    def get_completed_step_data(self, instance: WorkflowInstance, step_ids) -> Dict[str, Dict[str, Any]]:
+        """Fetch step_data of every referenced completed step for the instance in one query"""
+        step_ids = set(step_ids)
+        if not step_ids:
+            return {}
+        return dict(
+            StepExecution.objects.filter(
                 workflow_instance=instance,
-                step_id=step_id,
+                step_id__in=step_ids,
                 status='completed'
-            )
-            step_data = step_execution.step_data
-            return step_data.get(field_name, value)
-        except StepExecution.DoesNotExist:
+            ).values_list('step_id', 'step_data')
+        )
+    
+    def get_referenced_step_data(self, instance: WorkflowInstance, step_id: str) -> Dict[str, Dict[str, Any]]:
+        """Fetch the data every template in a step refers to (assignment and form fields)"""
+        compiled = self.get_instance_workflow(instance)
+        templates = compiled.get_templates(step_id) if compiled else None
+        if not templates:
+            return {}
+        return self.get_completed_step_data(instance, templates.referenced_step_ids)
+    
+    def resolve_template_variables(self, value: str, instance: WorkflowInstance, step_data: Optional[Dict[str, Dict[str, Any]]] = None) -> Any:
+        """Resolve template variables like {{step_1.field_name}} in workflow definitions"""
+        expression = compile_template(value)
+        if expression is None:
             return value
+        
+        if step_data is None:
+            step_data = {} if expression.is_instance_field else self.get_completed_step_data(instance, [expression.step_id])
+        with timed('resolution'):
+            return expression.resolve(instance, step_data)
+    
+    def resolve_form_field_values(self, instance: WorkflowInstance, step_id: str, step_data: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[int, Any]:
+        """Resolve every templated form field of a step, keyed by field index"""
+        compiled = self.get_instance_workflow(instance)
+        templates = compiled.get_templates(step_id) if compiled else None
+        if not templates or not templates.fields:
+            return {}
+        
+        if step_data is None:
+            step_data = self.get_completed_step_data(instance, templates.referenced_step_ids)
+        with timed('resolution'):
+            return templates.resolve_fields(instance, step_data)
     
-    def is_user_authorized_for_step(self, workflow_id: str, step_id: str, user_email: str, instance: WorkflowInstance) -> bool:
+    def is_user_authorized_for_step(self, workflow_id: str, step_id: str, user_email: str, instance: WorkflowInstance, step_data: Optional[Dict[str, Dict[str, Any]]] = None) -> bool:
         """Check if user is authorized to access a specific workflow step"""
-        step = self.get_step_by_id(workflow_id, step_id)
+        if instance.workflow_id == workflow_id:
+            compiled = self.get_instance_workflow(instance)
+        else:
+            compiled = self.get_compiled_workflow(workflow_id)
+        
+        if step_data is None:
+            templates = compiled.get_templates(step_id) if compiled else None
+            step_data = self.get_completed_step_data(instance, templates.assigned_to_step_ids if templates else ())
+        return self.is_assignee(compiled, step_id, user_email, instance, step_data)
+    
+    def is_assignee(self, compiled: Optional[CompiledWorkflow], step_id: str, user_email: str, instance: WorkflowInstance, step_data: Dict[str, Dict[str, Any]]) -> bool:
+        """Authorization check against an already loaded definition and step data (no queries)"""
+        step = compiled.get_step(step_id) if compiled else None
         if not step:
             return False
         
@@ -108,44 +242,166 @@ class WorkflowService:
             return True
         
         # Resolve template variables in assignment
-        resolved_assigned_to = self.resolve_template_variables(assigned_to, instance)
+        templates = compiled.get_templates(step_id)
+        if templates.assigned_to is not None:
+            with timed('resolution'):
+                assigned_to = templates.assigned_to.resolve(instance, step_data)
         
         # Check if current user matches assignment
-        return user_email.lower() == resolved_assigned_to.lower()
+        return user_email.lower() == str(assigned_to).lower()
+    
+    # Async variants of the read paths, for the ASGI views (app/async_views.py).
+    # Writes stay synchronous: they need transaction.atomic(), which the async ORM
+    # does not offer, so async callers run them through sync_to_async.
+    
+    async def aget_workflow_instance(self, instance_id: str) -> Optional[WorkflowInstance]:
+        """Async get_workflow_instance()"""
+        try:
+            return await WorkflowInstance.objects.aget(instance_id=instance_id)
+        except (WorkflowInstance.DoesNotExist, ValidationError):
+            return None
+    
+    async def aget_instance_workflow(self, instance: WorkflowInstance) -> Optional[CompiledWorkflow]:
+        """Async get_instance_workflow(); only a cold pinned version touches the database"""
+        if instance.workflow_version is not None:
+            pinned = await self.definitions.aget(instance.workflow_id, instance.workflow_version)
+            if pinned is not None:
+                return pinned
+        return self.get_compiled_workflow(instance.workflow_id)
+    
+    async def aget_completed_step_data(self, instance: WorkflowInstance, step_ids) -> Dict[str, Dict[str, Any]]:
+        """Async get_completed_step_data()"""
+        step_ids = set(step_ids)
+        if not step_ids:
+            return {}
+        return {
+            step_id: step_data
+            async for step_id, step_data in StepExecution.objects.filter(
+                workflow_instance=instance,
+                step_id__in=step_ids,
+                status='completed'
+            ).values_list('step_id', 'step_data')
+        }
+    
+    async def aget_referenced_step_data(self, instance: WorkflowInstance, step_id: str) -> Dict[str, Dict[str, Any]]:
+        """Async get_referenced_step_data()"""
+        compiled = await self.aget_instance_workflow(instance)
+        templates = compiled.get_templates(step_id) if compiled else None
+        if not templates:
+            return {}
+        return await self.aget_completed_step_data(instance, templates.referenced_step_ids)
     
     def get_next_step_id(self, workflow_id: str, current_step_id: str) -> Optional[str]:
         """Get the next step ID in the workflow"""
-        step = self.get_step_by_id(workflow_id, current_step_id)
-        if not step:
+        compiled = self.get_compiled_workflow(workflow_id)
+        if not compiled:
             return None
-        return step.get('next_step')
+        return compiled.get_next_step_id(current_step_id)
+    
+    def get_previous_step_id(self, workflow_id: str, current_step_id: str) -> Optional[str]:
+        """Get the step ID that leads into the given step"""
+        compiled = self.get_compiled_workflow(workflow_id)
+        if not compiled:
+            return None
+        return compiled.get_previous_step_id(current_step_id)
     
     def start_workflow_instance(self, workflow_id: str, user_email: str, user_clerk_id: str) -> WorkflowInstance:
         """Create a new workflow instance"""
-        workflow = self.get_workflow_by_id(workflow_id)
+        workflow = self.get_compiled_workflow(workflow_id)
         if not workflow:
             raise ValidationError(f"Workflow with ID {workflow_id} not found")
         
-        # Find the first step
-        first_step = None
-        for step in workflow.get('steps', []):
-            if not any(s.get('next_step') == step.get('id') for s in workflow.get('steps', [])):
-                first_step = step
-                break
-        
-        if not first_step:
-            raise ValidationError("No starting step found in workflow")
-        
-        # Create workflow instance
-        instance = WorkflowInstance.objects.create(
-            workflow_id=workflow_id,
-            workflow_name=workflow.get('name', 'Unnamed Workflow'),
-            current_step_id=first_step.get('id'),
+        # Pin the instance to the definition version it starts on
+        workflow_version = self.definitions.publish(workflow)
+        
+        instance = self._build_instance(workflow, workflow_version, user_email, user_clerk_id)
+        initial_execution = self._build_initial_execution(workflow, instance)
+        
+        with transaction.atomic():
+            instance.save(force_insert=True)
+            if initial_execution:
+                initial_execution.save(force_insert=True)
+                sync_inbox({instance: initial_execution})
+                enqueue_many(self._assignment_jobs([initial_execution]))
+                publish_on_commit([initial_execution])
+        
+        return instance
+    
+    def bulk_start_workflow_instances(self, entries: List[Dict[str, Any]], batch_size: int = BULK_BATCH_SIZE) -> List[Dict[str, Any]]:
+        """
+        Start many workflow instances at once.
+        
+        Each entry is {"workflow_id", "user_email", "user_clerk_id"}. Definitions are
+        resolved and pinned once per distinct workflow, and instances plus their initial
+        pending step executions are inserted with bulk_create. Returns one result per
+        entry, in order, with either the new instance or the error for that entry.
+        """
+        required_fields = ['workflow_id', 'user_email', 'user_clerk_id']
+        workflows = {}
+        instances = []
+        initial_executions = []
+        results = []
+        
+        for index, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                results.append({"index": index, "success": False, "error": "Entry must be an object"})
+                continue
+            
+            missing_fields = [field for field in required_fields if not entry.get(field)]
+            if missing_fields:
+                results.append({"index": index, "success": False, "error": f"Missing required fields: {', '.join(missing_fields)}"})
+                continue
+            
+            workflow_id = entry['workflow_id']
+            if workflow_id not in workflows:
+                workflow = self.get_compiled_workflow(workflow_id)
+                workflows[workflow_id] = (workflow, self.definitions.publish(workflow) if workflow else None)
+            workflow, workflow_version = workflows[workflow_id]
+            if not workflow:
+                results.append({"index": index, "success": False, "error": f"Workflow with ID {workflow_id} not found"})
+                continue
+            
+            instance = self._build_instance(workflow, workflow_version, entry['user_email'], entry['user_clerk_id'])
+            instances.append(instance)
+            initial_execution = self._build_initial_execution(workflow, instance)
+            if initial_execution:
+                initial_executions.append(initial_execution)
+            results.append({"index": index, "success": True, "instance": instance})
+        
+        with transaction.atomic():
+            WorkflowInstance.objects.bulk_create(instances, batch_size=batch_size)
+            StepExecution.objects.bulk_create(initial_executions, batch_size=batch_size)
+            sync_inbox({execution.workflow_instance: execution for execution in initial_executions})
+            enqueue_many(self._assignment_jobs(initial_executions))
+            publish_on_commit(initial_executions)
+        
+        return results
+    
+    def _build_instance(self, workflow: CompiledWorkflow, workflow_version: int, user_email: str, user_clerk_id: str) -> WorkflowInstance:
+        # Compiled definitions are validated at load, so a start step always exists
+        return WorkflowInstance(
+            workflow_id=workflow.id,
+            workflow_version=workflow_version,
+            workflow_name=workflow.name,
+            current_step_id=workflow.start_step.get('id'),
             initiated_by_email=user_email,
             initiated_by_clerk_id=user_clerk_id
         )
-        
-        return instance
+    
+    def _build_initial_execution(self, workflow: CompiledWorkflow, instance: WorkflowInstance) -> Optional[StepExecution]:
+        """Pending execution for an assigned start step (its templates can only read the instance)"""
+        first_step = workflow.start_step
+        assigned_to = first_step.get('assignedTo')
+        if not assigned_to:
+            return None
+        return StepExecution(
+            workflow_instance=instance,
+            step_id=first_step.get('id'),
+            step_name=first_step.get('name', first_step.get('id')),
+            assigned_to_email=self.resolve_template_variables(assigned_to, instance, {}),
+            status='pending',
+            started_at=now()
+        )
     
     def get_workflow_instance(self, instance_id: str) -> Optional[WorkflowInstance]:
         """Get workflow instance by ID"""
@@ -154,69 +410,383 @@ class WorkflowService:
         except WorkflowInstance.DoesNotExist:
             return None
     
-    def submit_step_data(self, instance_id: str, step_id: str, step_data: Dict[str, Any], user_email: str) -> StepExecution:
-        """Submit data for a workflow step and advance to next step"""
-        instance = self.get_workflow_instance(instance_id)
-        if not instance:
+    def submit_step_data(self, instance_id: str, step_id: str, step_data: Dict[str, Any], user_email: str,
+                         expected_version: Optional[int] = None) -> StepExecution:
+        """
+        Submit data for a workflow step and advance to next step.
+        
+        Uses optimistic concurrency instead of row locks: the instance is read
+        without locking, and written back with UPDATE ... WHERE version = n. If
+        another request advanced the instance in between (or expected_version
+        is given and stale), WorkflowConflictError is raised and nothing is
+        written. The instance version guards its step executions as well,
+        since every writer of those bumps the instance first.
+        
+        Issues at most SUBMIT_STEP_QUERY_BUDGET queries (excluding transaction
+        control): read the instance, load every step execution the submission
+        touches or whose data the templates read, update the instance, write
+        the submitted execution, create the next pending execution, update
+        the instance's inbox row, enqueue the follow-up jobs. Everything beyond the state change itself (audit
+        records, notifications, duration statistics) runs later on the job worker;
+        the jobs commit with the submission, so none are lost or run for a
+        rolled-back one. The returned execution's workflow_instance is the
+        updated instance, so callers do not need to re-fetch it.
+        """
+        try:
+            instance = WorkflowInstance.objects.get(instance_id=instance_id)
+        except WorkflowInstance.DoesNotExist:
             raise ValidationError("Workflow instance not found")
         
+        if expected_version is not None and instance.version != expected_version:
+            raise WorkflowConflictError()
+        
         if instance.current_step_id != step_id:
             raise ValidationError("Cannot submit data for step that is not current")
         
-        if not self.is_user_authorized_for_step(instance.workflow_id, step_id, user_email, instance):
+        executions = {
+            execution.step_id: execution
+            for execution in instance.step_executions.filter(step_id__in=self._submission_step_ids(instance, step_id))
+        }
+        timestamp = now()
+        step_execution, next_execution = self._apply_submission(instance, step_id, step_data, user_email, executions, timestamp)
+        
+        with transaction.atomic():
+            if not self._update_instances([instance], timestamp):
+                raise WorkflowConflictError()
+            
+            if step_execution.pk is None:
+                step_execution.save(force_insert=True)
+            else:
+                updated = StepExecution.objects.filter(pk=step_execution.pk, version=step_execution.version).update(
+                    step_data=step_execution.step_data,
+                    executed_by_email=step_execution.executed_by_email,
+                    status=step_execution.status,
+                    started_at=step_execution.started_at,
+                    completed_at=step_execution.completed_at,
+                    updated_at=timestamp,
+                    version=F('version') + 1
+                )
+                if not updated:
+                    raise WorkflowConflictError()
+                step_execution.updated_at = timestamp
+                step_execution.version += 1
+            if next_execution is not None:
+                next_execution.save(force_insert=True)
+            sync_inbox({instance: self._waiting_execution(instance, executions, next_execution)})
+            enqueue_many(self._submission_jobs(step_execution, next_execution, user_email) + self._duration_jobs([step_execution]))
+            publish_on_commit([step_execution, next_execution])
+        
+        return step_execution
+    
+    def bulk_submit_step_data(self, user_email: str, entries: List[Dict[str, Any]], all_or_nothing: bool = False, batch_size: int = BULK_BATCH_SIZE) -> List[Dict[str, Any]]:
+        """
+        Submit many steps (one per instance) for the same user.
+        
+        Each entry is {"instance_id", "step_id", "step_data"} plus an optional
+        expected "version". All affected instances are loaded with one query and
+        their step executions with another; each entry is then validated and
+        authorized against its pinned definition in memory. Instances are
+        advanced with conditional version updates (see _update_instances) and
+        executions written as bulk_update/bulk_create batches, all in one
+        transaction. Returns one result per entry, in order; entries that lost
+        a race report "conflict": True. With all_or_nothing, nothing is
+        written unless every entry succeeds.
+        """
+        results: List[Dict[str, Any]] = [None] * len(entries)
+        valid = []
+        seen_instance_ids = set()
+        for index, entry in enumerate(entries):
+            if not isinstance(entry, dict) or not entry.get('instance_id') or not entry.get('step_id') or 'step_data' not in entry:
+                results[index] = {"index": index, "success": False, "error": "instance_id, step_id and step_data are required"}
+                continue
+            try:
+                instance_id = uuid.UUID(str(entry['instance_id']))
+            except ValueError:
+                results[index] = {"index": index, "success": False, "error": "Workflow instance not found"}
+                continue
+            if instance_id in seen_instance_ids:
+                results[index] = {"index": index, "success": False, "error": "Instance appears more than once in this batch"}
+                continue
+            seen_instance_ids.add(instance_id)
+            valid.append((index, instance_id, entry))
+        
+        instances = WorkflowInstance.objects.in_bulk(seen_instance_ids)
+        
+        needed_step_ids = set()
+        resolved = []
+        for index, instance_id, entry in valid:
+            instance = instances.get(instance_id)
+            if instance is not None and instance.current_step_id == entry['step_id']:
+                try:
+                    needed_step_ids |= self._submission_step_ids(instance, entry['step_id'])
+                except ValidationError as e:
+                    results[index] = {"index": index, "success": False, "error": " ".join(e.messages)}
+                    continue
+            resolved.append((index, instance_id, entry))
+        valid = resolved
+        executions_by_instance: Dict[uuid.UUID, Dict[str, StepExecution]] = {}
+        if needed_step_ids:
+            for execution in StepExecution.objects.filter(workflow_instance_id__in=list(instances), step_id__in=needed_step_ids):
+                executions_by_instance.setdefault(execution.workflow_instance_id, {})[execution.step_id] = execution
+        
+        timestamp = now()
+        applied = []
+        for index, instance_id, entry in valid:
+            instance = instances.get(instance_id)
+            try:
+                if instance is None:
+                    raise ValidationError("Workflow instance not found")
+                if entry.get('version') is not None and instance.version != entry['version']:
+                    raise WorkflowConflictError()
+                if instance.current_step_id != entry['step_id']:
+                    raise ValidationError("Cannot submit data for step that is not current")
+                executions = executions_by_instance.get(instance_id, {})
+                for execution in executions.values():
+                    execution.workflow_instance = instance
+                step_execution, next_execution = self._apply_submission(
+                    instance, entry['step_id'], entry['step_data'], user_email, executions, timestamp
+                )
+            except ValidationError as e:
+                results[index] = {"index": index, "success": False, "error": " ".join(e.messages)}
+                continue
+            except WorkflowConflictError as e:
+                results[index] = {"index": index, "success": False, "error": str(e), "conflict": True}
+                continue
+            applied.append((index, instance, step_execution, next_execution))
+        
+        if all_or_nothing and len(applied) != len(entries):
+            for index, _, _, _ in applied:
+                results[index] = {"index": index, "success": False, "error": "Not applied: another entry in this all-or-nothing batch failed"}
+            return results
+        
+        try:
+            with transaction.atomic():
+                advanced = self._update_instances([instance for _, instance, _, _ in applied], timestamp, batch_size)
+                if all_or_nothing and len(advanced) != len(applied):
+                    raise WorkflowConflictError()
+                
+                to_update = []
+                to_create = []
+                for index, instance, step_execution, next_execution in applied:
+                    if instance.pk not in advanced:
+                        results[index] = {"index": index, "success": False, "error": str(WorkflowConflictError()), "conflict": True}
+                        continue
+                    if step_execution.pk is None:
+                        to_create.append(step_execution)
+                    else:
+                        step_execution.updated_at = timestamp
+                        step_execution.version += 1
+                        to_update.append(step_execution)
+                    if next_execution is not None:
+                        to_create.append(next_execution)
+                    results[index] = {"index": index, "success": True, "step_execution": step_execution}
+                
+                StepExecution.objects.bulk_update(
+                    to_update,
+                    ['step_data', 'executed_by_email', 'status', 'started_at', 'completed_at', 'updated_at', 'version'],
+                    batch_size=batch_size
+                )
+                StepExecution.objects.bulk_create(to_create, batch_size=batch_size)
+                sync_inbox({
+                    instance: self._waiting_execution(instance, executions_by_instance.get(instance.pk, {}), next_execution)
+                    for _, instance, _, next_execution in applied if instance.pk in advanced
+                })
+                submitted = [(step_execution, next_execution) for _, instance, step_execution, next_execution in applied if instance.pk in advanced]
+                enqueue_many(
+                    [job for step_execution, next_execution in submitted for job in self._submission_jobs(step_execution, next_execution, user_email)]
+                    + self._duration_jobs([step_execution for step_execution, _ in submitted])
+                )
+                publish_on_commit(to_update + to_create)
+        except WorkflowConflictError as e:
+            for index, instance, _, _ in applied:
+                if instance.pk in advanced:
+                    results[index] = {"index": index, "success": False, "error": "Not applied: another entry in this all-or-nothing batch failed"}
+                else:
+                    results[index] = {"index": index, "success": False, "error": str(e), "conflict": True}
+        
+        return results
+    
+    def _update_instances(self, instances: List[WorkflowInstance], timestamp, batch_size: int = BULK_BATCH_SIZE) -> set:
+        """
+        Write current_step_id/status of each instance with UPDATE ... WHERE version = n,
+        bumping the version. Instances that moved on to the same step from the same
+        version share one UPDATE; if a shared UPDATE matches fewer rows than expected it
+        is rolled back and retried row by row to find the stale ones. Returns the pks
+        that were written; their in-memory version and updated_at are advanced.
+        Must be called inside a transaction.
+        """
+        groups: Dict[Tuple[Optional[str], str, int], List[WorkflowInstance]] = {}
+        for instance in instances:
+            groups.setdefault((instance.current_step_id, instance.status, instance.version), []).append(instance)
+        
+        written = set()
+        for (current_step_id, status, version), members in groups.items():
+            values = dict(current_step_id=current_step_id, status=status, updated_at=timestamp, version=F('version') + 1)
+            if status == 'completed':
+                values['completed_at'] = timestamp
+            for offset in range(0, len(members), batch_size):
+                batch = members[offset:offset + batch_size]
+                savepoint = transaction.savepoint()
+                updated = WorkflowInstance.objects.filter(pk__in=[m.pk for m in batch], version=version).update(**values)
+                if updated == len(batch):
+                    transaction.savepoint_commit(savepoint)
+                    written.update(m.pk for m in batch)
+                    continue
+                transaction.savepoint_rollback(savepoint)
+                for member in batch:
+                    if WorkflowInstance.objects.filter(pk=member.pk, version=version).update(**values):
+                        written.add(member.pk)
+        
+        for instance in instances:
+            if instance.pk in written:
+                instance.version += 1
+                instance.updated_at = timestamp
+                if instance.status == 'completed':
+                    instance.completed_at = timestamp
+        return written
+    
+    def _waiting_execution(self, instance: WorkflowInstance, executions: Dict[str, StepExecution],
+                           next_execution: Optional[StepExecution]) -> Optional[StepExecution]:
+        """The execution an advanced instance now waits on: the new pending one, or an existing one for its current step"""
+        if next_execution is not None:
+            return next_execution
+        return executions.get(instance.current_step_id)
+    
+    def _submission_jobs(self, step_execution: StepExecution, next_execution: Optional[StepExecution], user_email: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """Background jobs (name, payload) that follow up on a committed submission"""
+        instance = step_execution.workflow_instance
+        payload = {
+            "instance_id": str(instance.instance_id),
+            "workflow_id": instance.workflow_id,
+            "workflow_version": instance.workflow_version,
+            "step_id": step_execution.step_id,
+            "execution_id": step_execution.execution_id,
+            "user_email": user_email,
+            "next_step_id": instance.current_step_id,
+            "instance_status": instance.status
+        }
+        return [(STEP_SUBMITTED_AUDIT, payload)] + self._assignment_jobs([next_execution] if next_execution else [])
+    
+    def _duration_jobs(self, step_executions: List[StepExecution]) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Jobs adding the time-in-step of completed executions (and the cycle time
+        of completed instances) to the duration statistics, one per workflow
+        """
+        by_workflow: Dict[str, Dict[str, List[float]]] = {}
+        for step_execution in step_executions:
+            instance = step_execution.workflow_instance
+            durations = by_workflow.setdefault(instance.workflow_id, {})
+            durations.setdefault(step_execution.step_id, []).append((step_execution.completed_at - step_execution.started_at).total_seconds())
+            if instance.status == 'completed':
+                durations.setdefault(CYCLE_TIME, []).append((instance.completed_at - instance.created_at).total_seconds())
+        return [(STEP_DURATIONS, {"workflow_id": workflow_id, "durations": durations}) for workflow_id, durations in by_workflow.items()]
+    
+    def _assignment_jobs(self, executions: List[StepExecution]) -> List[Tuple[str, Dict[str, Any]]]:
+        """Assignee notification jobs for newly created pending executions"""
+        jobs = []
+        for execution in executions:
+            if not execution.assigned_to_email:
+                continue
+            instance = execution.workflow_instance
+            jobs.append((STEP_ASSIGNED_NOTIFICATION, {
+                "instance_id": str(instance.instance_id),
+                "workflow_id": instance.workflow_id,
+                "workflow_name": instance.workflow_name,
+                "initiated_by_email": instance.initiated_by_email,
+                "step_id": execution.step_id,
+                "step_name": execution.step_name,
+                "execution_id": execution.execution_id,
+                "assigned_to_email": execution.assigned_to_email
+            }))
+        return jobs
+    
+    def _submission_step_ids(self, instance: WorkflowInstance, step_id: str) -> set:
+        """
+        Steps a submission reads or writes: current and next step plus the steps their assignments reference.
+        Raises ValidationError if the instance's workflow or step no longer has a definition.
+        """
+        workflow = self.get_instance_workflow(instance)
+        templates = workflow.get_templates(step_id) if workflow else None
+        if templates is None:
+            # Nobody can be assigned to a step without a definition
             raise ValidationError("User not authorized for this step")
+        step_ids = {step_id} | templates.assigned_to_step_ids
+        next_step_id = workflow.get_next_step_id(step_id)
+        if next_step_id:
+            step_ids |= {next_step_id} | workflow.get_templates(next_step_id).assigned_to_step_ids
+        return step_ids
+    
+    def _apply_submission(self, instance: WorkflowInstance, step_id: str, step_data: Dict[str, Any], user_email: str,
+                          executions: Dict[str, StepExecution], timestamp) -> Tuple[StepExecution, Optional[StepExecution]]:
+        """
+        Authorize a submission and apply it to in-memory objects, without writing.
+        executions must hold the instance's executions for _submission_step_ids().
+        Returns the submitted execution (unsaved if new) and the new pending execution
+        for the next step, if one must be created; the instance is advanced in place.
+        The step is completed at timestamp; a step without a pending execution started
+        when the instance reached it, i.e. at the instance's last update.
+        """
+        workflow = self.get_instance_workflow(instance)
+        completed_step_data = {
+            execution.step_id: execution.step_data
+            for execution in executions.values() if execution.status == 'completed'
+        }
         
-        # Create or update step execution
-        step_execution, created = StepExecution.objects.get_or_create(
-            workflow_instance=instance,
-            step_id=step_id,
-            defaults={
-                'step_name': self.get_step_by_id(instance.workflow_id, step_id).get('name', step_id),
-                'assigned_to_email': user_email,
-                'executed_by_email': user_email,
-                'step_data': step_data,
-                'status': 'completed'
-            }
-        )
+        if not self.is_user_authorized_for_step(instance.workflow_id, step_id, user_email, instance, completed_step_data):
+            raise ValidationError("User not authorized for this step")
         
-        if not created:
+        # Create or update step execution
+        step_execution = executions.get(step_id)
+        if step_execution is None:
+            step_execution = StepExecution(
+                workflow_instance=instance,
+                step_id=step_id,
+                step_name=workflow.get_step(step_id).get('name', step_id),
+                assigned_to_email=user_email,
+                executed_by_email=user_email,
+                step_data=step_data,
+                status='completed',
+                started_at=instance.updated_at or instance.created_at,
+                completed_at=timestamp
+            )
+        else:
             step_execution.step_data = step_data
             step_execution.executed_by_email = user_email
             step_execution.status = 'completed'
-            step_execution.save()
+            step_execution.started_at = step_execution.started_at or step_execution.created_at
+            step_execution.completed_at = timestamp
+        completed_step_data[step_id] = step_data
         
         # Advance to next step
-        next_step_id = self.get_next_step_id(instance.workflow_id, step_id)
+        next_execution = None
+        next_step_id = workflow.get_next_step_id(step_id)
         if next_step_id:
             instance.current_step_id = next_step_id
             instance.status = 'in_progress'
             
             # Create pending step execution for the next step
-            next_step = self.get_step_by_id(instance.workflow_id, next_step_id)
-            if next_step:
-                next_step_assigned_to = next_step.get('assignedTo', '')
+            # (next_step always exists: dangling references are rejected at load)
+            next_step = workflow.get_step(next_step_id)
+            next_step_assigned_to = next_step.get('assignedTo', '')
+            
+            # Resolve template variables in assignment
+            if next_step_assigned_to and next_step_id not in executions:
+                resolved_assigned_to = self.resolve_template_variables(next_step_assigned_to, instance, completed_step_data)
                 
-                # Resolve template variables in assignment
-                if next_step_assigned_to:
-                    resolved_assigned_to = self.resolve_template_variables(next_step_assigned_to, instance)
-                    
-                    # Create pending step execution for the assigned user
-                    StepExecution.objects.get_or_create(
-                        workflow_instance=instance,
-                        step_id=next_step_id,
-                        defaults={
-                            'step_name': next_step.get('name', next_step_id),
-                            'assigned_to_email': resolved_assigned_to,
-                            'status': 'pending'
-                        }
-                    )
+                # Create pending step execution for the assigned user
+                next_execution = StepExecution(
+                    workflow_instance=instance,
+                    step_id=next_step_id,
+                    step_name=next_step.get('name', next_step_id),
+                    assigned_to_email=resolved_assigned_to,
+                    status='pending',
+                    started_at=timestamp
+                )
         else:
             instance.current_step_id = None
             instance.status = 'completed'
         
-        instance.save()
-        
-        return step_execution
+        return step_execution, next_execution
 
 
 # Global service instance
@@ -0,0 +1,125 @@
+import re
+from functools import lru_cache
+from typing import Dict, Any, Optional, Mapping, Tuple, FrozenSet
+
+
+TEMPLATE_PATTERN = re.compile(r'^\{\{(.+)\}\}$', re.DOTALL)
+
+# Fields resolved from the workflow instance itself rather than from step data
+INSTANCE_FIELDS = ('user_email', 'user_display_name')
+
+_MISSING = object()
+
+
+class TemplateExpression:
+    """
+    A parsed template reference such as {{step_1.field_name}}.
+    Supports nested paths ({{step_1.address.city}}, {{step_1.items.0.sku}})
+    and a fallback value ({{step_1.manager_email | hr@company.com}}).
+    """
+    __slots__ = ('source', 'step_id', 'path', 'default')
+
+    def __init__(self, source: str, step_id: str, path: Tuple[str, ...], default: Any = _MISSING):
+        self.source = source
+        self.step_id = step_id
+        self.path = path
+        self.default = default
+
+    @property
+    def is_instance_field(self) -> bool:
+        return len(self.path) == 1 and self.path[0] in INSTANCE_FIELDS
+
+    def resolve(self, instance, step_data: Mapping[str, Dict[str, Any]]) -> Any:
+        """Resolve against the instance and a step_id -> step_data map of completed steps"""
+        if self.is_instance_field:
+            if self.path[0] == 'user_email':
+                return instance.initiated_by_email
+            # For now, return email as display name
+            return instance.initiated_by_email.split('@')[0]
+
+        value = step_data.get(self.step_id, _MISSING)
+        for key in self.path:
+            if isinstance(value, dict):
+                value = value.get(key, _MISSING)
+            elif isinstance(value, (list, tuple)) and key.isdigit() and int(key) < len(value):
+                value = value[int(key)]
+            else:
+                value = _MISSING
+            if value is _MISSING:
+                break
+
+        if value is _MISSING:
+            return self.source if self.default is _MISSING else self.default
+        return value
+
+
+def compile_template(value: Any) -> Optional[TemplateExpression]:
+    """Parse a template string once; returns None for plain values (including non-strings)"""
+    if not isinstance(value, str):
+        return None
+    return _compile_template_string(value)
+
+
+# Cached separately: values that are not strings (lists, dicts) may not be hashable
+@lru_cache(maxsize=1024)
+def _compile_template_string(value: str) -> Optional[TemplateExpression]:
+    match = TEMPLATE_PATTERN.match(value)
+    if not match:
+        return None
+
+    expression, separator, default = match.group(1).partition('|')
+    parts = tuple(part.strip() for part in expression.strip().split('.'))
+    if len(parts) < 2 or not all(parts):
+        return None
+
+    if separator:
+        default = default.strip()
+        if len(default) >= 2 and default[0] == default[-1] and default[0] in '"\'':
+            default = default[1:-1]
+    else:
+        default = _MISSING
+
+    return TemplateExpression(value, parts[0], parts[1:], default)
+
+
+class CompiledStepTemplates:
+    """All template expressions used by one step, compiled when definitions load"""
+
+    def __init__(self, step: Dict[str, Any]):
+        self.assigned_to = compile_template(step.get('assignedTo'))
+
+        fields = []
+        form = step.get('form') or {}
+        for index, field in enumerate(form.get('fields') or []):
+            expression = compile_template(field.get('value'))
+            if expression is not None:
+                fields.append((index, expression))
+        self.fields: Tuple[Tuple[int, TemplateExpression], ...] = tuple(fields)
+
+        self.assigned_to_step_ids = self._step_ids([self.assigned_to])
+        self.referenced_step_ids = self.assigned_to_step_ids | self._step_ids(expr for _, expr in self.fields)
+
+    @staticmethod
+    def _step_ids(expressions) -> FrozenSet[str]:
+        return frozenset(
+            expression.step_id for expression in expressions
+            if expression is not None and not expression.is_instance_field
+        )
+
+    def resolve_fields(self, instance, step_data: Mapping[str, Dict[str, Any]]) -> Dict[int, Any]:
+        """Resolved form field values keyed by field index"""
+        return {index: expression.resolve(instance, step_data) for index, expression in self.fields}
+
+
+def overlay_field_values(step: Mapping[str, Any], values: Mapping[int, Any]) -> Mapping[str, Any]:
+    """
+    Return the step with resolved form field values applied, without touching
+    the shared definition. Only the step, its form, the fields list and the
+    changed fields are shallow-copied; everything else is reused as-is.
+    """
+    if not values:
+        return step
+    fields = list(step['form']['fields'])
+    for index, value in values.items():
+        fields[index] = {**fields[index], 'value': value}
+    return {**step, 'form': {**step['form'], 'fields': fields}}
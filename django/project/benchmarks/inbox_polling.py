@@ -0,0 +1,127 @@
+"""
+Benchmark concurrent pending-inbox polling against the WSGI and ASGI endpoints.
+
+Start the same project twice (any WSGI server works for the baseline;
+gunicorn is not a project dependency), e.g.
+
+    gunicorn project.wsgi:application -w 4 --threads 8 -b 127.0.0.1:8000
+    uvicorn project.asgi:application --workers 4 --port 8001
+
+then run
+
+    python benchmarks/inbox_polling.py --user-email manager@company.com \
+        --target wsgi=http://127.0.0.1:8000/app/workflows/pending/ \
+        --target asgi=http://127.0.0.1:8001/app/async/workflows/pending/
+
+Each target is polled by --concurrency clients (one keep-alive connection
+each) for --duration seconds, one target at a time. Reports requests per
+second and latency percentiles. Standard library only.
+"""
+import argparse
+import http.client
+import statistics
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+
+DEFAULT_TARGETS = [
+    'wsgi=http://127.0.0.1:8000/app/workflows/pending/',
+    'asgi=http://127.0.0.1:8001/app/async/workflows/pending/',
+]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float('nan')
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def poll(url, user_email, deadline, latencies, errors, lock):
+    parts = urlsplit(url)
+    connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+    path = f"{parts.path}?{urlencode({'user_email': user_email})}"
+    connection = connection_class(parts.netloc, timeout=30)
+    local_latencies = []
+    local_errors = 0
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                local_errors += 1
+                continue
+        except (OSError, http.client.HTTPException):
+            local_errors += 1
+            connection.close()
+            connection = connection_class(parts.netloc, timeout=30)
+            continue
+        local_latencies.append(time.perf_counter() - started)
+    connection.close()
+    with lock:
+        latencies.extend(local_latencies)
+        errors[0] += local_errors
+
+
+def run(name, url, user_email, concurrency, duration, warmup):
+    if warmup:
+        run_clients(url, user_email, concurrency, warmup)
+    latencies, errors, elapsed = run_clients(url, user_email, concurrency, duration)
+    latencies.sort()
+    return {
+        'target': name,
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'mean_ms': (statistics.fmean(latencies) * 1000) if latencies else float('nan'),
+    }
+
+
+def run_clients(url, user_email, concurrency, duration):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    started = time.perf_counter()
+    deadline = started + duration
+    threads = [
+        threading.Thread(target=poll, args=(url, user_email, deadline, latencies, errors, lock), daemon=True)
+        for _ in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0], time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', action='append', metavar='NAME=URL', help='endpoint to poll (repeatable)')
+    parser.add_argument('--user-email', required=True, help='inbox to poll')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds per target')
+    parser.add_argument('--warmup', type=float, default=2.0, help='seconds of unmeasured polling first')
+    args = parser.parse_args()
+
+    results = []
+    for target in args.target or DEFAULT_TARGETS:
+        name, _, url = target.partition('=')
+        results.append(run(name, url, args.user_email, args.concurrency, args.duration, args.warmup))
+
+    columns = ['target', 'requests', 'errors', 'rps', 'p50_ms', 'p95_ms', 'p99_ms', 'mean_ms']
+    print(' '.join(f"{column:>10}" for column in columns))
+    for result in results:
+        print(' '.join(
+            f"{result[column]:>10.1f}" if isinstance(result[column], float) else f"{result[column]:>10}"
+            for column in columns
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -72,6 +72,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'app.middleware.JsonCompressionMiddleware',
+    'app.tracing.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -145,7 +147,101 @@ STATICFILES_STORAGE="whitenoise.storage.CompressedManifestStaticFilesStorage"
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Logging
+# App loggers default to INFO, so debug tracing in hot paths costs a level check only.
+# Set APP_LOG_LEVEL=DEBUG to see it. Per-request timing is opt-in: with
+# REQUEST_TIMING_LOG_LEVEL=INFO, app.requests emits one timing record per request.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'structured': {
+            '()': 'app.tracing.StructuredFormatter',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'structured',
+        },
+    },
+    'loggers': {
+        'app': {
+            'handlers': ['console'],
+            'level': os.environ.get('APP_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+        'app.requests': {
+            'level': os.environ.get('REQUEST_TIMING_LOG_LEVEL', 'WARNING'),
+        },
+    },
+}
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'app.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+# Compress JSON responses of at least this many bytes (gzip, or brotli if installed).
+# None disables compression.
+JSON_COMPRESSION_MIN_SIZE = None
+
+# Workflow definitions (workflow.json)
+# When enabled, each worker stats the file at most once per interval and recompiles it
+# in the background on change; GET /app/workflow-definitions/version/ reports the active version.
+WORKFLOW_DEFINITIONS_AUTO_RELOAD = os.environ.get('WORKFLOW_DEFINITIONS_AUTO_RELOAD', 'false').lower() == 'true'
+WORKFLOW_DEFINITIONS_CHECK_INTERVAL = float(os.environ.get('WORKFLOW_DEFINITIONS_CHECK_INTERVAL', '2'))
+# Compiled (workflow_id, version) definitions kept in memory per worker
+WORKFLOW_DEFINITION_CACHE_SIZE = 256
+
+# Idempotency-Key support on workflow write endpoints: how long (seconds) a stored
+# response is replayed for, and how long a duplicate waits for the original request
+# to finish before answering 409
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', str(24 * 60 * 60)))
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.environ.get('IDEMPOTENCY_WAIT_TIMEOUT', '10'))
+
+# Background jobs (app/jobs.py, run by `python manage.py run_jobs`). Failed jobs are
+# retried after JOB_RETRY_BACKOFF * 2**(attempt - 1) seconds (capped at JOB_RETRY_BACKOFF_MAX)
+# until JOB_MAX_ATTEMPTS, then marked dead. Running jobs whose worker has not finished
+# them within JOB_LOCK_TIMEOUT seconds are picked up again.
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '5'))
+JOB_RETRY_BACKOFF = float(os.environ.get('JOB_RETRY_BACKOFF', '5'))
+JOB_RETRY_BACKOFF_MAX = float(os.environ.get('JOB_RETRY_BACKOFF_MAX', '3600'))
+JOB_LOCK_TIMEOUT = float(os.environ.get('JOB_LOCK_TIMEOUT', '300'))
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', '1'))
+
+# Assignment emails (app/notifications.py), sent through the enabled EmailSettings rows.
+# Notifications for the same recipient within the window go out as one digest.
+NOTIFICATION_DIGEST_WINDOW = float(os.environ.get('NOTIFICATION_DIGEST_WINDOW', '60'))
+NOTIFICATION_MAX_ATTEMPTS = int(os.environ.get('NOTIFICATION_MAX_ATTEMPTS', '5'))
+NOTIFICATION_RETRY_DELAY = float(os.environ.get('NOTIFICATION_RETRY_DELAY', '300'))
+NOTIFICATION_SMTP_TIMEOUT = float(os.environ.get('NOTIFICATION_SMTP_TIMEOUT', '10'))
+# Sender address; defaults to the EmailSettings username when that is an address
+NOTIFICATION_FROM_EMAIL = os.environ.get('NOTIFICATION_FROM_EMAIL')
+# Optional link to a task in the frontend, formatted with instance_id and step_id
+NOTIFICATION_TASK_URL = os.environ.get('NOTIFICATION_TASK_URL')
  
+# Live inbox updates over SSE (app/events.py, ASGI only). Idle streams get a comment line
+# every SSE_KEEPALIVE_INTERVAL seconds; with several ASGI workers each stream re-checks the
+# database every SSE_RESYNC_INTERVAL seconds (0 disables that for single-process servers).
+SSE_KEEPALIVE_INTERVAL = float(os.environ.get('SSE_KEEPALIVE_INTERVAL', '15'))
+SSE_RESYNC_INTERVAL = float(os.environ.get('SSE_RESYNC_INTERVAL', '60'))
+SSE_RESYNC_OVERLAP = float(os.environ.get('SSE_RESYNC_OVERLAP', '5'))
+SSE_RETRY_MS = int(os.environ.get('SSE_RETRY_MS', '3000'))
+SSE_QUEUE_SIZE = int(os.environ.get('SSE_QUEUE_SIZE', '100'))
+SSE_CATCH_UP_LIMIT = int(os.environ.get('SSE_CATCH_UP_LIMIT', '200'))
+
+# Cursor-paginated listings report total_count only on request, from a COUNT(*)
+# cached per filter for this many seconds
+PAGINATION_COUNT_CACHE_TTL = int(os.environ.get('PAGINATION_COUNT_CACHE_TTL', '60'))
+
+# Instances fetched (with their step executions) per round trip by the streaming exports
+# (app/export.py); memory use depends on this, not on the size of the export
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', '1000'))
+
 # CORS Configuration
 CORS_ALLOW_ALL_ORIGINS = True  # Best practice: disable all-origins in production
 CORS_ALLOWED_ORIGINS = [
@@ -166,6 +262,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR/'database'/'db.sqlite3',
+        # Web workers and job workers write concurrently: take the write lock when a
+        # transaction starts (instead of failing on upgrade) and wait for it
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
@@ -1,6 +1,6 @@
 from django.contrib.auth.models import User
 from django.db import connection
-from django.http import JsonResponse
+from app.renderers import FastJsonResponse
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
@@ -61,14 +61,14 @@ def check_user_exists(request, email):
         
         email = email.strip()
         if not email:
-            return JsonResponse({"error": "Email parameter is required."}, status=400)
+            return FastJsonResponse({"error": "Email parameter is required."}, status=400)
 
         user_exists = User.objects.filter(email=email).exists()
 
-        return JsonResponse({"data": user_exists})
+        return FastJsonResponse({"data": user_exists})
 
     except Exception as e:
-        return JsonResponse({"error": str(e)}, status=500)
+        return FastJsonResponse({"error": str(e)}, status=500)
     
 @api_view(['Post'])
 def microsoft_login(request):
@@ -140,7 +140,7 @@ def authenticate_user(request):
 def list_reports(request):
     email = request.GET.get('email')
     if not email:
-        return JsonResponse({"error": "Email parameter is required"}, status=400)
+        return FastJsonResponse({"error": "Email parameter is required"}, status=400)
 
     user = get_object_or_404(User, email=email)
 
@@ -151,7 +151,7 @@ def list_reports(request):
         'ReportID', 'ReportName', 'ReportType'
     )
 
-    return JsonResponse({"reports": list(reports)})
+    return FastJsonResponse({"reports": list(reports)})
 
 @api_view(['GET'])
 def view_report(request):
@@ -182,7 +182,7 @@ def view_report(request):
         params = [user_email] if "%s" in sql_query else None
         report_data = execute_sql_query(sql_query, params)
         
-        return JsonResponse({
+        return FastJsonResponse({
             "report_data": report_data, 
             "report_type": report.ReportType.lower(),
             "report_name": report.ReportName